@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Micro-benchmark: metadata detection in lines per second.
+
+"before" runs the rules the app used before ``line_kinds``: the uncompiled
+``split_utils._is_metadata`` check, run once by the pre-filter and once by the
+splitter, plus the ``startswith`` chain of ``extract_segment_metadata`` over
+the whole segment.  "after" labels every line once with
+``line_kinds.classify_content`` and reuses the labels.
+
+    python benchmarks/bench_line_kinds.py [file] [--seconds N]
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from line_kinds import classify_content, metadata_lines
+from segment_parser import parse_segments
+from split_utils import separate_metadata
+
+_OLD_PREFIXES = ["--", "http", "Timestamp:", "Map view:", "Source:", "@"]
+
+
+def old_is_metadata(line):
+    line = line.strip()
+    if not line:
+        return False
+    if any(line.startswith(prefix) for prefix in _OLD_PREFIXES):
+        return True
+    if re.match(r"^[A-Za-z]{2}-", line):
+        return True
+    return False
+
+
+def old_extract_segment_metadata(original_text):
+    metadata = []
+    for line in original_text.splitlines():
+        if (line.startswith('--') or
+            line.startswith('http') or
+            line.startswith('Timestamp:') or
+            line.startswith('Map view:') or
+            line.startswith('Source:') or
+            line.startswith('cc-') or
+            line.startswith('@') or
+            re.match(r'^[A-Za-z]{2}-', line)):
+            metadata.append(line)
+    return metadata
+
+
+def before(segments):
+    for _, content, original_text in segments:
+        for _ in range(2):  # pre-filter, then splitter
+            [ln for ln in content.splitlines() if old_is_metadata(ln)]
+        old_extract_segment_metadata(original_text)
+
+
+def after(segments):
+    for _, content, original_text in segments:
+        lines = classify_content(content, original_text)
+        separate_metadata(content, lines)
+        separate_metadata(content, lines)
+        metadata_lines(lines)
+
+
+def measure(func, segments, line_count, seconds):
+    rounds = 0
+    started = time.perf_counter()
+    while True:
+        func(segments)
+        rounds += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= seconds:
+            return rounds * line_count / elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("file", nargs="?", default=os.path.join(ROOT, "joined.vhd"))
+    parser.add_argument("--seconds", type=float, default=2.0)
+    args = parser.parse_args(argv)
+
+    with open(args.file, encoding="utf-8", errors="ignore") as f:
+        segments = parse_segments(f.read())
+    line_count = sum(len(original.splitlines()) for _, _, original in segments)
+
+    old_rate = measure(before, segments, line_count, args.seconds)
+    new_rate = measure(after, segments, line_count, args.seconds)
+    print(f"{os.path.basename(args.file)}: {len(segments)} segments, {line_count} lines")
+    print(f"before: {old_rate:12,.0f} lines/s")
+    print(f"after:  {new_rate:12,.0f} lines/s  ({new_rate / old_rate:.2f}x)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""Synthetic ``.vhd`` corpora for the benchmarks.
+
+Titles, story sentences and tag lines are sampled from real files
+(``joined.vhd`` and ``sample.txt`` by default) and recombined into as many
+segments as needed.  Each segment holds one to three stories, each starting
+with a ``Timestamp:`` line and followed by a few sentences and tag lines,
+roughly like the real dumps.  The same seed always gives the same file.
+"""
+import datetime
+import os
+import random
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from line_kinds import CONTENT, METADATA_KINDS, TIMESTAMP, TITLE, classify_content
+from segment_parser import parse_segments
+from split_utils import split_sentences
+
+DEFAULT_SOURCES = (os.path.join(ROOT, "joined.vhd"), os.path.join(ROOT, "sample.txt"))
+
+# Share of segments holding one, two and three stories
+STORY_MIX = ((1, 0.7), (2, 0.2), (3, 0.1))
+
+_FIRST_DAY = datetime.datetime(2023, 1, 1)
+
+
+class Pools:
+    """Titles, sentences and tag lines collected from the source files."""
+
+    def __init__(self, sources=DEFAULT_SOURCES):
+        self.titles = []
+        self.sentences = []
+        self.tags = []
+        for path in sources:
+            with open(path, encoding="utf-8", errors="ignore") as f:
+                segments = parse_segments(f.read())
+            for title, content, original_text in segments:
+                self.titles.append(title.strip())
+                self._collect(content, original_text)
+        if not self.titles or not self.sentences:
+            raise ValueError("the source files hold no usable segments")
+
+    def _collect(self, content, original_text):
+        story = []
+        for line, kind in classify_content(content, original_text):
+            if kind in METADATA_KINDS and kind != TIMESTAMP:
+                self.tags.append(line.strip())
+            elif kind in (CONTENT, TITLE):
+                story.append(line)
+        self.sentences.extend(s for s in split_sentences("\n".join(story)) if len(s) > 3)
+
+
+def _story(rng, pools):
+    when = _FIRST_DAY + datetime.timedelta(minutes=rng.randrange(365 * 24 * 60))
+    lines = [f"Timestamp: {when:%Y-%m-%d %H:%M}"]
+    sentences = rng.choices(pools.sentences, k=rng.randint(1, 4))
+    # Sentences are often run together on one line
+    while sentences:
+        take = rng.randint(1, 2)
+        lines.append(" ".join(sentences[:take]))
+        sentences = sentences[take:]
+    if pools.tags:
+        lines.extend(rng.choices(pools.tags, k=rng.randint(0, 3)))
+    return lines
+
+
+def segment_text(rng, pools, number):
+    """Return the text of one synthetic segment."""
+    title = rng.choice(pools.titles)
+    if title.endswith('"'):
+        title = f'{title[:-1]} {number}"'
+    stories = rng.choices([n for n, _ in STORY_MIX], [w for _, w in STORY_MIX])[0]
+    lines = [title]
+    for i in range(stories):
+        if i:
+            lines.append("")
+        lines.extend(_story(rng, pools))
+    return "\n".join(lines)
+
+
+def generate_corpus(path, segments, seed=0, sources=DEFAULT_SOURCES):
+    """Write a corpus of ``segments`` segments to ``path``; returns its size in bytes."""
+    rng = random.Random(seed)
+    pools = Pools(sources)
+    with open(path, "w", encoding="utf-8") as f:
+        for number in range(1, segments + 1):
+            f.write(segment_text(rng, pools, number) + "\n\n")
+        return f.tell()
@@ -0,0 +1,238 @@
+"""In-process stand-in for the model backends.
+
+``FakeBackend`` answers the engine's prompts after a configurable delay, with
+a YES verdict for a configurable share of segments.  It reads the numbered
+sentences of the prompt so its split points are valid, answers packed
+prompts segment by segment, and answers in JSON when given a schema.
+Verdicts depend only on the prompt and the seed, not on thread timing.
+
+``script`` fixes the answer for given segments: a list of split points, or a
+string sent back as the raw answer (e.g. to test unparseable answers).  Keys
+pick segments by
+
+* title line, e.g. ``"Title:Moscow"`` (every segment with that title),
+* content key, ``segment_key(title, content)``: a hash of the title and the
+  story sentences, i.e. what a prompt shows of the segment, or
+* segment number, e.g. ``#12`` (1-based, in file order).  Packed prompts
+  carry the number; with ``input_path`` the numbers are turned into content
+  keys of that file's segments, so single-segment prompts match too.
+
+A segment number wins over a content key, which wins over a title.
+
+``embed`` returns hashed bag-of-words vectors, so sentences sharing words
+come out similar and unrelated ones do not.
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import time
+import zlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from llm_clients import RetryingClient
+from segment_parser import read_segments
+from sort_engine import SortEngine
+from split_utils import story_sentences
+
+_SEGMENT_BLOCK = re.compile(r"^=== SEGMENT (\d+) ===$", re.MULTILINE)
+_SENTENCE_NUMBER = re.compile(r"^\[(\d+)\]", re.MULTILINE)
+_SENTENCE_LINE = re.compile(r"^\[\d+\] (.*)$", re.MULTILINE)
+_TITLE_LINE = re.compile(r'^"Title:.*$', re.MULTILINE)
+_WORD = re.compile(r"\w+")
+
+# Length of the fake embedding vectors
+EMBED_DIMENSIONS = 64
+
+
+class FakeBackend(RetryingClient):
+    """Answer prompts after ``latency`` seconds (plus up to ``jitter``)."""
+
+    name = "Fake backend"
+
+    def __init__(self, latency=0.0, jitter=0.0, yes_rate=0.2, seed=0, script=None,
+                 input_path=None, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+        self.jitter = jitter
+        self.yes_rate = yes_rate
+        self.seed = seed
+        self.script = dict(script or {})
+        if input_path:
+            self.script = resolve_segment_numbers(self.script, input_path)
+
+    def chat(self, model, prompt, max_tokens=None, stop_when=None, schema=None, system=None,
+             think=None):
+        def send():
+            rng = self.rng(prompt)
+            delay = self.latency + rng.uniform(0, self.jitter)
+            if delay:
+                time.sleep(delay)
+            return self.answer(prompt, schema is not None, rng)
+        return self._call(send)
+
+    def embed(self, model, texts):
+        def send():
+            if self.latency:
+                time.sleep(self.latency)
+            return [self.embedding(text) for text in texts]
+        return self._call(send)
+
+    def embedding(self, text):
+        """Return the hashed bag-of-words vector of ``text``."""
+        vector = [0.0] * EMBED_DIMENSIONS
+        for word in _WORD.findall(text.lower()):
+            vector[zlib.crc32(word.encode()) % EMBED_DIMENSIONS] += 1.0
+        return vector
+
+    def rng(self, prompt):
+        """Return the random generator that answers ``prompt``."""
+        return random.Random(f"{self.seed}:{prompt}")
+
+    def answer(self, prompt, structured, rng=None):
+        """Return the answer text to ``prompt``, without any delay."""
+        rng = rng or self.rng(prompt)
+        starts = list(_SEGMENT_BLOCK.finditer(prompt))
+        if not starts:
+            return self._decision_text(rng, prompt, None, structured)
+        # Packed prompt: one answer per segment block
+        entries = []
+        for i, match in enumerate(starts):
+            end = starts[i + 1].start() if i + 1 < len(starts) else len(prompt)
+            entries.append(self._decision_text(rng, prompt[match.end():end], int(match.group(1)), structured))
+        if structured:
+            decisions = []
+            for entry in entries:
+                try:
+                    decisions.append(json.loads(entry))
+                except ValueError:
+                    pass  # A scripted raw answer; leave the segment out
+            return json.dumps({"segments": decisions})
+        return "\n\n".join(entries)
+
+    def _decision_text(self, rng, block, segment_id, structured):
+        sentences = _sentence_count(block)
+        scripted = self.scripted(block, segment_id)
+        if isinstance(scripted, str):
+            return scripted
+        split_after = []
+        if scripted is not None:
+            split_after = [p for p in scripted if 0 < p < sentences]
+        elif sentences > 1 and rng.random() < self.yes_rate:
+            split_after = sorted(rng.sample(range(1, sentences), rng.randint(1, min(2, sentences - 1))))
+        if structured:
+            decision = {
+                "contains_multiple_stories": bool(split_after),
+                "number_of_stories": len(split_after) + 1,
+                "split_after": split_after,
+                "reasoning": "fake",
+            }
+            if segment_id is not None:
+                decision = {"segment": segment_id, **decision}
+            return json.dumps(decision)
+        lines = [] if segment_id is None else [f"SEGMENT: {segment_id}"]
+        lines += [
+            f"CONTAINS_MULTIPLE_STORIES: {'YES' if split_after else 'NO'}",
+            f"NUMBER_OF_STORIES: {len(split_after) + 1}",
+            f"SPLIT_AFTER: {','.join(map(str, split_after))}",
+            "REASONING: fake",
+        ]
+        return "\n".join(lines)
+
+
+    def scripted(self, block, segment_id=None):
+        """Return the scripted answer of one segment's prompt text, or ``None``."""
+        if not self.script:
+            return None
+        if segment_id is not None and f"#{segment_id}" in self.script:
+            return self.script[f"#{segment_id}"]
+        title = _TITLE_LINE.search(block)
+        if title is None:
+            return None
+        title = title.group().strip()
+        key = _content_key(title, _SENTENCE_LINE.findall(block))
+        if key in self.script:
+            return self.script[key]
+        return self.script.get(title)
+
+
+def segment_key(title, content, lines=None):
+    """Return the ``script`` content key of a segment.
+
+    Prompts cut short by a token budget show fewer sentences and do not
+    match it.
+    """
+    return _content_key(title.strip(), [sentence for _, sentence in story_sentences(content, lines)])
+
+
+def _content_key(title, sentences):
+    digest = hashlib.sha256("\n".join([title, *sentences]).encode("utf-8")).hexdigest()
+    return "sha256:" + digest[:16]
+
+
+def resolve_segment_numbers(script, input_path):
+    """Return ``script`` with ``#N`` keys replaced by content keys of ``input_path``.
+
+    Numbers past the last segment are dropped.  A key already in ``script``
+    is not overwritten.
+    """
+    numbers = {}
+    for key, answer in script.items():
+        if key.startswith("#") and key[1:].isdigit():
+            numbers[int(key[1:])] = answer
+    if not numbers:
+        return dict(script)
+    resolved = {key: answer for key, answer in script.items() if not key.startswith("#")}
+    with open(input_path, "r", encoding="utf-8", errors="ignore") as f:
+        for number, segment in enumerate(read_segments(f), 1):
+            if number in numbers:
+                key = segment_key(segment.title, segment.content, segment.lines())
+                resolved.setdefault(key, numbers[number])
+    return resolved
+
+
+def _sentence_count(text):
+    numbers = _SENTENCE_NUMBER.findall(text)
+    return int(numbers[-1]) if numbers else 0
+
+
+class BenchEngine(SortEngine):
+    """``SortEngine`` whose backends are one shared ``FakeBackend``.
+
+    ``stage_seconds`` adds up the wall time spent in each stage of the run:
+    ``analysis`` (pre-filter, cache and waiting for answers), ``commit``
+    (splitting and writing segments) and ``save``.
+    """
+
+    def __init__(self, backend, **kwargs):
+        super().__init__(**kwargs)
+        self.backend = backend
+        self.stage_seconds = {"analysis": 0.0, "commit": 0.0, "save": 0.0}
+
+    def _client(self, backend):
+        with self._clients_lock:
+            self._clients.setdefault(backend, self.backend)
+        return self.backend
+
+    def _timed(self, stage, func, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.stage_seconds[stage] += time.perf_counter() - started
+
+    def _analysis_for_current_segment(self):
+        return self._timed("analysis", super()._analysis_for_current_segment)
+
+    def keep_current_segment(self, manual=False):
+        return self._timed("commit", super().keep_current_segment, manual)
+
+    def split_current_segment(self, split_points):
+        return self._timed("commit", super().split_current_segment, split_points)
+
+    def save(self):
+        return self._timed("save", super().save)
@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""Stand-in HTTP server speaking the Ollama and OpenAI chat protocols.
+
+Answers come from ``fake_backend.FakeBackend``, so verdicts can be scripted
+per title, segment number or content key and are otherwise drawn at
+``--yes-rate``.  Served endpoints:
+
+* ``POST /api/chat``: Ollama, streamed as NDJSON unless ``"stream": false``
+* ``GET /api/tags`` and ``GET /``: Ollama model list and health check
+* ``POST /api/generate`` without a prompt: Ollama model preload
+* ``POST /api/embed``: Ollama embeddings (hashed bag of words)
+* ``POST /v1/chat/completions``: OpenAI, streamed as server-sent events with
+  ``"stream": true``
+* ``GET /stats``: request, error and concurrency counters as JSON
+
+Each request waits a latency drawn from ``--latency-dist`` with mean
+``--latency``; streamed answers spread that wait over their chunks.
+``--error-rate`` and ``--rate-limit-rate`` inject 500 and 429 (with
+``Retry-After``) responses, and ``--max-concurrent`` makes requests beyond
+that many queue like on a real server.  Finished answers report token counts
+(Ollama's ``eval_count`` and friends, OpenAI's ``usage``) of about four
+characters per token.  Point the app at it with
+``--ollama-host`` / ``--openai-base-url``:
+
+    python benchmarks/fake_server.py --port 11435 --latency 0.5 --max-concurrent 2
+    python textsorter.py joined.vhd -j 4 --ollama-host http://127.0.0.1:11435
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+from fake_backend import FakeBackend
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+
+DEFAULT_MODELS = ("qwen3:0.6b", "qwen3:14b", "gpt-4.1-nano")
+
+
+def sample_latency(rng, distribution, mean, sigma=0.5):
+    """Draw one latency in seconds with the given ``mean``."""
+    if mean <= 0:
+        return 0.0
+    if distribution == "uniform":
+        return rng.uniform(0, 2 * mean)
+    if distribution == "exponential":
+        return rng.expovariate(1 / mean)
+    if distribution == "lognormal":
+        # mu is chosen so the mean stays ``mean``
+        return mean * rng.lognormvariate(-sigma * sigma / 2, sigma)
+    return mean
+
+
+class FakeModelServer:
+    """Threaded fake model server; ``port=0`` picks a free port.
+
+    Use as a context manager, or call ``start()`` and ``stop()``.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, backend=None, latency=0.0,
+                 latency_dist="fixed", latency_sigma=0.5, error_rate=0.0,
+                 rate_limit_rate=0.0, retry_after=1.0, max_concurrent=0, chunk_chars=8,
+                 models=DEFAULT_MODELS, seed=0):
+        if latency_dist not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"unknown latency distribution: {latency_dist}")
+        self.backend = backend or FakeBackend(seed=seed)
+        self.latency = latency
+        self.latency_dist = latency_dist
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.chunk_chars = max(1, chunk_chars)
+        self.models = list(models)
+        self._slots = threading.BoundedSemaphore(max_concurrent) if max_concurrent > 0 else None
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.stats = {
+            "requests": 0, "ollama": 0, "openai": 0, "streamed": 0, "cancelled": 0,
+            "errors": 0, "rate_limited": 0, "peak_concurrent": 0, "preloads": 0,
+            "embeds": 0,
+        }
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.fake = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def openai_base_url(self):
+        return self.url + "/v1"
+
+    def start(self):
+        # A short poll interval keeps stop() quick
+        self._thread = threading.Thread(target=self._httpd.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def serve_forever(self):
+        """Serve on the calling thread until interrupted."""
+        try:
+            self._httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def injected_error(self):
+        """Return ``(status, headers)`` of an injected error, or ``None``."""
+        with self._lock:
+            roll = self._rng.random()
+        if roll < self.rate_limit_rate:
+            self.count("rate_limited")
+            return 429, {"Retry-After": f"{self.retry_after:g}"}
+        if roll < self.rate_limit_rate + self.error_rate:
+            self.count("errors")
+            return 500, {}
+        return None
+
+    def latency_for_request(self):
+        with self._lock:
+            return sample_latency(self._rng, self.latency_dist, self.latency, self.latency_sigma)
+
+    def slot(self):
+        """Context manager holding one of the ``max_concurrent`` slots."""
+        return _Slot(self)
+
+    def chunks(self, text):
+        return [text[i:i + self.chunk_chars] for i in range(0, len(text), self.chunk_chars)] or [""]
+
+
+class _Slot:
+    def __init__(self, server):
+        self.server = server
+
+    def __enter__(self):
+        server = self.server
+        if server._slots is not None:
+            server._slots.acquire()
+        with server._lock:
+            server._in_flight += 1
+            server.stats["peak_concurrent"] = max(server.stats["peak_concurrent"], server._in_flight)
+
+    def __exit__(self, *exc):
+        server = self.server
+        with server._lock:
+            server._in_flight -= 1
+        if server._slots is not None:
+            server._slots.release()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # Keep-alive, like the real servers, so client connection pools are used
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def fake(self):
+        return self.server.fake
+
+    def do_GET(self):
+        if self.path == "/":
+            self._send(200, b"Ollama is running", "text/plain")
+        elif self.path == "/api/tags":
+            self._send_json(200, {"models": [{"name": m, "model": m} for m in self.fake.models]})
+        elif self.path == "/v1/models":
+            self._send_json(200, {"object": "list",
+                                  "data": [{"id": m, "object": "model"} for m in self.fake.models]})
+        elif self.path == "/stats":
+            with self.fake._lock:
+                stats = dict(self.fake.stats)
+            self._send_json(200, stats)
+        else:
+            self._send_json(404, {"error": f"not found: {self.path}"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": "invalid JSON"})
+            return
+        if self.path == "/api/chat":
+            self._chat(body, ollama=True)
+        elif self.path == "/api/generate" and not body.get("prompt"):
+            self.fake.count("preloads")
+            self._send_json(200, {"model": body.get("model", ""), "created_at": _now(),
+                                  "response": "", "done": True, "done_reason": "load"})
+        elif self.path == "/api/embed":
+            self._embed(body)
+        elif self.path in ("/v1/chat/completions", "/chat/completions"):
+            self._chat(body, ollama=False)
+        else:
+            self._send_json(404, {"error": f"not found: {self.path}"})
+
+    def _embed(self, body):
+        fake = self.fake
+        fake.count("embeds")
+        texts = body.get("input", [])
+        if isinstance(texts, str):
+            texts = [texts]
+        with fake.slot():
+            embeddings = fake.backend.embed(body.get("model", ""), texts)
+        self._send_json(200, {"model": body.get("model", ""), "embeddings": embeddings,
+                              "prompt_eval_count": sum(_tokens(text) for text in texts)})
+
+    def _chat(self, body, ollama):
+        fake = self.fake
+        fake.count("requests")
+        fake.count("ollama" if ollama else "openai")
+        error = fake.injected_error()
+        if error is not None:
+            status, headers = error
+            self._send_json(status, {"error": "injected error"}, headers)
+            return
+
+        messages = body.get("messages") or [{}]
+        prompt = messages[-1].get("content") or ""
+        model = body.get("model", "")
+        if ollama:
+            structured = body.get("format") is not None
+            stream = body.get("stream", True)
+        else:
+            structured = body.get("response_format") is not None
+            stream = bool(body.get("stream", False))
+
+        with fake.slot():
+            latency = fake.latency_for_request()
+            answer = fake.backend.answer(prompt, structured)
+            usage = _usage(prompt, answer, latency)
+            if not stream:
+                time.sleep(latency)
+                self._send_json(200, _ollama_message(model, answer, True, usage) if ollama
+                                else _openai_completion(model, answer, usage))
+                return
+            fake.count("streamed")
+            if not ollama and not (body.get("stream_options") or {}).get("include_usage"):
+                usage = None
+            try:
+                self._stream(model, answer, latency, ollama, usage)
+            except (BrokenPipeError, ConnectionResetError):
+                # The client hung up early, as the app does once it has a verdict
+                fake.count("cancelled")
+                self.close_connection = True
+
+    def _stream(self, model, answer, latency, ollama, usage):
+        chunks = self.fake.chunks(answer)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson" if ollama else "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        delay = latency / len(chunks)
+        for chunk in chunks:
+            time.sleep(delay)
+            if ollama:
+                self._write_chunk(json.dumps(_ollama_message(model, chunk, False)) + "\n")
+            else:
+                self._write_chunk("data: " + json.dumps(_openai_delta(model, chunk)) + "\n\n")
+        if ollama:
+            self._write_chunk(json.dumps(_ollama_message(model, "", True, usage)) + "\n")
+        else:
+            if usage is not None:
+                self._write_chunk("data: " + json.dumps(_openai_usage_chunk(model, usage)) + "\n\n")
+            self._write_chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _write_chunk(self, text):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_json(self, status, data, headers=None):
+        self._send(status, json.dumps(data).encode("utf-8"), "application/json", headers)
+
+    def _send(self, status, data, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+
+def _tokens(text):
+    # About four characters per token, like sort_engine.estimate_tokens
+    return max(1, len(text) // 4)
+
+
+def _usage(prompt, answer, latency):
+    """Return ``(prompt tokens, answer tokens, generation seconds)``."""
+    return _tokens(prompt), _tokens(answer), latency
+
+
+def _ollama_message(model, content, done, usage=None):
+    message = {"model": model, "created_at": _now(),
+               "message": {"role": "assistant", "content": content}, "done": done}
+    if done:
+        message["done_reason"] = "stop"
+        if usage is not None:
+            prompt_tokens, eval_tokens, seconds = usage
+            message.update(prompt_eval_count=prompt_tokens, eval_count=eval_tokens,
+                           eval_duration=int(seconds * 1e9))
+    return message
+
+
+def _openai_usage(usage):
+    prompt_tokens, eval_tokens, _ = usage
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": eval_tokens,
+            "total_tokens": prompt_tokens + eval_tokens}
+
+
+def _openai_completion(model, content, usage):
+    return {
+        "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                     "finish_reason": "stop"}],
+        "usage": _openai_usage(usage),
+    }
+
+
+def _openai_usage_chunk(model, usage):
+    return {
+        "id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+        "model": model, "choices": [], "usage": _openai_usage(usage),
+    }
+
+
+def _openai_delta(model, content):
+    return {
+        "id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": {"content": content}, "finish_reason": None}],
+    }
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=0.0, help="Mean seconds per request")
+    parser.add_argument("--latency-dist", choices=LATENCY_DISTRIBUTIONS, default="fixed")
+    parser.add_argument("--latency-sigma", type=float, default=0.5,
+                        help="Spread of the lognormal distribution (default: 0.5)")
+    parser.add_argument("--yes-rate", type=float, default=0.2,
+                        help="Share of unscripted segments answered YES (default: 0.2)")
+    parser.add_argument("--script", metavar="JSON",
+                        help='File mapping titles, #segment numbers or content keys to split points '
+                             'or raw answers, e.g. {"\\"Title:Moscow\\"": [2], "#3": "garbled"}')
+    parser.add_argument("--input", metavar="FILE",
+                        help="Input file the run will sort; lets #N script keys match "
+                             "single-segment requests too")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0,
+                        help="Share of requests answered 429")
+    parser.add_argument("--retry-after", type=float, default=1.0,
+                        help="Retry-After seconds sent with 429 responses (default: 1)")
+    parser.add_argument("--max-concurrent", type=int, default=0,
+                        help="Requests served at once; more wait their turn (default: no limit)")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    script = None
+    if args.script:
+        with open(args.script, encoding="utf-8") as f:
+            script = json.load(f)
+    server = FakeModelServer(
+        args.host, args.port,
+        backend=FakeBackend(yes_rate=args.yes_rate, seed=args.seed, script=script,
+                            input_path=args.input),
+        latency=args.latency, latency_dist=args.latency_dist, latency_sigma=args.latency_sigma,
+        error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after, max_concurrent=args.max_concurrent, seed=args.seed,
+    )
+    print(f"Ollama: {server.url}  OpenAI: {server.openai_base_url}", flush=True)
+    server.serve_forever()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""Benchmark suite: the full pipeline on synthetic corpora with a fake backend.
+
+For each corpus size a ``.vhd`` file is generated (``corpus.py``) and
+processed end to end by ``SortEngine`` against the in-process
+``fake_backend.FakeBackend``.  Reported per size: parse time, segments per
+second through the whole pipeline, per-stage timings, model requests and
+peak traced memory.  The report is printed and optionally written as JSON.
+
+It is compared against the reference report committed as
+``benchmarks/baseline.json`` (or ``--baseline``), and regressions beyond
+``--tolerance`` make the command exit with status 1.  Sizes the baseline
+does not have are not compared.  ``--write-baseline`` stores the report as
+the new baseline instead.
+
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --write-baseline
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+from corpus import generate_corpus
+from fake_backend import BenchEngine, FakeBackend
+from segment_parser import count_segments, read_segments
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+
+# Reference report the results are compared against
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+
+# Metrics compared against the baseline: name -> True if higher is better
+COMPARED_METRICS = {
+    "segments_per_sec": True,
+    "parse_segments_per_sec": True,
+    "peak_memory_mb": False,
+}
+
+
+def measure_parse(path):
+    """Return the seconds taken to count and parse every segment of ``path``."""
+    started = time.perf_counter()
+    count_segments(path)
+    with open(path, encoding="utf-8", errors="ignore") as f:
+        for _ in read_segments(f):
+            pass
+    return time.perf_counter() - started
+
+
+def run_pipeline(path, output, args):
+    backend = FakeBackend(latency=args.latency, jitter=args.jitter,
+                          yes_rate=args.yes_rate, seed=args.seed)
+    engine = BenchEngine(
+        backend,
+        workers=args.workers,
+        batch_tokens=args.batch_tokens,
+        prefilter=not args.no_prefilter,
+        structured=not args.text_answers,
+    )
+    started = time.perf_counter()
+    engine.run(path, output)
+    return engine, backend, time.perf_counter() - started
+
+
+def measure_peak_memory(path, output, args):
+    """Return the peak traced memory of a second pipeline run in MiB."""
+    tracemalloc.start()
+    try:
+        run_pipeline(path, output, args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / (1024 * 1024)
+
+
+def bench_size(size, tmp, args):
+    path = os.path.join(tmp, f"corpus_{size}.vhd")
+    output = os.path.join(tmp, f"corpus_{size}_sorted.vhd")
+    size_bytes = generate_corpus(path, size, seed=args.seed)
+
+    parse_seconds = measure_parse(path)
+    engine, backend, run_seconds = run_pipeline(path, output, args)
+    result = {
+        "segments": engine.segment_count,
+        "bytes": size_bytes,
+        "parse_seconds": round(parse_seconds, 4),
+        "parse_segments_per_sec": round(engine.segment_count / parse_seconds, 1),
+        "run_seconds": round(run_seconds, 4),
+        "segments_per_sec": round(engine.segment_count / run_seconds, 1),
+        "stages": {stage: round(seconds, 4) for stage, seconds in engine.stage_seconds.items()},
+        "model_requests": backend.stats.requests,
+        "model_calls_skipped": engine.model_calls_skipped,
+        "output_segments": engine.processed_count,
+    }
+    if not args.no_memory:
+        result["peak_memory_mb"] = round(measure_peak_memory(path, output, args), 2)
+    for name in (path, output):
+        os.remove(name)
+    return result
+
+
+def compare(report, baseline, tolerance):
+    """Return a list of regression messages of ``report`` against ``baseline``."""
+    regressions = []
+    if baseline.get("settings") != report["settings"]:
+        print("Warning: the baseline was run with different settings", file=sys.stderr)
+    for size, result in report["results"].items():
+        old = baseline.get("results", {}).get(size)
+        if old is None:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            if metric not in result or metric not in old or not old[metric]:
+                continue
+            change = (result[metric] - old[metric]) / old[metric]
+            if (change < -tolerance) if higher_is_better else (change > tolerance):
+                regressions.append(
+                    f"{size} segments: {metric} {old[metric]} -> {result[metric]} ({change:+.1%})"
+                )
+    return regressions
+
+
+def print_report(report):
+    for size, r in report["results"].items():
+        memory = f", peak {r['peak_memory_mb']:.1f} MiB" if "peak_memory_mb" in r else ""
+        stages = ", ".join(f"{stage} {seconds:.2f} s" for stage, seconds in r["stages"].items())
+        print(f"{size:>7} segments: {r['segments_per_sec']:10,.0f} segments/s "
+              f"(parse {r['parse_segments_per_sec']:,.0f}/s{memory}); {stages}; "
+              f"{r['model_requests']} requests")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Seconds the fake backend takes per request (default: 0)")
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="Extra random delay of up to this many seconds per request")
+    parser.add_argument("--yes-rate", type=float, default=0.2,
+                        help="Share of segments the fake backend splits (default: 0.2)")
+    parser.add_argument("-j", "--workers", type=int, default=1)
+    parser.add_argument("--batch-tokens", type=int, default=0)
+    parser.add_argument("--no-prefilter", action="store_true")
+    parser.add_argument("--text-answers", action="store_true")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="Skip the second, traced run that measures peak memory")
+    parser.add_argument("--json", metavar="PATH", help="Write the report to PATH")
+    parser.add_argument("--baseline", metavar="PATH", default=DEFAULT_BASELINE,
+                        help="Baseline report to compare against (default: benchmarks/baseline.json)")
+    parser.add_argument("--no-baseline", action="store_true", help="Do not compare against a baseline")
+    parser.add_argument("--write-baseline", action="store_true",
+                        help="Write the report to the baseline path instead of comparing")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed relative slowdown or growth before a regression is flagged")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    settings = {
+        "seed": args.seed, "latency": args.latency, "jitter": args.jitter,
+        "yes_rate": args.yes_rate, "workers": args.workers, "batch_tokens": args.batch_tokens,
+        "prefilter": not args.no_prefilter, "structured": not args.text_answers,
+    }
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": settings,
+        "results": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            report["results"][str(size)] = bench_size(size, tmp, args)
+    print_report(report)
+
+    status = 0
+    if args.write_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+    elif args.no_baseline:
+        pass
+    elif not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --write-baseline to record one")
+    else:
+        with open(args.baseline, encoding="utf-8") as f:
+            report["regressions"] = compare(report, json.load(f), args.tolerance)
+        for message in report["regressions"]:
+            print(f"REGRESSION {message}")
+        if report["regressions"]:
+            status = 1
+        else:
+            print(f"No regressions against {args.baseline}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,49 @@
+"""Split points from sentence embeddings instead of a chat answer.
+
+The story sentences of a segment (``split_utils.story_sentences``, numbered
+as ``split_segment`` counts them) are embedded in one batched request to an
+Ollama embedding model.  Where the cosine similarity of two neighbouring
+sentences drops below a threshold, a new story is assumed to start.  One
+embedding request costs a fraction of a chat generation, so this is a cheap
+screening mode; the engine can have the chat model confirm the segments it
+proposes to split.
+
+NumPy is imported when similarities are first computed, not when this module
+is imported.
+"""
+
+# Ollama embedding model used when nothing else has been selected
+DEFAULT_EMBED_MODEL = "nomic-embed-text"
+
+# Neighbouring sentences less similar than this are split apart
+DEFAULT_SPLIT_THRESHOLD = 0.5
+
+
+def adjacent_similarities(vectors):
+    """Return the cosine similarity of each pair of neighbouring ``vectors``."""
+    import numpy as np
+
+    matrix = np.asarray(vectors, dtype=float)
+    if len(matrix) < 2:
+        return []
+    norms = np.linalg.norm(matrix, axis=1)
+    norms[norms == 0] = 1.0
+    unit = matrix / norms[:, None]
+    return (unit[:-1] * unit[1:]).sum(axis=1).tolist()
+
+
+def propose_split_points(numbers, similarities, threshold=DEFAULT_SPLIT_THRESHOLD):
+    """Return the sentence numbers to split after.
+
+    ``numbers`` are the sentence numbers of the embedded sentences and
+    ``similarities`` the similarity of each one to the next.
+    """
+    return [numbers[i] for i, similarity in enumerate(similarities) if similarity < threshold]
+
+
+def similarity_text(numbers, similarities):
+    """Return the similarities as the raw response shown in the log."""
+    pairs = ", ".join(
+        f"{a}-{b}: {similarity:.2f}" for a, b, similarity in zip(numbers, numbers[1:], similarities)
+    )
+    return f"(embedding similarity {pairs or 'n/a'})"
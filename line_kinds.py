@@ -0,0 +1,85 @@
+"""Classify the lines of a segment by kind.
+
+This is the one place that knows what a tag line looks like.  Every line is
+matched once against a single compiled pattern; the engine keeps the result
+for each segment so the pre-filter, the splitter and the writer all reuse it.
+
+A line is matched after stripping surrounding whitespace:
+
+* ``"Title:``          -> ``TITLE``
+* ``--``               -> ``MEDIA`` (image and video references)
+* ``http``             -> ``URL``
+* ``Timestamp:``       -> ``TIMESTAMP``
+* ``Map view:``        -> ``MAP``
+* ``Source:``          -> ``SOURCE``
+* ``@``                -> ``MENTION``
+* two letters and ``-`` (``cc-``, ``jj-``, ``MM-`` ...) -> ``COMMENT``
+* blank                -> ``BLANK``
+* anything else        -> ``CONTENT``
+"""
+import re
+
+TITLE = "title"
+CONTENT = "content"
+BLANK = "blank"
+MEDIA = "media"
+URL = "url"
+TIMESTAMP = "timestamp"
+MAP = "map"
+SOURCE = "source"
+MENTION = "mention"
+COMMENT = "comment"
+
+# Every kind, indexed by the small integer codes used to store labels compactly
+KINDS = (TITLE, CONTENT, BLANK, MEDIA, URL, TIMESTAMP, MAP, SOURCE, MENTION, COMMENT)
+KIND_CODES = {kind: code for code, kind in enumerate(KINDS)}
+
+# Tag lines: ignored by the model, copied into every part of a split segment
+METADATA_KINDS = frozenset({MEDIA, URL, TIMESTAMP, MAP, SOURCE, MENTION, COMMENT})
+
+# Alternatives are tried in order, so "--" wins over a two-letter comment tag
+_LINE_KIND = re.compile(
+    r'(?P<title>"Title:)'
+    r'|(?P<media>--)'
+    r'|(?P<url>http)'
+    r'|(?P<timestamp>Timestamp:)'
+    r'|(?P<map>Map view:)'
+    r'|(?P<source>Source:)'
+    r'|(?P<mention>@)'
+    r'|(?P<comment>[A-Za-z]{2}-)'
+)
+
+
+def classify_line(line):
+    """Return the kind of ``line``."""
+    stripped = line.strip()
+    if not stripped:
+        return BLANK
+    match = _LINE_KIND.match(stripped)
+    return match.lastgroup if match else CONTENT
+
+
+def is_metadata(line):
+    return classify_line(line) in METADATA_KINDS
+
+
+def classify_lines(text):
+    """Return ``[(line, kind), ...]`` for the lines of ``text``."""
+    return [(line, classify_line(line)) for line in text.splitlines()]
+
+
+def classify_content(content, original_text):
+    """Classify the content lines of a segment.
+
+    When the content starts on the title line (text after the closing quote),
+    that first line is labelled ``TITLE`` so it is never taken for a tag line.
+    """
+    lines = classify_lines(content)
+    if lines and len(original_text) > len(content) and original_text[-len(content) - 1] != "\n":
+        lines[0] = (lines[0][0], TITLE)
+    return lines
+
+
+def metadata_lines(lines):
+    """Return the tag lines of classified ``lines``."""
+    return [line for line, kind in lines if kind in METADATA_KINDS]
@@ -0,0 +1,127 @@
+"""Persistent on-disk cache for model responses.
+
+Responses are keyed by model name, prompt template version and a hash of the
+segment text, so re-running an unchanged segment with the same model skips the
+model call entirely.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+# Default cache location, next to the app like app_config.json
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "llm_cache.sqlite3")
+
+# Eviction limits applied when the cache is opened
+DEFAULT_MAX_ENTRIES = 100000
+DEFAULT_MAX_AGE_DAYS = 90
+
+
+def segment_hash(title, content):
+    """Return a stable hash of a segment's text."""
+    return hashlib.sha256(f"{title}\n{content}".encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed response cache with size and age based eviction.
+
+    The cache is safe to share between the analysis worker threads.  ``hits``
+    and ``misses`` count lookups since the cache was opened or the counts
+    were last reset.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES,
+                 max_age_days=DEFAULT_MAX_AGE_DAYS):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        cache_dir = os.path.dirname(path)
+        if cache_dir and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " model TEXT NOT NULL,"
+            " response TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self.evict()
+
+    @staticmethod
+    def make_key(model, prompt_version, title, content):
+        return f"{model}|{prompt_version}|{segment_hash(title, content)}"
+
+    def get(self, key):
+        """Return the cached response for ``key`` or ``None``."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute(
+                "UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+            return row[0]
+
+    def put(self, key, model, response):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, created, last_used)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, model, response, now, now),
+            )
+            self._conn.commit()
+
+    def evict(self):
+        """Drop entries older than ``max_age_days`` and trim to ``max_entries``.
+
+        Returns the number of removed entries.
+        """
+        with self._lock:
+            removed = 0
+            if self.max_age_days:
+                cutoff = time.time() - self.max_age_days * 86400
+                removed += self._conn.execute(
+                    "DELETE FROM responses WHERE created < ?", (cutoff,)
+                ).rowcount
+            if self.max_entries:
+                # Least recently used entries go first
+                removed += self._conn.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    " SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                ).rowcount
+            self._conn.commit()
+            return removed
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def reset_counts(self):
+        """Start counting hits and misses from zero, e.g. for a new run."""
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def stats_text(self):
+        lookups = self.hits + self.misses
+        rate = (self.hits / lookups * 100) if lookups else 0
+        return f"Response cache: {self.hits} hits, {self.misses} misses ({rate:.1f}% hit rate)"
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,692 @@
+"""Pooled HTTP clients for the model backends, with retry and backoff.
+
+Each backend gets one long-lived client whose keep-alive connection pool is
+shared by all analysis threads, so segments after the first skip the TCP
+(and TLS) handshake.  Requests that fail with a transient error (connection
+problems, timeouts, 429 and 5xx responses) are retried with exponential
+backoff and jitter, honouring ``Retry-After``.  When the retries run out a
+``TransientBackendError`` is raised instead of returning a made-up answer.
+
+``chat`` can stream the answer and hang up as soon as ``stop_when(text)``
+says the text received so far is enough, which ends the generation early.
+
+The prompt and answer token counts the servers report (Ollama's
+``prompt_eval_count``, ``eval_count``, ``eval_duration`` and
+``prompt_eval_duration``, OpenAI's ``usage``) are added to the client
+statistics and passed to ``on_usage``.  Streams cut off early report none.
+
+``think`` sets Ollama's thinking flag for reasoning models; streamed
+thinking is handed to ``stop_when`` inside ``<think>`` tags, as models
+without the flag write it.  ``system`` is sent as a system message ahead of
+the prompt.  Keeping it the same for every request lets the server reuse the
+processed prefix.  Ollama clients ask the server to keep the model loaded for
+``keep_alive`` and can ``preload`` it before the first request.
+
+``OllamaHostPool`` spreads requests over several Ollama servers, sending each
+one to the healthy host with the fewest requests in flight.
+
+``requests``, ``httpx`` and ``ollama`` are imported when a client is created,
+not when this module is imported.
+"""
+import email.utils
+import json
+import random
+import sys
+import threading
+import time
+
+OPENAI_BASE_URL = "https://api.openai.com/v1"
+OPENAI_URL = OPENAI_BASE_URL + "/chat/completions"
+
+# Connection pool and timeout defaults (seconds).  Responses get no read
+# timeout by default: a packed request or a large model on a CPU can take
+# minutes, and a timed-out request would only be sent again from scratch.
+DEFAULT_POOL_SIZE = 8
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_READ_TIMEOUT = None
+
+# Retries after the first attempt, and the backoff they wait
+DEFAULT_MAX_RETRIES = 4
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+
+# How long Ollama keeps a model loaded after a request (Ollama's default is 5m)
+DEFAULT_KEEP_ALIVE = "30m"
+
+# HTTP status codes worth trying again
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+
+# A failing Ollama host is left out this long, doubling with each failure in
+# a row up to the maximum, and health-checked before it gets requests again
+EJECT_SECONDS = 30.0
+EJECT_MAX_SECONDS = 300.0
+
+
+class TransientBackendError(Exception):
+    """A model request kept failing with a transient error."""
+
+
+def _status_code(exc):
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status
+
+
+def is_retryable(exc):
+    """Return True if ``exc`` is a transient error worth retrying."""
+    if isinstance(exc, TransientBackendError):
+        # One host gave up; another may still answer
+        return True
+    status = _status_code(exc)
+    if isinstance(status, int) and status > 0:
+        return status in RETRYABLE_STATUS
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    # Only check the client libraries that are already loaded
+    requests = sys.modules.get("requests")
+    if requests is not None and isinstance(exc, (requests.ConnectionError, requests.Timeout)):
+        return True
+    httpx = sys.modules.get("httpx")
+    if httpx is not None and isinstance(exc, httpx.TransportError):
+        return True
+    return False
+
+
+def parse_retry_after(value):
+    """Return the delay in seconds of a ``Retry-After`` header, or ``None``."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when is None:
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def retry_after(exc):
+    """Return the ``Retry-After`` delay sent with the response behind ``exc``."""
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    return parse_retry_after(headers.get("Retry-After"))
+
+
+def parse_keep_alive(value):
+    """Return a ``keep_alive`` setting: a number of seconds or a duration like "30m".
+
+    Ollama reads a negative number as "keep loaded until stopped" and 0 as
+    "unload right away".
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def backoff_delay(attempt, retry_after_seconds=None, base=BACKOFF_BASE, cap=BACKOFF_MAX):
+    """Return how long to wait before retry number ``attempt`` (0-based).
+
+    A server-sent ``Retry-After`` wins; otherwise the delay doubles with each
+    attempt and a random half of it is dropped so parallel workers do not
+    retry in lockstep.
+    """
+    if retry_after_seconds is not None:
+        return min(retry_after_seconds, cap)
+    delay = min(cap, base * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class ClientStats:
+    """Request, retry and latency counters of one client (thread-safe)."""
+
+    def __init__(self, name):
+        self.name = name
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.early_stops = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.prompt_tokens = 0
+        self.eval_tokens = 0
+        self.eval_seconds = 0.0
+        self.prompt_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record_success(self, latency):
+        with self._lock:
+            self.requests += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+
+    def record_early_stop(self):
+        with self._lock:
+            self.early_stops += 1
+
+    def record_usage(self, prompt_tokens, eval_tokens, eval_seconds, prompt_seconds=None):
+        with self._lock:
+            self.prompt_tokens += prompt_tokens or 0
+            self.eval_tokens += eval_tokens or 0
+            if eval_tokens and eval_seconds:
+                self.eval_seconds += eval_seconds
+            self.prompt_seconds += prompt_seconds or 0.0
+
+    @property
+    def average_latency(self):
+        return self.total_latency / self.requests if self.requests else 0.0
+
+    @property
+    def tokens_per_second(self):
+        return self.eval_tokens / self.eval_seconds if self.eval_seconds else 0.0
+
+    def summary_text(self):
+        text = (
+            f"{self.name}: {self.requests} requests, {self.retries} retries, "
+            f"{self.failures} failures, {self.early_stops} stopped early, "
+            f"average latency {self.average_latency:.2f} s (max {self.max_latency:.2f} s)"
+        )
+        if self.prompt_tokens or self.eval_tokens:
+            text += (f", {self.prompt_tokens} prompt + {self.eval_tokens} answer tokens "
+                     f"({self.tokens_per_second:.1f} tokens/s)")
+        return text
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "name": self.name,
+                "requests": self.requests,
+                "retries": self.retries,
+                "failures": self.failures,
+                "early_stops": self.early_stops,
+                "average_latency": self.average_latency,
+                "max_latency": self.max_latency,
+                "prompt_tokens": self.prompt_tokens,
+                "eval_tokens": self.eval_tokens,
+                "eval_seconds": self.eval_seconds,
+                "prompt_seconds": self.prompt_seconds,
+            }
+
+
+class RetryingClient:
+    """Base class running requests through the retry loop.
+
+    ``on_retry(message)`` is called before every backoff wait, and
+    ``on_usage(prompt_tokens, eval_tokens, eval_seconds, prompt_seconds)``
+    after every answer that came with token counts (``prompt_seconds`` is
+    ``None`` when the server does not time the prompt).
+    """
+
+    name = "HTTP"
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT, max_retries=DEFAULT_MAX_RETRIES,
+                 on_retry=None, on_usage=None, sleep=time.sleep):
+        self.pool_size = max(1, int(pool_size))
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max(0, int(max_retries))
+        self.stats = ClientStats(self.name)
+        self._on_retry = on_retry or (lambda message: None)
+        self._on_usage = on_usage or (lambda *usage: None)
+        self._sleep = sleep
+
+    def _call(self, send):
+        """Run ``send()`` until it succeeds, fails for good, or retries run out."""
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                result = send()
+            except Exception as e:
+                if not is_retryable(e):
+                    self.stats.record_failure()
+                    raise
+                if attempt >= self.max_retries:
+                    self.stats.record_failure()
+                    raise TransientBackendError(
+                        f"{self.name} request failed after {attempt + 1} attempts: {e}"
+                    ) from e
+                delay = self._retry_delay(attempt, e)
+                self.stats.record_retry()
+                self._on_retry(f"{self.name} request failed ({e}); retrying in {delay:.1f} s")
+                self._sleep(delay)
+                attempt += 1
+                continue
+            self.stats.record_success(time.monotonic() - started)
+            return result
+
+    def _retry_delay(self, attempt, exc):
+        return backoff_delay(attempt, retry_after(exc))
+
+    def _record_usage(self, prompt_tokens, eval_tokens, eval_seconds, prompt_seconds=None):
+        if prompt_tokens is None and eval_tokens is None:
+            return
+        self.stats.record_usage(prompt_tokens, eval_tokens, eval_seconds, prompt_seconds)
+        self._on_usage(prompt_tokens, eval_tokens, eval_seconds, prompt_seconds)
+
+    def summary_lines(self):
+        """Return the lines of the end-of-run statistics."""
+        return [self.stats.summary_text()]
+
+    def stats_dicts(self):
+        """Return the statistics of ``summary_lines`` as dicts, for the run report."""
+        return [self.stats.as_dict()]
+
+    def close(self):
+        pass
+
+
+def chat_messages(prompt, system=None):
+    """Return the chat messages of ``prompt``, after the ``system`` message if any."""
+    messages = [{"role": "user", "content": prompt}]
+    if system:
+        messages.insert(0, {"role": "system", "content": system})
+    return messages
+
+
+def openai_chat_url(base_url):
+    """Return the chat completions URL of an OpenAI-compatible ``base_url``."""
+    return (base_url or OPENAI_BASE_URL).rstrip("/") + "/chat/completions"
+
+
+class OpenAIClient(RetryingClient):
+    """Chat completions over one pooled ``requests.Session``."""
+
+    name = "OpenAI"
+
+    def __init__(self, api_key, url=OPENAI_URL, **kwargs):
+        super().__init__(**kwargs)
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.url = url
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        self._session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        })
+
+    def chat(self, model, prompt, max_tokens=None, stop_when=None, schema=None, system=None,
+             think=None):
+        """Return the reply to ``prompt``.
+
+        ``think`` is ignored; the OpenAI model does not reason.
+        ``max_tokens`` caps the answer length and ``schema`` is a JSON schema
+        the answer must follow.  With ``stop_when`` the answer is streamed
+        (server-sent events) and the stream is closed as soon as
+        ``stop_when(text_so_far)`` is true.
+        """
+        payload = {
+            "model": model,
+            "messages": chat_messages(prompt, system),
+            "temperature": 0,
+        }
+        if max_tokens:
+            payload["max_tokens"] = max_tokens
+        if schema is not None:
+            payload["response_format"] = {
+                "type": "json_schema",
+                "json_schema": {"name": "analysis", "strict": True, "schema": schema},
+            }
+        if stop_when is not None:
+            payload["stream"] = True
+            # The token counts come in a last chunk of their own
+            payload["stream_options"] = {"include_usage": True}
+            return self._call(lambda: self._stream(payload, stop_when)).strip()
+
+        def send():
+            started = time.monotonic()
+            resp = self._session.post(
+                self.url, json=payload, timeout=(self.connect_timeout, self.read_timeout)
+            )
+            resp.raise_for_status()
+            return resp.json(), time.monotonic() - started
+
+        data, seconds = self._call(send)
+        self._record_openai_usage(data.get("usage"), seconds)
+        return data["choices"][0]["message"]["content"].strip()
+
+    def _stream(self, payload, stop_when):
+        started = time.monotonic()
+        resp = self._session.post(
+            self.url, json=payload, timeout=(self.connect_timeout, self.read_timeout), stream=True
+        )
+        try:
+            resp.raise_for_status()
+            resp.encoding = "utf-8"
+            text = ""
+            for line in resp.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                if chunk.get("usage"):
+                    self._record_openai_usage(chunk["usage"], time.monotonic() - started)
+                choices = chunk.get("choices") or []
+                if choices:
+                    text += (choices[0].get("delta") or {}).get("content") or ""
+                if stop_when(text):
+                    self.stats.record_early_stop()
+                    break
+            return text
+        finally:
+            # Closing an unfinished stream makes the server stop generating
+            resp.close()
+
+    def _record_openai_usage(self, usage, seconds):
+        # OpenAI reports no generation time; the request time stands in for it
+        if usage:
+            self._record_usage(usage.get("prompt_tokens"), usage.get("completion_tokens"), seconds)
+
+    def close(self):
+        self._session.close()
+
+
+class OllamaClient(RetryingClient):
+    """``ollama.Client`` with a bounded keep-alive pool and timeouts.
+
+    ``host`` defaults to ``$OLLAMA_HOST`` like the module-level client.
+    """
+
+    name = "Ollama"
+    keep_alive = None
+
+    def __init__(self, host=None, keep_alive=DEFAULT_KEEP_ALIVE, **kwargs):
+        super().__init__(**kwargs)
+        import httpx
+        import ollama
+
+        self.host = host
+        self.keep_alive = keep_alive
+        self._client = ollama.Client(
+            host=host,
+            timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+            limits=httpx.Limits(
+                max_connections=self.pool_size, max_keepalive_connections=self.pool_size
+            ),
+        )
+
+    def chat(self, model, prompt, max_tokens=None, stop_when=None, schema=None, system=None,
+             think=None):
+        """Return the reply to ``prompt``.
+
+        ``max_tokens`` sets ``num_predict`` and ``schema`` is passed as the
+        ``format`` the answer must follow.  ``think`` is Ollama's thinking
+        flag (``None`` for the model default).  With ``stop_when`` the answer is
+        streamed and the stream is closed as soon as ``stop_when(text_so_far)``
+        is true; Ollama stops generating when the client hangs up.
+        """
+        messages = chat_messages(prompt, system)
+        options = {"num_predict": max_tokens} if max_tokens else None
+        if stop_when is not None:
+            return self._call(lambda: self._stream(
+                model, messages, options, schema, stop_when, think
+            )).strip()
+        response = self._call(lambda: self._client.chat(
+            model=model,
+            messages=messages,
+            options=options,
+            format=schema,
+            keep_alive=self.keep_alive,
+            think=think,
+        ))
+        self._record_ollama_usage(response)
+        return response['message']['content'].strip()
+
+    def _stream(self, model, messages, options, schema, stop_when, think=None):
+        stream = self._client.chat(
+            model=model, messages=messages, options=options, format=schema, stream=True,
+            keep_alive=self.keep_alive, think=think,
+        )
+        text = ""
+        thinking = False
+        try:
+            for chunk in stream:
+                message = chunk['message']
+                if message.get('thinking'):
+                    if not thinking:
+                        text += "<think>"
+                        thinking = True
+                    text += message['thinking']
+                if message['content']:
+                    if thinking:
+                        text += "</think>"
+                        thinking = False
+                    text += message['content']
+                if chunk.get('done'):
+                    self._record_ollama_usage(chunk)
+                if stop_when(text):
+                    self.stats.record_early_stop()
+                    break
+        finally:
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+        return text
+
+    def _record_ollama_usage(self, response):
+        eval_duration = response.get('eval_duration')
+        prompt_duration = response.get('prompt_eval_duration')
+        self._record_usage(response.get('prompt_eval_count'), response.get('eval_count'),
+                           eval_duration / 1e9 if eval_duration else None,
+                           prompt_duration / 1e9 if prompt_duration else None)
+
+    def preload(self, model):
+        """Load ``model`` into memory without generating anything."""
+        self._client.generate(model=model, keep_alive=self.keep_alive)
+
+    def embed(self, model, texts):
+        """Return the embedding vectors of ``texts`` from one batched request."""
+        response = self._call(lambda: self._client.embed(
+            model=model, input=list(texts), keep_alive=self.keep_alive
+        ))
+        return response['embeddings']
+
+    def healthy(self):
+        """Return True if the server answers a cheap request."""
+        try:
+            self._client.list()
+        except Exception:
+            return False
+        return True
+
+    def close(self):
+        # ollama.Client has no close(); shut its httpx client down directly
+        http_client = getattr(self._client, "_client", None)
+        if http_client is not None:
+            http_client.close()
+
+
+class _Host:
+    """Balancing state of one host of an ``OllamaHostPool``."""
+
+    def __init__(self, index, url, client):
+        self.index = index
+        self.url = url
+        self.client = client
+        self.outstanding = 0
+        self.failures = 0  # in a row
+        self.ejected_until = 0.0
+        self.checking = False
+
+
+class OllamaHostPool(RetryingClient):
+    """Spread requests over several Ollama hosts.
+
+    Each request goes to the healthy host with the fewest requests in flight
+    (ties go round-robin).  A host whose request fails with a transient error
+    is ejected for ``EJECT_SECONDS``, doubling with each failure in a row, and
+    must pass a health check before it takes requests again; the request is
+    retried on another host.  Each host has its own ``OllamaClient`` with its
+    own connection pool and statistics.
+
+    ``make_client(url)`` creates the client of a host; it defaults to an
+    ``OllamaClient`` that does not retry on its own.
+    """
+
+    name = "Ollama pool"
+
+    def __init__(self, hosts, make_client=None, clock=time.monotonic,
+                 keep_alive=DEFAULT_KEEP_ALIVE, **kwargs):
+        super().__init__(**kwargs)
+        if not hosts:
+            raise ValueError("OllamaHostPool needs at least one host")
+        if make_client is None:
+            def make_client(url):
+                return OllamaClient(
+                    host=url, keep_alive=keep_alive, pool_size=self.pool_size,
+                    connect_timeout=self.connect_timeout, read_timeout=self.read_timeout,
+                    max_retries=0, on_usage=self._record_usage,
+                )
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._next = 0
+        self._hosts = []
+        for index, url in enumerate(hosts):
+            client = make_client(url)
+            client.stats.name = f"Ollama {url}"
+            self._hosts.append(_Host(index, url, client))
+
+    def chat(self, model, prompt, max_tokens=None, stop_when=None, schema=None, system=None,
+             think=None):
+        """Return the reply to ``prompt`` from the least busy healthy host."""
+        return self._call(lambda: self._dispatch(
+            lambda client: client.chat(model, prompt, max_tokens, stop_when, schema, system, think)
+        ))
+
+    def embed(self, model, texts):
+        """Return the embedding vectors of ``texts`` from the least busy healthy host."""
+        return self._call(lambda: self._dispatch(lambda client: client.embed(model, texts)))
+
+    def preload(self, model):
+        """Load ``model`` on every host; returns how many hosts loaded it."""
+        loaded = 0
+        for host in self._hosts:
+            try:
+                host.client.preload(model)
+            except Exception as e:
+                self._on_retry(f"Ollama host {host.url} could not load {model}: {e}")
+                continue
+            loaded += 1
+        if not loaded:
+            raise TransientBackendError(f"no Ollama host could load {model}")
+        return loaded
+
+    def _dispatch(self, request):
+        host = self._acquire()
+        try:
+            result = request(host.client)
+        except Exception as e:
+            self._release(host, failed=is_retryable(e))
+            raise
+        self._release(host)
+        return result
+
+    def _acquire(self):
+        """Reserve the healthy host with the fewest requests in flight."""
+        self._check_recovering_hosts()
+        with self._lock:
+            candidates = [host for host in self._hosts if not host.ejected_until]
+            if not candidates:
+                # Every host is out; try the one due back first rather than failing
+                candidates = [min(self._hosts, key=lambda host: host.ejected_until)]
+            count = len(self._hosts)
+            host = min(candidates, key=lambda host: (
+                host.outstanding, (host.index - self._next) % count
+            ))
+            self._next = (host.index + 1) % count
+            host.outstanding += 1
+            return host
+
+    def _release(self, host, failed=False):
+        with self._lock:
+            host.outstanding -= 1
+            if not failed:
+                host.failures = 0
+                host.ejected_until = 0.0
+                return
+            delay = self._eject(host)
+        self._on_retry(f"Ollama host {host.url} failed; leaving it out for {delay:.0f} s")
+
+    def _eject(self, host):
+        host.failures += 1
+        delay = min(EJECT_MAX_SECONDS, EJECT_SECONDS * 2 ** (host.failures - 1))
+        host.ejected_until = self._clock() + delay
+        return delay
+
+    def _retry_delay(self, attempt, exc):
+        with self._lock:
+            if any(not host.ejected_until for host in self._hosts):
+                return 0.0  # Another host can take the request right away
+        return super()._retry_delay(attempt, exc)
+
+    def _check_recovering_hosts(self):
+        """Health-check ejected hosts whose time out is over."""
+        now = self._clock()
+        with self._lock:
+            due = [host for host in self._hosts
+                   if host.ejected_until and host.ejected_until <= now and not host.checking]
+            for host in due:
+                host.checking = True
+        for host in due:
+            healthy = host.client.healthy()
+            with self._lock:
+                host.checking = False
+                if healthy:
+                    host.ejected_until = 0.0
+                else:
+                    self._eject(host)
+
+    def status_text(self):
+        """Return a one-line load and latency summary of every host."""
+        now = self._clock()
+        parts = []
+        with self._lock:
+            for host in self._hosts:
+                stats = host.client.stats
+                if host.ejected_until > now:
+                    state = f"down {host.ejected_until - now:.0f} s"
+                else:
+                    state = f"{host.outstanding} in flight"
+                parts.append(f"{host.url}: {state}, {stats.requests} done, "
+                             f"avg {stats.average_latency:.1f} s")
+        return " | ".join(parts)
+
+    def summary_lines(self):
+        return [self.stats.summary_text()] + [host.client.stats.summary_text() for host in self._hosts]
+
+    def stats_dicts(self):
+        return [self.stats.as_dict()] + [host.client.stats.as_dict() for host in self._hosts]
+
+    def close(self):
+        for host in self._hosts:
+            host.client.close()
@@ -0,0 +1,83 @@
+"""Streaming writer for the ``_sorted_`` output file.
+
+Segments are appended to ``<output>.partial`` as soon as they are committed,
+so an interrupted run keeps everything processed so far.  ``commit`` fsyncs
+the file and atomically renames it to the final name, so the final name
+only ever holds a complete file.
+"""
+import os
+
+# Blank lines written after every segment
+SEGMENT_SEPARATOR = "\n" * 6
+
+
+class SegmentWriter:
+    """Append processed segments to a temporary file and publish it atomically."""
+
+    def __init__(self, path, header):
+        self.path = path
+        self.temp_path = path + ".partial"
+        self.segments_written = 0
+        self.title_count = 0
+
+        # Create the output directory if it doesn't exist
+        output_dir = os.path.dirname(path)
+        if output_dir and not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+
+        self._file = open(self.temp_path, 'w', encoding='utf-8')
+        self._file.write(header)
+
+    @property
+    def closed(self):
+        return self._file is None
+
+    def write_segment(self, segment, metadata=()):
+        """Write one processed segment, adding any of ``metadata`` it lacks."""
+        # Clean up leading whitespace
+        cleaned_segment = segment.lstrip()
+        if not cleaned_segment:
+            return  # Skip completely empty segments
+
+        # Ensure the segment contains its metadata
+        if metadata:
+            present = set(cleaned_segment.splitlines())
+            missing = [meta_line for meta_line in metadata if meta_line not in present]
+            if missing:
+                cleaned_segment += "\n" + "\n".join(missing)
+
+        self._file.write(cleaned_segment.rstrip() + SEGMENT_SEPARATOR)
+        # Hand the data to the OS so it survives the process dying
+        self._file.flush()
+        self.segments_written += 1
+        self.title_count += cleaned_segment.count('"Title:')
+
+    def commit(self):
+        """fsync the temporary file and rename it to the final path."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+        os.replace(self.temp_path, self.path)
+        _fsync_directory(os.path.dirname(self.path))
+        return self.path
+
+    def abort(self):
+        """Close the temporary file, leaving the partial output in place."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def _fsync_directory(path):
+    """Persist a rename on filesystems that need the directory synced."""
+    try:
+        fd = os.open(path or ".", os.O_RDONLY)
+    except OSError:
+        return  # e.g. directories cannot be opened on Windows
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
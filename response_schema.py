@@ -0,0 +1,155 @@
+"""JSON answer format for segment analyses.
+
+The backends are asked to answer with a JSON object that matches
+``ANALYSIS_SCHEMA`` (Ollama's ``format``, OpenAI's ``response_format``), or
+``BATCH_SCHEMA`` for packed requests.  Parsing is one JSON decode plus a type
+check; callers fall back to the text parser in ``sort_engine`` when an answer
+is not valid JSON.
+"""
+import json
+import re
+
+_DECISION_PROPERTIES = {
+    "contains_multiple_stories": {"type": "boolean"},
+    "number_of_stories": {"type": "integer"},
+    "split_after": {"type": "array", "items": {"type": "integer"}},
+    "reasoning": {"type": "string"},
+}
+
+# Properties are generated in this order, so the decision comes before the
+# reasoning and a streamed answer can be cut off after "split_after"
+ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": _DECISION_PROPERTIES,
+    "required": list(_DECISION_PROPERTIES),
+    "additionalProperties": False,
+}
+
+BATCH_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "segments": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"segment": {"type": "integer"}, **_DECISION_PROPERTIES},
+                "required": ["segment", *_DECISION_PROPERTIES],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["segments"],
+    "additionalProperties": False,
+}
+
+ANSWER_FORMAT = """Answer with a JSON object with these keys:
+"contains_multiple_stories": true or false
+"number_of_stories": the number of distinct stories
+"split_after": the sentence numbers after which to split, e.g. [2, 5], or [] for one story
+"reasoning": a short explanation
+"""
+
+BATCH_ANSWER_FORMAT = """Answer with a JSON object {"segments": [...]} holding one object per segment, in order, with these keys:
+"segment": the segment number
+"contains_multiple_stories": true or false
+"number_of_stories": the number of distinct stories
+"split_after": the sentence numbers after which to split, e.g. [2, 5], or [] for one story
+"reasoning": a short explanation
+"""
+
+# A streamed answer has its decision once "split_after" is closed
+_SPLIT_AFTER_DONE = re.compile(r'"split_after"\s*:\s*\[[^\]]*\]')
+
+_decoder = json.JSONDecoder()
+
+
+def _load_object(text):
+    """Decode the first JSON object in ``text``, or return ``None``."""
+    start = text.find("{")
+    if start < 0:
+        return None
+    try:
+        data, _ = _decoder.raw_decode(text, start)
+    except ValueError:
+        # An answer cut off after "split_after" lacks the rest of the object
+        done = _SPLIT_AFTER_DONE.search(text, start)
+        if done is None:
+            return None
+        try:
+            data = json.loads(text[start:done.end()] + "}")
+        except ValueError:
+            return None
+    return data if isinstance(data, dict) else None
+
+
+def _is_int(value, minimum=1):
+    return isinstance(value, int) and not isinstance(value, bool) and value >= minimum
+
+
+def _decision(data):
+    """Validate one decision object; returns the parser tuple or ``None``."""
+    contains = data.get("contains_multiple_stories")
+    if not isinstance(contains, bool):
+        return None
+    number = data.get("number_of_stories", 1)
+    split_after = data.get("split_after", [])
+    if not isinstance(split_after, list) or not all(_is_int(p) for p in split_after):
+        return None
+    if contains and not _is_int(number):
+        return None
+    reasoning = data.get("reasoning")
+    if not isinstance(reasoning, str) or not reasoning.strip():
+        reasoning = "No clear reasoning provided"
+    if not contains:
+        # Same as the text parser: no split without a YES
+        number, split_after = 1, []
+    return contains, number, split_after, reasoning.strip()
+
+
+def parse_structured(text):
+    """Return ``(contains, number, split_points, reasoning)`` of a JSON answer.
+
+    Returns ``None`` if ``text`` holds no valid decision object.
+    """
+    data = _load_object(text)
+    if data is None:
+        return None
+    return _decision(data)
+
+
+def parse_structured_batch(text, segment_ids):
+    """Parse a JSON answer to a packed request.
+
+    Returns ``None`` if ``text`` is not a JSON batch answer at all, otherwise
+    ``{segment_id: (contains, number, split_points, reasoning, entry_text)}``
+    for the valid entries, where ``entry_text`` is the entry as a
+    single-segment JSON answer.  Unknown and repeated ids are left out.
+    """
+    data = _load_object(text)
+    if data is None or not isinstance(data.get("segments"), list):
+        return None
+    wanted = set(segment_ids)
+    decisions = {}
+    repeated = set()
+    for entry in data["segments"]:
+        if not isinstance(entry, dict) or not _is_int(entry.get("segment")):
+            continue
+        if entry["segment"] not in wanted:
+            continue
+        segment_id = entry["segment"]
+        decision = _decision(entry)
+        if decision is None:
+            continue
+        if segment_id in decisions:
+            repeated.add(segment_id)
+            continue
+        entry_text = json.dumps({key: entry[key] for key in _DECISION_PROPERTIES if key in entry})
+        decisions[segment_id] = decision + (entry_text,)
+    for segment_id in repeated:
+        del decisions[segment_id]
+    return decisions
+
+
+def structured_complete(text):
+    """Return True once a streamed JSON answer holds its decision."""
+    return '"contains_multiple_stories"' in text and _SPLIT_AFTER_DONE.search(text) is not None
@@ -0,0 +1,121 @@
+"""Crash-safe journal of the decisions made during a run.
+
+Every committed segment appends one JSON line to ``<input>.journal``: its
+index, a hash of its text, the verdict, the split points, a hash of the raw
+model response and the model.  Each line is flushed and fsynced before the
+next segment is analyzed, so a run that is killed or closed loses at most
+the segment in flight.
+
+The first line is a header naming the model and the segment count.  A later
+run on the same input with the same model can read the journal back and
+replay the recorded decisions instead of asking the model again.  The journal
+is removed once a run has saved its output.
+"""
+import hashlib
+import json
+import os
+
+JOURNAL_SUFFIX = ".journal"
+
+# Bump when the record format changes so old journals are ignored
+JOURNAL_VERSION = 1
+
+
+def journal_path(input_file_path):
+    """Return the journal path of ``input_file_path``."""
+    return input_file_path + JOURNAL_SUFFIX
+
+
+def response_hash(response_text):
+    return hashlib.sha256((response_text or "").encode("utf-8")).hexdigest()
+
+
+def read_journal(path, model, segment_count=None):
+    """Return ``{segment index: record}`` of a journal written with ``model``.
+
+    Returns ``{}`` if the journal is missing, unreadable, from another model
+    or from a file with a different number of segments.  A torn last line is
+    ignored; a segment recorded twice keeps its latest record.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return {}
+    if not lines:
+        return {}
+    try:
+        header = json.loads(lines[0])
+    except ValueError:
+        return {}
+    if not isinstance(header, dict) or header.get("version") != JOURNAL_VERSION:
+        return {}
+    if header.get("model") != model:
+        return {}
+    if segment_count is not None and header.get("segments") != segment_count:
+        return {}
+
+    records = {}
+    for line in lines[1:]:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            break  # The process died while writing this line
+        if isinstance(record, dict) and isinstance(record.get("index"), int):
+            records[record["index"]] = record
+    return records
+
+
+def decided_segments(path, model):
+    """Return how many leading segments a journal has decisions for."""
+    records = read_journal(path, model)
+    count = 0
+    while count in records:
+        count += 1
+    return count
+
+
+class JournalWriter:
+    """Append decision records to a journal, one fsynced line each.
+
+    With ``append`` an existing journal is continued; otherwise it is
+    replaced by a new one holding only the header.
+    """
+
+    def __init__(self, path, model, segment_count, append=False):
+        self.path = path
+        self.model = model
+        self._file = open(path, "a" if append else "w", encoding="utf-8")
+        if not append:
+            self._write({"version": JOURNAL_VERSION, "model": model, "segments": segment_count})
+
+    def record(self, index, segment_hash, split_points, verdict=None, response_text=None,
+               manual=False):
+        """Record the decision for segment ``index`` (0-based)."""
+        self._write({
+            "index": index,
+            "hash": segment_hash,
+            "verdict": verdict,
+            "split_after": list(split_points),
+            "response_hash": None if response_text is None else response_hash(response_text),
+            "model": self.model,
+            "manual": manual,
+        })
+
+    def _write(self, data):
+        self._file.write(json.dumps(data) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        """Close and delete the journal once the run's output is saved."""
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
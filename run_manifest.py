@@ -0,0 +1,62 @@
+"""Manifest of the decisions behind the last output of an input file.
+
+After a run has saved its output, ``<input>.manifest.json`` maps the hash of
+every segment (``llm_cache.segment_hash``) to the split points it was
+committed with.  An incremental run reads it back and reuses the decision of
+every segment whose text is unchanged, so only new or edited segments are
+sent to the model.  Decisions only carry over between runs with the same
+model and prompt version.
+"""
+import json
+import os
+
+MANIFEST_SUFFIX = ".manifest.json"
+
+# Bump when the manifest format changes so old manifests are ignored
+MANIFEST_VERSION = 1
+
+
+def manifest_path(input_file_path):
+    """Return the manifest path of ``input_file_path``."""
+    return input_file_path + MANIFEST_SUFFIX
+
+
+def read_manifest(path, model, prompt_version):
+    """Return ``{segment hash: split points}`` from the manifest at ``path``.
+
+    Returns ``{}`` if there is no usable manifest for ``model`` and
+    ``prompt_version``.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get("version") != MANIFEST_VERSION:
+        return {}
+    if data.get("model") != model or data.get("prompt_version") != str(prompt_version):
+        return {}
+    decisions = data.get("decisions")
+    if not isinstance(decisions, dict):
+        return {}
+    return {
+        digest: [p for p in points if isinstance(p, int)]
+        for digest, points in decisions.items()
+        if isinstance(points, list)
+    }
+
+
+def write_manifest(path, model, prompt_version, output_path, decisions):
+    """Atomically replace the manifest at ``path``."""
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "version": MANIFEST_VERSION,
+            "model": model,
+            "prompt_version": str(prompt_version),
+            "output": output_path,
+            "decisions": decisions,
+        }, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
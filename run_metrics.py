@@ -0,0 +1,212 @@
+"""Per-stage timings and token counts of a run, and the JSON run report.
+
+``RunMetrics`` collects how long each stage of the pipeline takes per call
+(parsing a segment, building a prompt, waiting in the worker queue, sentence
+embedding, the model request and the server's prompt evaluation within it,
+parsing the answer, waiting at the commit point, splitting and writing) in
+``Histogram`` buckets, plus the prompt and answer token counts the backends
+report.  It is shared by the analysis threads, so every update takes a lock.
+
+After a run the engine writes them, with the run's settings and counters, to
+a JSON report next to the sorted file: ``<output>.report.json``.
+"""
+import bisect
+import json
+import math
+import os
+import threading
+import time
+
+REPORT_SUFFIX = ".report.json"
+
+# Bump when the report format changes
+REPORT_VERSION = 1
+
+# Stages in pipeline order, with their labels in summaries
+STAGES = {
+    "parse": "parse",
+    "prompt": "prompt",
+    "queue": "queue",
+    "embedding": "embedding",
+    "generation": "generation",
+    "prompt_eval": "prompt eval",
+    "response_parse": "answer parse",
+    "wait": "commit wait",
+    "split": "split",
+    "write": "write",
+}
+
+# Bucket upper bounds: four per decade from 1 microsecond to a million
+DEFAULT_BOUNDS = tuple(10 ** (exponent / 4) for exponent in range(-24, 25))
+
+
+def report_path(output_file_path):
+    """Return the run report path of ``output_file_path``."""
+    return output_file_path + REPORT_SUFFIX
+
+
+class Histogram:
+    """Count, total, extremes and bucket counts of a series of values.
+
+    Values are counted in the first bucket whose upper bound is at least the
+    value; anything past the last bound goes to an overflow bucket.
+    Percentiles are estimated from the buckets.  Not thread-safe on its own.
+    """
+
+    def __init__(self, bounds=DEFAULT_BOUNDS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, fraction):
+        """Return an estimate of the ``fraction`` (0 to 1) percentile."""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(fraction * self.count))
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                upper = self.bounds[bucket] if bucket < len(self.bounds) else self.max
+                # The bucket bound can overshoot what was actually seen
+                return min(max(upper, self.min), self.max)
+        return self.max
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.mean,
+            "min": self.min if self.count else 0.0,
+            "max": self.max,
+            "p50": self.percentile(0.5),
+            "p90": self.percentile(0.9),
+            "p99": self.percentile(0.99),
+            # [upper bound, count] of the non-empty buckets; null is the overflow
+            "buckets": [
+                [self.bounds[i] if i < len(self.bounds) else None, count]
+                for i, count in enumerate(self.counts) if count
+            ],
+        }
+
+
+class _StageTimer:
+    __slots__ = ("metrics", "stage", "started")
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.record(self.stage, time.perf_counter() - self.started)
+
+
+class RunMetrics:
+    """Stage timings and token counts of one run (thread-safe)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = {}
+        self.prompt_tokens = 0
+        self.eval_tokens = 0
+        self.eval_seconds = 0.0
+        self.token_rates = Histogram()
+
+    def timer(self, stage):
+        """Return a context manager recording its duration under ``stage``."""
+        return _StageTimer(self, stage)
+
+    def record(self, stage, seconds):
+        with self._lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram()
+            histogram.add(seconds)
+
+    def record_tokens(self, prompt_tokens, eval_tokens, eval_seconds, prompt_seconds=None):
+        """Count the tokens of one model answer and its generation time.
+
+        ``prompt_seconds``, the time the server took to read the prompt, is
+        recorded as the ``prompt_eval`` stage.
+        """
+        if prompt_seconds is not None:
+            self.record("prompt_eval", prompt_seconds)
+        with self._lock:
+            self.prompt_tokens += prompt_tokens or 0
+            self.eval_tokens += eval_tokens or 0
+            if eval_tokens and eval_seconds:
+                self.eval_seconds += eval_seconds
+                self.token_rates.add(eval_tokens / eval_seconds)
+
+    @property
+    def tokens_per_second(self):
+        return self.eval_tokens / self.eval_seconds if self.eval_seconds else 0.0
+
+    def _ordered_stages(self):
+        order = list(STAGES)
+        return sorted(self.stages.items(),
+                      key=lambda item: order.index(item[0]) if item[0] in order else len(order))
+
+    def summary_lines(self):
+        """Return one line of stage timings and one of tokens, if any were counted."""
+        with self._lock:
+            parts = [
+                f"{STAGES.get(stage, stage)} {_duration(h.mean)} avg / {_duration(h.percentile(0.9))} p90"
+                for stage, h in self._ordered_stages()
+            ]
+            lines = ["Stage times: " + ", ".join(parts)] if parts else []
+            if self.prompt_tokens or self.eval_tokens:
+                lines.append(
+                    f"Tokens: {self.prompt_tokens} prompt, {self.eval_tokens} answer, "
+                    f"{self.tokens_per_second:.1f} tokens/s"
+                )
+            return lines
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "stages": {stage: h.as_dict() for stage, h in self._ordered_stages()},
+                "tokens": {
+                    "prompt": self.prompt_tokens,
+                    "answer": self.eval_tokens,
+                    "answer_seconds": self.eval_seconds,
+                    "tokens_per_second": self.tokens_per_second,
+                    "per_request_tokens_per_second": self.token_rates.as_dict(),
+                },
+            }
+
+
+def _duration(seconds):
+    if seconds < 0.001:
+        return f"{seconds * 1e6:.0f} µs"
+    if seconds < 1:
+        return f"{seconds * 1000:.1f} ms"
+    return f"{seconds:.2f} s"
+
+
+def write_report(path, report):
+    """Atomically write the ``report`` dict to ``path`` as JSON."""
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": REPORT_VERSION, **report}, f, indent=2)
+    os.replace(temp_path, path)
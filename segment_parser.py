@@ -0,0 +1,200 @@
+"""Incremental parser that splits ``"Title:..."`` files into segments.
+
+The parser reads an open file (or any iterable of lines) and yields one
+segment at a time, so memory use is bounded by the largest segment rather
+than by the file size.
+
+It reproduces the boundaries of the regular expression the app originally
+ran over the whole file::
+
+    ((?:^|\\n)\\s*"Title:[^"]+")(.+?)(?=(?:^|\\n)\\s*"Title:|$)   (DOTALL)
+
+In line terms:
+
+* a segment starts at a line whose first non-blank text is ``"Title:`` and
+  whose title is closed by a ``"`` (possibly on a later line);
+* it ends at the newline of the last non-blank line before the next line
+  starting with ``"Title:``, or at the end of the file, minus one trailing
+  newline;
+* its content must be at least one character, so a title line directly
+  followed by another title line swallows it;
+* text before the first title, or after a title that is never closed, does
+  not belong to any segment.
+
+``read_segments`` yields compact ``Segment`` objects; ``iter_segments`` yields
+the ``(title, content, original_text)`` tuples built from them.
+"""
+import io
+from array import array
+
+from line_kinds import KIND_CODES, KINDS, METADATA_KINDS, classify_content
+
+TITLE_MARKER = '"Title:'
+
+
+class Segment:
+    """One segment, stored as its original text and the offset of its content.
+
+    ``title`` and ``content`` are sliced from ``text`` when asked for, so a
+    parsed segment holds a single copy of its text.  The labels of its
+    content lines (``line_kinds``) are computed on first use and kept as a
+    byte array.  A ``Segment`` unpacks like the tuples of ``iter_segments``.
+    """
+
+    __slots__ = ("text", "content_start", "_kinds", "_metadata", "single_story")
+
+    def __init__(self, text, content_start):
+        self.text = text
+        self.content_start = content_start
+        self._kinds = None
+        self._metadata = None
+        # Pre-filter verdict, filled in by the engine
+        self.single_story = None
+
+    @property
+    def title(self):
+        return self.text[:self.content_start].strip()
+
+    @property
+    def content(self):
+        return self.text[self.content_start:]
+
+    @property
+    def original_text(self):
+        return self.text
+
+    def parts(self):
+        return self.title, self.content, self.text
+
+    def __iter__(self):
+        return iter(self.parts())
+
+    def lines(self):
+        """Return ``[(line, kind), ...]`` for the content lines."""
+        content = self.content
+        if self._kinds is None:
+            lines = classify_content(content, self.text)
+            self._kinds = array("B", [KIND_CODES[kind] for _, kind in lines])
+            return lines
+        return [(line, KINDS[code]) for line, code in zip(content.splitlines(), self._kinds)]
+
+    def metadata_lines(self):
+        """Return the tag lines of the content, in order."""
+        if self._metadata is None:
+            self._metadata = tuple(line for line, kind in self.lines() if kind in METADATA_KINDS)
+        return list(self._metadata)
+
+
+def _title_start(line):
+    """Return the offset of ``"Title:`` if ``line`` starts with it, else -1."""
+    if TITLE_MARKER not in line:
+        return -1
+    stripped = line.lstrip()
+    if stripped.startswith(TITLE_MARKER):
+        return len(line) - len(stripped)
+    return -1
+
+
+def _read_title(line, start, lines):
+    """Read a title that starts at ``line[start]``.
+
+    Returns ``(title_text, rest_of_line)`` where ``title_text`` runs up to and
+    including the closing quote.  Titles may span lines, in which case more
+    lines are consumed from ``lines``.  Returns ``None`` for an empty title or
+    one that is never closed.
+    """
+    name_start = start + len(TITLE_MARKER)
+    text = line
+    search_from = name_start
+    while True:
+        close = text.find('"', search_from)
+        if close >= 0:
+            if close == name_start:
+                return None  # '"Title:"' has no name
+            return text[:close + 1], text[close + 1:]
+        search_from = len(text)
+        next_line = next(lines, None)
+        if next_line is None:
+            return None
+        text += next_line
+
+
+def _make_segment(header, content):
+    text = (header + content).lstrip("\n")
+    return Segment(text, len(text) - len(content.lstrip("\n")))
+
+
+def read_segments(lines):
+    """Yield a ``Segment`` for every segment in ``lines``.
+
+    ``lines`` is an open text file or any iterable of newline-terminated
+    strings (only the last one may lack the newline).
+    """
+    lines = iter(lines)
+    header = None  # title text of the segment being collected
+    body = []      # content lines of that segment, starting with the rest of the title line
+    blank = []     # blank lines seen since the last non-blank line
+
+    for line in lines:
+        if not line.strip():
+            blank.append(line)
+            continue
+
+        start = _title_start(line)
+        if start < 0:
+            if header is not None:
+                body.extend(blank)
+                body.append(line)
+            blank = []
+            continue
+
+        if header is not None:
+            content = "".join(body)
+            if len(content) >= 2:
+                # Cut at the newline of the last non-blank line
+                content = content[:-1]
+            elif blank:
+                # The title line had nothing after it; the content has to
+                # be at least one character so the cut moves one line down
+                content = (content + blank[0])[:-1]
+                blank = blank[1:]
+            else:
+                # No room for a cut: the title line becomes content
+                body.append(line)
+                continue
+            yield _make_segment(header, content)
+            header = None
+            body = []
+
+        title = _read_title(line, start, lines)
+        if title is None:
+            blank = []
+            continue
+        title_text, rest = title
+        header = "".join(blank) + title_text
+        body = [rest]
+        blank = []
+
+    if header is not None:
+        content = "".join(body) + "".join(blank)
+        if len(content) >= 2 and content.endswith("\n"):
+            content = content[:-1]
+        if content:
+            yield _make_segment(header, content)
+
+
+def iter_segments(lines):
+    """Yield ``(title, content, original_text)`` for every segment in ``lines``."""
+    for segment in read_segments(lines):
+        yield segment.parts()
+
+
+def parse_segments(text):
+    """Return all segments of ``text`` as a list."""
+    return list(iter_segments(io.StringIO(text)))
+
+
+def count_segments(path):
+    """Count the segments in the file at ``path`` without keeping them."""
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        return sum(1 for _ in read_segments(f))
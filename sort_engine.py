@@ -0,0 +1,1564 @@
+#!/usr/bin/env python3
+"""GUI-free segment sorting pipeline shared by the Tk app and the CLI.
+
+Nothing in this module touches tkinter.  The model backends (``ollama`` and
+``requests``) are imported lazily so a headless run only loads the client it
+actually uses.
+"""
+import datetime
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from embedding_splits import (
+    DEFAULT_SPLIT_THRESHOLD, adjacent_similarities, propose_split_points, similarity_text,
+)
+from line_kinds import classify_lines, metadata_lines
+from llm_cache import segment_hash
+from llm_clients import (
+    DEFAULT_CONNECT_TIMEOUT, DEFAULT_KEEP_ALIVE, DEFAULT_MAX_RETRIES, DEFAULT_POOL_SIZE,
+    DEFAULT_READ_TIMEOUT, OPENAI_BASE_URL, OllamaClient, OllamaHostPool, OpenAIClient, TransientBackendError,
+    openai_chat_url,
+)
+from output_writer import SegmentWriter
+from response_schema import (
+    ANALYSIS_SCHEMA, ANSWER_FORMAT, BATCH_ANSWER_FORMAT, BATCH_SCHEMA,
+    parse_structured, parse_structured_batch, structured_complete,
+)
+from run_journal import JournalWriter, journal_path, read_journal
+from run_manifest import manifest_path, read_manifest, write_manifest
+from run_metrics import RunMetrics, report_path, write_report
+from segment_parser import count_segments, read_segments
+from split_utils import is_single_story, split_segment, story_sentences
+from thinking import (
+    DEFAULT_THINK_BUDGET, THINKING_AUTO, THINKING_BUDGET, THINKING_OFF, reasoning_model,
+    resolve_policy, soft_switch, strip_thinking, think_flag, unfinished_thinking,
+)
+
+# Model used when nothing else has been selected
+DEFAULT_MODEL = "qwen3:0.6b"
+
+# Model name that is routed to the OpenAI API instead of Ollama
+OPENAI_MODEL = "gpt-4.1-nano"
+
+# List of available models.  We'll sort them alphabetically when building the
+# dropdown menu so new entries don't need to be manually ordered.
+AVAILABLE_MODELS = [
+    "deepcoder:1.5b",
+    "deepseek-r1:1.5b",
+    "deepseek-r1:8b",
+    "deepseek-r1:latest",
+    "gemma3:1b",
+    "gemma3:latest",
+    "llama3.1:8b",
+    "llama3.1:latest",
+    "llama3.2:3b",
+    "llama3.2:latest",
+    "mistral-small3.1:latest",
+    "openchat:7b-v3.5-0106",
+    "phi3.5:latest",
+    "phi4-mini-reasoning:latest",
+    "phi4-mini:latest",
+    "phi4:latest",
+    "qwen2.5-coder:0.5b",
+    "qwen2.5-coder:1.5b",
+    "qwen2.5vl:3b",
+    "qwen3:0.6b",
+    "qwen3:1.7b",
+    "qwen3:14b",
+    "qwen3:30b",
+    "qwen3:32b",
+    "qwen3:4b",
+    "qwen3:8b",
+    "qwen3:latest",
+    "smollm2:latest",
+    OPENAI_MODEL,
+]
+
+def decision_model(model, escalation_model=None, embed_model=None,
+                   split_threshold=DEFAULT_SPLIT_THRESHOLD, confirm_splits=False):
+    """Return the name that identifies who made a run's decisions.
+
+    Journals and manifests only carry decisions over between runs with the
+    same name, so a cascade is named after both of its models, and embedding
+    splits after the embedding model and threshold (and the chat models
+    confirming them).
+    """
+    name = model
+    if escalation_model and escalation_model != model:
+        name = f"{model} > {escalation_model}"
+    if embed_model:
+        embedding = f"{embed_model} < {split_threshold:g}"
+        name = f"{embedding} > {name}" if confirm_splits else embedding
+    return name
+
+
+def extract_segment_metadata(original_text):
+    """Return the metadata lines (timestamps, URLs, images, comments) of a segment."""
+    return metadata_lines(classify_lines(original_text))
+
+
+def sorted_output_path(input_file_path):
+    """Return the timestamped ``_sorted_`` path next to ``input_file_path``."""
+    file_name, file_ext = os.path.splitext(os.path.basename(input_file_path))
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    return os.path.join(
+        os.path.dirname(input_file_path),
+        f"{file_name}_sorted_{timestamp}{file_ext}"
+    )
+
+
+# Analysis result used for segments the rule-based pre-filter keeps as is
+SINGLE_STORY_ANALYSIS = (
+    False, "Single story by rule", "(model skipped: single story by rule)", False, 1, [], []
+)
+
+# Raw response shown for a decision replayed from the journal
+JOURNAL_RESPONSE = "(model skipped: decided in an earlier run)"
+
+# Raw response shown for an unchanged segment in incremental mode
+MANIFEST_RESPONSE = "(model skipped: unchanged since the last run)"
+
+
+def estimate_tokens(text):
+    """Rough token count of ``text`` (about four characters per token)."""
+    return len(text) // 4 + 1
+
+
+# Bump whenever build_analysis_prompt or the system prompts change so cached
+# responses to the old prompt are not reused
+PROMPT_VERSION = 5
+
+# Free-text answer format, parsed by parse_analysis_response
+TEXT_ANSWER_FORMAT = """Answer exactly in this format:
+CONTAINS_MULTIPLE_STORIES: YES/NO
+NUMBER_OF_STORIES: [if YES, provide a number]
+SPLIT_AFTER: [if YES, the sentence numbers after which to split, e.g., "2,5"]
+REASONING: Your explanation here
+"""
+
+TEXT_BATCH_ANSWER_FORMAT = """Answer every segment, in order, exactly like this:
+SEGMENT: [segment number]
+CONTAINS_MULTIPLE_STORIES: YES/NO
+NUMBER_OF_STORIES: [if YES, provide a number]
+SPLIT_AFTER: [if YES, the sentence numbers after which to split, e.g., "2,5"]
+REASONING: Your explanation here
+"""
+
+
+def numbered_sentences(content, lines=None, token_budget=0):
+    """Return the story text of ``content`` as numbered sentences, one per line.
+
+    Tag lines (comments, media, URLs, timestamps...) are left out; they are
+    copied back into every part by ``split_utils.split_segment``.  Sentences
+    are numbered exactly as ``split_segment`` counts them, so the model's
+    ``SPLIT_AFTER`` numbers can be used unchanged.  With ``token_budget`` the
+    list stops once about that many tokens have been shown.
+    """
+    sentences = story_sentences(content, lines)
+    numbered = []
+    tokens = 0
+    for shown, (number, sentence) in enumerate(sentences):
+        line = f"[{number}] {sentence}"
+        tokens += estimate_tokens(line)
+        if token_budget and numbered and tokens > token_budget:
+            numbered.append(f"... ({len(sentences) - shown} more sentences not shown)")
+            break
+        numbered.append(line)
+    return "\n".join(numbered) or "(no story text)"
+
+
+# The instructions go in a system message that is the same for every
+# request, ahead of the segment, so the server can reuse the evaluated prefix
+ANALYSIS_INSTRUCTIONS = """Decide whether a news segment contains multiple distinct news stories or topics. Each message holds one segment: its title line, then its sentences, numbered.
+
+"""
+
+# Whether several posts or updates on the same story stay together
+# (``keep_same_topic``) or are split apart
+SAME_TOPIC_RULE = """Sentences about the same story belong together, even across several posts or updates: split only where the story or topic changes.
+
+"""
+
+SEPARATE_UPDATES_RULE = """Treat each separate post or update as its own story, even when it continues the same topic: also split where a new post or update begins.
+
+"""
+
+BATCH_INSTRUCTIONS = """Decide separately for each news segment in the message whether it contains multiple distinct news stories or topics. Each segment starts with a "=== SEGMENT <number> ===" line, followed by its title line and its sentences, numbered.
+
+"""
+
+
+def _topic_rule(keep_same_topic):
+    return SAME_TOPIC_RULE if keep_same_topic else SEPARATE_UPDATES_RULE
+
+
+def analysis_system_prompt(structured=False, keep_same_topic=True):
+    """Return the system message of single-segment prompts.
+
+    With ``structured`` the model is asked for a JSON answer
+    (``response_schema``), otherwise for the free-text format.  Without
+    ``keep_same_topic`` separate posts on the same story are split too.
+    """
+    return (ANALYSIS_INSTRUCTIONS + _topic_rule(keep_same_topic)
+            + (ANSWER_FORMAT if structured else TEXT_ANSWER_FORMAT))
+
+
+def batch_system_prompt(structured=False, keep_same_topic=True):
+    """Return the system message of packed prompts."""
+    return (BATCH_INSTRUCTIONS + _topic_rule(keep_same_topic)
+            + (BATCH_ANSWER_FORMAT if structured else TEXT_BATCH_ANSWER_FORMAT))
+
+
+def build_analysis_prompt(title, content, lines=None, token_budget=0):
+    """Build the user message asking about one segment.
+
+    It holds only the segment; the instructions are in
+    ``analysis_system_prompt``.
+    """
+    return f"{title}\n{numbered_sentences(content, lines, token_budget)}"
+
+
+def parse_analysis_response(response_text):
+    """Parse analysis output from either Ollama or OpenAI.
+
+    JSON answers are decoded and validated; anything else goes through the
+    free-text parser.
+    """
+    structured = parse_structured(response_text)
+    if structured is not None:
+        return structured
+
+    contains_multiple_stories = False
+    number_of_stories = 1
+    split_points = []
+    reasoning = "No clear reasoning provided"
+
+    multiple_stories_match = re.search(r"CONTAINS_MULTIPLE_STORIES:\s*(YES|NO)", response_text, re.IGNORECASE)
+    if multiple_stories_match:
+        contains_multiple_stories = multiple_stories_match.group(1).upper() == "YES"
+
+    if contains_multiple_stories:
+        number_match = re.search(r"NUMBER_OF_STORIES:\s*(\d+)", response_text, re.IGNORECASE)
+        if number_match:
+            try:
+                number_of_stories = int(number_match.group(1))
+            except ValueError:
+                number_of_stories = 2
+
+        split_match = re.search(r"SPLIT_AFTER:\s*(.*?)(?=$|\n)", response_text, re.IGNORECASE | re.DOTALL)
+        if split_match:
+            split_text = split_match.group(1).strip()
+            if "[" in split_text and "]" in split_text:
+                split_text = split_text.replace("[", "").replace("]", "")
+            for point in re.findall(r"\d+", split_text):
+                try:
+                    split_points.append(int(point))
+                except ValueError:
+                    continue
+
+    reasoning_match = re.search(r"REASONING:\s*(.*?)(?=$|\n\n)", response_text, re.IGNORECASE | re.DOTALL)
+    if reasoning_match:
+        reasoning = reasoning_match.group(1).strip()
+
+    return contains_multiple_stories, number_of_stories, split_points, reasoning
+
+
+def has_verdict(response_text):
+    """Return True if ``response_text`` holds a YES/NO decision at all."""
+    return (parse_structured(response_text) is not None
+            or re.search(r"CONTAINS_MULTIPLE_STORIES:\s*(YES|NO)", response_text, re.IGNORECASE) is not None)
+
+
+# Streamed answers are cut off once these have been seen
+_VERDICT = re.compile(r"CONTAINS_MULTIPLE_STORIES:\s*(YES|NO)(?=\W)", re.IGNORECASE)
+_NUMBER_LINE = re.compile(r"NUMBER_OF_STORIES:[^\n]*\n", re.IGNORECASE)
+_SPLIT_LINE = re.compile(r"SPLIT_AFTER:[^\n]*\n", re.IGNORECASE)
+
+# Default cap on the tokens a model may generate per analyzed segment
+DEFAULT_ANSWER_TOKENS = 1024
+
+
+def answer_complete(text):
+    """Return True once a partial answer holds everything the parser uses.
+
+    That is a NO verdict, or a YES verdict followed by complete
+    NUMBER_OF_STORIES and SPLIT_AFTER lines, or for a JSON answer a closed
+    "split_after" list.  Text inside an unfinished ``<think>`` block never
+    counts.
+    """
+    think_end = text.rfind("</think>")
+    if think_end >= 0:
+        text = text[think_end + len("</think>"):]
+    elif "<think>" in text:
+        return False
+    if text.lstrip().startswith(("{", "```")):
+        return structured_complete(text)
+    verdict = _VERDICT.search(text)
+    if verdict is None:
+        return False
+    if verdict.group(1).upper() == "NO":
+        return True
+    return bool(_NUMBER_LINE.search(text, verdict.end()) and _SPLIT_LINE.search(text, verdict.end()))
+
+
+# A packed request holds at most this many segments, whatever the token budget
+BATCH_MAX_SEGMENTS = 16
+
+# Start of one segment's answer in a packed response, e.g. "SEGMENT: 12"
+_BATCH_ENTRY = re.compile(r"^[\W_]*SEGMENT[\s:#]*(\d+)", re.IGNORECASE | re.MULTILINE)
+
+
+def build_batch_prompt(segments, token_budget=0):
+    """Build one user message asking about several segments.
+
+    ``segments`` is a list of ``(segment_id, title, content, lines)``, where
+    ``lines`` are the segment's cached line labels or ``None``.  Each segment
+    is sent as numbered sentences like ``build_analysis_prompt`` does.  With
+    ``batch_system_prompt`` the model is asked for a JSON list of decisions
+    (structured) or to answer each segment in the single-segment text format
+    headed by a ``SEGMENT: <id>`` line.
+    """
+    return "\n\n".join(
+        f"=== SEGMENT {segment_id} ===\n{title}\n{numbered_sentences(content, lines, token_budget)}"
+        for segment_id, title, content, lines in segments
+    )
+
+
+def parse_batch_response(response_text, segment_ids):
+    """Parse a packed response into per-segment decisions.
+
+    Returns ``{segment_id: (contains, number, split_points, reasoning, entry_text)}``
+    for every id in ``segment_ids`` that has a well-formed entry.  Entries
+    without a YES/NO verdict, unknown ids and repeated ids are left out so the
+    caller can fall back to single-segment requests for them.  JSON answers
+    (``response_schema.BATCH_SCHEMA``) are decoded directly.
+    """
+    structured = parse_structured_batch(response_text, segment_ids)
+    if structured is not None:
+        return structured
+
+    wanted = set(segment_ids)
+    entries = {}
+    repeated = set()
+    matches = list(_BATCH_ENTRY.finditer(response_text))
+    for i, match in enumerate(matches):
+        segment_id = int(match.group(1))
+        if segment_id not in wanted:
+            continue
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(response_text)
+        entry_text = response_text[match.end():end].strip()
+        if not re.search(r"CONTAINS_MULTIPLE_STORIES:\s*(YES|NO)", entry_text, re.IGNORECASE):
+            continue
+        if segment_id in entries:
+            repeated.add(segment_id)
+            continue
+        entries[segment_id] = entry_text
+
+    decisions = {}
+    for segment_id, entry_text in entries.items():
+        if segment_id in repeated:
+            continue
+        decisions[segment_id] = parse_analysis_response(entry_text) + (entry_text,)
+    return decisions
+
+
+class SortEngine:
+    """Parse, analyze, split and save segments without any GUI.
+
+    ``log`` is called as ``log(message, message_type)`` and ``status`` as
+    ``status(text)``; both default to doing nothing so the engine can run
+    silently.  The Tk app passes its log panel and progress label, the CLI
+    passes functions that print to stderr.
+
+    With ``workers`` > 1 the analyses of upcoming segments run on a thread
+    pool while earlier ones are committed.  Results are still committed
+    strictly in segment order, so split IDs and counters do not depend on
+    which request finishes first.
+
+    ``cache`` is an optional ``llm_cache.ResponseCache``; when given, model
+    responses are looked up there before calling the backend.
+
+    With ``prefilter`` segments that ``split_utils.is_single_story`` marks as
+    single-story are kept as is without asking the model.
+
+    With ``batch_tokens`` > 0 upcoming segments are packed into one request
+    until their estimated size reaches that many tokens (at most
+    ``BATCH_MAX_SEGMENTS`` segments).  Segments the packed answer leaves out
+    or garbles are retried with a single-segment request.
+
+    Prompts carry only the numbered story sentences of a segment; the
+    instructions are a fixed system message ahead of them.  With
+    ``prompt_tokens`` > 0 at most about that many tokens of sentences are
+    sent per segment.  Answers are capped at ``answer_tokens`` per segment
+    (0 for no cap); single-segment answers are streamed and cut off as soon
+    as the verdict is known.
+
+    ``thinking`` maps model names (or ``"*"`` for any model) to a
+    ``thinking`` policy for reasoning models; unlisted models get ``auto``.
+    Under a budget a streamed answer is cut off after about ``think_budget``
+    tokens of thinking and, if the model can, asked again with thinking off.
+    Think blocks are stripped from every answer.
+
+    With ``structured`` the backends are asked for JSON answers matching
+    ``response_schema``; the text parser stays as the fallback.
+
+    Each backend is reached through one pooled ``llm_clients`` client with
+    ``pool_size`` keep-alive connections, the given timeouts and up to
+    ``max_retries`` retries.  A request that still fails with a transient
+    error raises ``TransientBackendError`` and stops the run (keeping the
+    partial output) rather than being recorded as "no split".  With more
+    than one ``ollama_hosts`` URL, Ollama requests are spread over the hosts
+    by an ``llm_clients.OllamaHostPool``.  ``openai_base_url`` points the
+    OpenAI model at any server speaking the same protocol.  Ollama keeps the
+    model loaded for ``keep_alive`` after each request; ``preload_models``
+    loads it before the first one.
+
+    With ``embed_model`` segments are not sent to the chat model.  Their
+    story sentences are embedded with that Ollama model instead and split
+    where neighbouring sentences are less similar than ``split_threshold``
+    (``embedding_splits``).  With ``confirm_splits`` the chat analysis still
+    runs, but only for segments the embeddings propose to split.  Packed
+    requests are not used in this mode.
+
+    With ``escalation_model`` the run is a cascade: ``model`` screens every
+    segment and only segments it answers YES for, or whose answer has no
+    verdict, are analyzed again by ``escalation_model``, whose answer wins.
+
+    With ``journal`` every decision is appended to a ``run_journal`` file next
+    to the input as it is committed.  With ``resume`` the decisions of an
+    earlier, interrupted run on the same input with the same model are
+    replayed instead of asking the model again.
+
+    With ``incremental`` the decisions behind the last output of the input
+    (its ``run_manifest``) are reused for every segment whose text has not
+    changed, so only new or edited segments are analyzed.  The manifest is
+    rewritten after every incremental run.
+
+    ``metrics`` (a ``run_metrics.RunMetrics``) times every stage of the run
+    and counts the tokens the backends report.  With ``report`` a JSON run
+    report is written next to the output when the run is saved.
+    """
+
+    def __init__(self, model=DEFAULT_MODEL, api_key="", keep_same_topic=True,
+                 log=None, status=None, workers=1, cache=None, prefilter=True,
+                 batch_tokens=0, pool_size=DEFAULT_POOL_SIZE,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT,
+                 max_retries=DEFAULT_MAX_RETRIES, prompt_tokens=0,
+                 answer_tokens=DEFAULT_ANSWER_TOKENS, structured=True, journal=False,
+                 resume=False, incremental=False, ollama_hosts=(), escalation_model=None,
+                 openai_base_url=OPENAI_BASE_URL, report=True, keep_alive=DEFAULT_KEEP_ALIVE,
+                 thinking=None, think_budget=DEFAULT_THINK_BUDGET, embed_model=None,
+                 split_threshold=DEFAULT_SPLIT_THRESHOLD, confirm_splits=False):
+        self.model = model
+        self.escalation_model = escalation_model if escalation_model != model else None
+        self.embed_model = embed_model
+        self.split_threshold = split_threshold
+        self.confirm_splits = confirm_splits
+        self.decision_model = decision_model(model, self.escalation_model, embed_model,
+                                             split_threshold, confirm_splits)
+        self.api_key = api_key
+        self.keep_same_topic = keep_same_topic
+        self.workers = max(1, int(workers))
+        self.cache = cache
+        self.prefilter = prefilter
+        # Embedding splits ask about one segment at a time
+        self.batch_tokens = 0 if embed_model else max(0, int(batch_tokens))
+        self.prompt_tokens = max(0, int(prompt_tokens))
+        self.answer_tokens = max(0, int(answer_tokens))
+        self.structured = structured
+        self.journal = journal
+        self.resume = resume
+        self.incremental = incremental
+        self.ollama_hosts = [host for host in ollama_hosts if host]
+        self.openai_base_url = openai_base_url or OPENAI_BASE_URL
+        self.report = report
+        self.keep_alive = keep_alive
+        self.thinking = dict(thinking or {})
+        self.think_budget = max(1, int(think_budget))
+        self.client_options = {
+            "pool_size": max(pool_size, self.workers),
+            "connect_timeout": connect_timeout,
+            "read_timeout": read_timeout,
+            "max_retries": max_retries,
+        }
+        self._log = log or (lambda message, message_type="normal": None)
+        self._status = status or (lambda text: None)
+
+        self.input_file_path = ""
+        self.output_file_path = ""
+
+        # Segment processing variables.  Segments are parsed from the input
+        # file on demand and dropped once committed, so only the segments
+        # between the commit point and the look-ahead window are in memory.
+        self.segment_count = 0
+        self.current_segment_index = 0
+        self.processed_count = 0
+        self._segment_file = None
+        self._segment_iter = None
+        self._parsed_segments = {}
+        self._parsed_count = 0
+
+        # Topic counter variables
+        self.baseline_topic_count = 0
+        self.current_topic_count = 0
+        self.different_topics_count = 0
+        self.same_topics_count = 0
+        # Counter for assigning IDs to split segments
+        self.split_id_counter = 0
+        # Segments kept without a model call by the pre-filter
+        self.model_calls_skipped = 0
+        # Packed requests sent, segments they answered, and segments that
+        # had to be retried on their own; updated from the worker threads
+        self.batch_requests = 0
+        self.batched_segments = 0
+        self.batch_fallbacks = 0
+        # Cascade: segments screened and escalated, and the model time spent
+        # on each; updated from the worker threads
+        self.screened_count = 0
+        self.escalated_count = 0
+        self.screen_seconds = 0.0
+        self.escalation_seconds = 0.0
+        # Answers whose thinking ran past the budget; updated from the
+        # worker threads
+        self.thinking_cutoffs = 0
+        # Embedding splits: segments embedded, segments they proposed to
+        # split, and proposals sent to the chat model to confirm
+        self.embedded_count = 0
+        self.embedding_proposals = 0
+        self.embedding_confirmations = 0
+        self._stats_lock = threading.Lock()
+
+        # Analyses running ahead of the commit point: segment index -> Future
+        # resolving to ``{segment index: analysis}``; the segments of one
+        # packed request share a Future
+        self._executor = None
+        self._pending = {}
+
+        # Output is streamed to disk as segments are committed
+        self._writer = None
+
+        # Decision journal, and the decisions of an earlier run being
+        # replayed: segment index -> journal record
+        self._journal = None
+        self._resumed = {}
+        self.resumed_count = 0
+        # Analysis of the segment being committed, for its journal record
+        self._analysis = None
+
+        # Incremental mode: decisions of the last run by segment hash, and
+        # the decisions of this run for the next manifest
+        self._known = {}
+        self._decisions = None
+        self.reused_count = 0
+
+        # Stage timings and token counts, and when the run was loaded
+        self.metrics = RunMetrics()
+        self._started_at = None
+        self._started = 0.0
+
+        # Pooled backend clients, created on first use: backend name -> client
+        self._clients = {}
+        self._clients_lock = threading.Lock()
+
+    def log(self, message, message_type="normal"):
+        self._log(message, message_type)
+
+    def set_status(self, text):
+        self._status(text)
+
+    @property
+    def finished(self):
+        return self.current_segment_index >= self.segment_count
+
+    def segment(self, index):
+        """Return the ``segment_parser.Segment`` at ``index``.
+
+        It unpacks as ``(title, content, original_text)``.  Segments must be
+        requested from the commit point onwards; earlier ones have already
+        been released.
+        """
+        while self._parsed_count <= index:
+            with self.metrics.timer("parse"):
+                self._parsed_segments[self._parsed_count] = next(self._segment_iter)
+            self._parsed_count += 1
+        return self._parsed_segments[index]
+
+    def segment_lines(self, index):
+        """Return the ``line_kinds`` labels of the content lines of segment ``index``."""
+        return self.segment(index).lines()
+
+    def _release_current_segment(self):
+        """Forget the current segment and move on to the next one."""
+        self._parsed_segments.pop(self.current_segment_index, None)
+        # An analysis queued for a manually kept segment is no longer needed
+        self._pending.pop(self.current_segment_index, None)
+        self.current_segment_index += 1
+
+    def load(self, input_file_path, output_file_path=None):
+        """Open ``input_file_path``, count its segments and reset all counters.
+
+        The output goes to ``output_file_path``, by default a timestamped
+        ``_sorted_`` file next to the input.  Returns the number of segments.
+        """
+        self.close()
+        self.input_file_path = input_file_path
+        self.output_file_path = output_file_path or sorted_output_path(input_file_path)
+
+        self.log(f"Reading file content...", "info")
+
+        if self.embed_model:
+            try:
+                import numpy  # noqa: F401
+            except ImportError:
+                raise RuntimeError("Embedding splits need NumPy; install it with: pip install numpy")
+
+        # One streaming pass to count, then segments are parsed as needed
+        self.segment_count = count_segments(input_file_path)
+        self._segment_file = open(input_file_path, 'r', encoding='utf-8', errors='ignore')
+        self._segment_iter = read_segments(self._segment_file)
+        self._parsed_segments = {}
+        self._parsed_count = 0
+        self.current_segment_index = 0
+        self.processed_count = 0
+
+        # Set initial counters
+        self.baseline_topic_count = self.segment_count
+        self.current_topic_count = 0  # Start with 0, will increment as we process
+        self.different_topics_count = 0
+        self.same_topics_count = 0
+        self.split_id_counter = 0
+        self.model_calls_skipped = 0
+        self.batch_requests = 0
+        self.batched_segments = 0
+        self.batch_fallbacks = 0
+        self.screened_count = 0
+        self.escalated_count = 0
+        self.screen_seconds = 0.0
+        self.escalation_seconds = 0.0
+        self.thinking_cutoffs = 0
+        self.embedded_count = 0
+        self.embedding_proposals = 0
+        self.embedding_confirmations = 0
+        self.resumed_count = 0
+        self.reused_count = 0
+        self._known = {}
+        self._decisions = None
+        self.metrics = RunMetrics()
+        self._started_at = datetime.datetime.now()
+        self._started = time.monotonic()
+
+        self.log(f"Found {self.segment_count} segments in the file", "highlight")
+        for model in (self.model, self.escalation_model):
+            if model and reasoning_model(model):
+                self.log(f"Thinking for {model}: {self.thinking_policy(model)}", "info")
+
+        if self.segment_count:
+            # Header with model and timestamp
+            timestamp_str = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            header = f"{self.decision_model}\n{timestamp_str}\n" + "\n" * 4
+            self._writer = SegmentWriter(self.output_file_path, header)
+            if self.journal:
+                self._open_journal()
+            if self.incremental:
+                self._load_manifest()
+        return self.segment_count
+
+    def _load_manifest(self):
+        """Read the decisions of the last run for incremental mode."""
+        self._known = read_manifest(
+            manifest_path(self.input_file_path), self.decision_model, self._prompt_version()
+        )
+        self._decisions = {}
+        if self._known:
+            self.log(f"Incremental run: {len(self._known)} decisions known from the last run", "highlight")
+        else:
+            self.log("Incremental run: no manifest from an earlier run, analyzing everything", "info")
+
+    def _open_journal(self):
+        """Start the decision journal; with ``resume`` pick up its decisions."""
+        path = journal_path(self.input_file_path)
+        records = read_journal(path, self.decision_model, self.segment_count) if self.resume else {}
+        try:
+            self._journal = JournalWriter(path, self.decision_model, self.segment_count,
+                                          append=bool(records))
+        except OSError as e:
+            self.log(f"Could not open the decision journal: {e}", "warning")
+            return
+        self._resumed = records
+        if records:
+            self.log(f"Resuming: {len(records)} segments already decided in {path}", "highlight")
+
+    def run(self, input_file_path, output_file_path=None):
+        """Process ``input_file_path`` end to end and return the output path.
+
+        Returns ``None`` when the file contains no segments.
+        """
+        self.log(f"Started processing with model: {self.decision_model}", "highlight")
+        try:
+            if not self.load(input_file_path, output_file_path):
+                self.log("Error: No segments found in the file", "error")
+                return None
+            while not self.finished:
+                self.process_next_segment()
+            return self.save()
+        finally:
+            self.close()
+            self.close_clients()
+
+    def close(self):
+        """Drop queued analyses, stop the worker pool and close all files.
+
+        Output of an unfinished run is left in the ``.partial`` file.
+        """
+        for future in self._pending.values():
+            future.cancel()
+        self._pending = {}
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        if self._segment_file is not None:
+            self._segment_file.close()
+            self._segment_file = None
+            self._segment_iter = None
+        self._parsed_segments = {}
+        self._resumed = {}
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        if self._writer is not None:
+            self._writer.abort()
+            self.log(f"Run not finished; partial output kept in {self._writer.temp_path}", "warning")
+            self._writer = None
+
+    def close_clients(self):
+        """Close the pooled backend connections."""
+        with self._clients_lock:
+            clients, self._clients = self._clients, {}
+        for client in clients.values():
+            client.close()
+
+    def _analysis_for_current_segment(self):
+        """Return the analysis of the current segment.
+
+        In parallel or batching mode this also queues the analyses of the
+        following segments so up to ``workers`` requests are in flight.  The
+        queue runs at most ``2 * workers`` requests ahead, which keeps the
+        pool busy while a slow segment holds up the commit point without
+        reading far ahead.
+        """
+        index = self.current_segment_index
+        segment = self.segment(index)
+        title, content, _ = segment
+        resumed = self._resumed_analysis(index)
+        if resumed is not None:
+            return resumed
+        known = self._known_analysis(index)
+        if known is not None:
+            return known
+        if self._skips_model(index):
+            self.model_calls_skipped += 1
+            self.log("Single story by rule, skipping the model", "info")
+            return SINGLE_STORY_ANALYSIS
+
+        if self.workers == 1 and not self.batch_tokens:
+            return self.analyze_segment(title, content, segment.lines())
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="analysis"
+            )
+        self._queue_analyses(index)
+        with self.metrics.timer("wait"):
+            return self._pending.pop(index).result()[index]
+
+    def _queue_analyses(self, index):
+        """Submit requests for the segments from ``index`` to the end of the window."""
+        window = 2 * self.workers
+        if self.batch_tokens:
+            window *= BATCH_MAX_SEGMENTS
+        window_end = min(index + window, self.segment_count)
+
+        batch = []
+        batch_tokens = 0
+        for i in range(index, window_end):
+            if i in self._pending or i in self._resumed or self._is_known(i):
+                continue
+            if self._skips_model(i):
+                continue
+            segment = self.segment(i)
+            title, content, _ = segment
+            if not self.batch_tokens:
+                self._submit_batch([(i, title, content, segment.lines())])
+                continue
+            tokens = estimate_tokens(title) + estimate_tokens(
+                numbered_sentences(content, segment.lines(), self.prompt_tokens)
+            )
+            if batch and (batch_tokens + tokens > self.batch_tokens
+                          or len(batch) >= BATCH_MAX_SEGMENTS):
+                self._submit_batch(batch)
+                batch = []
+                batch_tokens = 0
+            batch.append((i, title, content, segment.lines()))
+            batch_tokens += tokens
+
+        # A partly filled batch waits for more segments unless the commit
+        # point needs it now or there are no more segments to add
+        if batch and (batch[0][0] == index or window_end == self.segment_count):
+            self._submit_batch(batch)
+
+    def _submit_batch(self, items):
+        future = self._executor.submit(self._analyze_batch, items, time.perf_counter())
+        for item in items:
+            self._pending[item[0]] = future
+
+    def _resumed_analysis(self, index):
+        """Return the journaled analysis of segment ``index``, or ``None``."""
+        record = self._resumed.get(index)
+        if record is None:
+            return None
+        title, content, _ = self.segment(index)
+        if record.get("hash") != segment_hash(title, content):
+            # The input changed; later records cannot be trusted either
+            self.log(f"Segment #{index + 1} differs from the journal; asking the model from here on", "warning")
+            self._resumed = {}
+            return None
+        self.resumed_count += 1
+        self.log("Decided in an earlier run, replaying the journal", "info")
+        split_points = [p for p in record.get("split_after") or [] if isinstance(p, int)]
+        return (False, "Decision replayed from the journal", JOURNAL_RESPONSE,
+                bool(split_points), len(split_points) + 1, [], split_points)
+
+    def _is_known(self, index):
+        if not self._known:
+            return False
+        title, content, _ = self.segment(index)
+        return segment_hash(title, content) in self._known
+
+    def _known_analysis(self, index):
+        """Return the last run's analysis of an unchanged segment, or ``None``."""
+        if not self._known:
+            return None
+        title, content, _ = self.segment(index)
+        split_points = self._known.get(segment_hash(title, content))
+        if split_points is None:
+            return None
+        self.reused_count += 1
+        self.log("Unchanged since the last run, reusing its decision", "info")
+        return (False, "Decision reused from the last run", MANIFEST_RESPONSE,
+                bool(split_points), len(split_points) + 1, [], split_points)
+
+    def _skips_model(self, index):
+        if not self.prefilter:
+            return False
+        segment = self.segment(index)
+        if segment.single_story is None:
+            segment.single_story = is_single_story(segment.content, segment.lines())
+        return segment.single_story
+
+    def _analyze_batch(self, items, submitted=None):
+        """Analyze ``items`` (``(index, title, content, lines)``) in one request.
+
+        Returns ``{index: analysis}``.  Cached segments are answered from the
+        cache; segments missing from the packed answer get their own request.
+        ``submitted`` is the ``time.perf_counter()`` of queueing the request.
+        """
+        if submitted is not None:
+            self.metrics.record("queue", time.perf_counter() - submitted)
+        if len(items) == 1:
+            index, title, content, lines = items[0]
+            return {index: self.analyze_segment(title, content, lines)}
+
+        started = time.monotonic()
+        results = {}
+        misses = []
+        for index, title, content, lines in items:
+            cache_key, response_text = self._cached_response(self.model, title, content)
+            if response_text is None:
+                misses.append((index, title, content, lines, cache_key))
+            else:
+                results[index] = self._analysis_from_response(response_text)
+
+        if len(misses) > 1:
+            results.update(self._request_batch(misses))
+        self._count_screening(len(results), time.monotonic() - started)
+        # Segments asked again on their own below escalate in analyze_segment
+        for index, title, content, lines in items:
+            if index in results:
+                results[index] = self._escalated(title, content, results[index], lines)
+        for index, title, content, lines, _ in misses:
+            if index not in results:
+                if len(misses) > 1:
+                    with self._stats_lock:
+                        self.batch_fallbacks += 1
+                    self.log(f"No usable answer for segment #{index + 1} in the batch, asking again on its own", "warning")
+                results[index] = self.analyze_segment(title, content, lines)
+        return results
+
+    def _request_batch(self, misses):
+        """Send one packed request; returns ``{index: analysis}`` of the usable answers."""
+        model = self.model
+        self.log(f"Analyzing {len(misses)} segments in one request with {model}...", "info")
+        self.set_status(f"Status: Analyzing {len(misses)} segments for multiple stories with {model}...")
+        with self.metrics.timer("prompt"):
+            prompt = build_batch_prompt(
+                [(index + 1, title, content, lines) for index, title, content, lines, _ in misses],
+                self.prompt_tokens,
+            )
+        try:
+            with self.metrics.timer("generation"):
+                response_text = self._chat(model, prompt, len(misses))
+        except TransientBackendError:
+            raise
+        except Exception as e:
+            self.log(f"Batch request failed, falling back to single requests: {e}", "warning")
+            return {}
+
+        with self.metrics.timer("response_parse"):
+            decisions = parse_batch_response(response_text, [miss[0] + 1 for miss in misses])
+        results = {}
+        for index, _, _, _, cache_key in misses:
+            decision = decisions.get(index + 1)
+            if decision is None:
+                continue
+            contains_multiple_stories, number_of_stories, split_points, reasoning, entry_text = decision
+            # The entry has the single-segment format, so it is cached as one
+            self._store_response(cache_key, model, entry_text)
+            results[index] = (False, reasoning, entry_text, contains_multiple_stories,
+                              number_of_stories, [], split_points)
+        with self._stats_lock:
+            self.batch_requests += 1
+            self.batched_segments += len(results)
+        return results
+
+    def analyze_segment(self, title, content, lines=None):
+        """Analyze a segment with the selected model, escalating if it is unsure.
+
+        ``lines`` are the segment's cached line labels (``Segment.lines()``).
+        With ``embed_model`` the sentence embeddings decide instead.
+        """
+        if self.embed_model:
+            return self._analyze_by_embedding(title, content, lines)
+        return self._chat_analysis(title, content, lines)
+
+    def _chat_analysis(self, title, content, lines=None):
+        started = time.monotonic()
+        analysis = self._analyze_with(self.model, title, content, lines)
+        self._count_screening(1, time.monotonic() - started)
+        return self._escalated(title, content, analysis, lines)
+
+    def _analyze_by_embedding(self, title, content, lines=None):
+        """Propose split points where neighbouring sentences stop being similar."""
+        numbered = story_sentences(content, lines)
+        if len(numbered) < 2:
+            return False, "Fewer than two sentences", "(embedding skipped: one sentence)", False, 1, [], []
+        numbers = [number for number, _ in numbered]
+        self.log(f"Embedding {len(numbered)} sentences with {self.embed_model}...", "info")
+        try:
+            with self.metrics.timer("embedding"):
+                vectors = self._client("ollama").embed(self.embed_model, [s for _, s in numbered])
+        except TransientBackendError:
+            raise
+        except Exception as e:
+            self.log(f"Embedding failed, keeping the segment as is: {e}", "warning")
+            return False, f"Error occurred during embedding: {str(e)}", str(e), False, 1, [], []
+        similarities = adjacent_similarities(vectors)
+        split_points = propose_split_points(numbers, similarities, self.split_threshold)
+        response_text = similarity_text(numbers, similarities)
+        with self._stats_lock:
+            self.embedded_count += 1
+            self.embedding_proposals += bool(split_points)
+            self.embedding_confirmations += bool(split_points and self.confirm_splits)
+        if not split_points:
+            return False, "Neighbouring sentences stay similar", response_text, False, 1, [], []
+        splits_str = ", ".join(map(str, split_points))
+        if self.confirm_splits:
+            self.log(f"Embeddings propose splitting after sentence {splits_str}; asking {self.model} to confirm", "info")
+            return self._chat_analysis(title, content, lines)
+        reasoning = f"Similarity drops below {self.split_threshold:g} after sentence {splits_str}"
+        return False, reasoning, response_text, True, len(split_points) + 1, [], split_points
+
+    def _analyze_with(self, model, title, content, lines=None):
+        """Analyze a segment with the backend matching ``model``."""
+        self.log(f"Analyzing with {model} for multiple stories...", "info")
+        # Use OpenAI when the gpt-4.1-nano model is selected
+        if model == OPENAI_MODEL:
+            return self.analyze_segment_with_openai(title, content, model, lines)
+        return self.analyze_segment_with_ollama(title, content, model, self.keep_same_topic, lines)
+
+    def _count_screening(self, segments, seconds):
+        if self.escalation_model:
+            with self._stats_lock:
+                self.screened_count += segments
+                self.screen_seconds += seconds
+
+    def _escalated(self, title, content, analysis, lines=None):
+        """Return ``analysis``, or the escalation model's if the screening is unsure.
+
+        A YES verdict, or an answer without a verdict (including errors), is
+        sent on to ``escalation_model``.
+        """
+        if not self.escalation_model:
+            return analysis
+        if not analysis[3] and has_verdict(analysis[2]):
+            return analysis
+        reason = "multiple stories" if analysis[3] else "no clear verdict"
+        self.log(f"{self.model} found {reason}, escalating to {self.escalation_model}", "info")
+        started = time.monotonic()
+        escalated = self._analyze_with(self.escalation_model, title, content, lines)
+        with self._stats_lock:
+            self.escalated_count += 1
+            self.escalation_seconds += time.monotonic() - started
+        return escalated
+
+    def _cached_response(self, model, title, content):
+        """Return ``(cache_key, cached_response)``; both ``None`` without a cache."""
+        if self.cache is None:
+            return None, None
+        key = self.cache.make_key(model, self._prompt_version(), title, content)
+        response_text = self.cache.get(key)
+        if response_text is not None:
+            self.log("Using cached response", "info")
+        return key, response_text
+
+    def _prompt_version(self):
+        version = str(PROMPT_VERSION)
+        if self.structured:
+            version += "-json"
+        if not self.keep_same_topic:
+            version += "-updates"
+        # A token budget can cut the prompt short, so it is part of the key
+        if self.prompt_tokens:
+            version += f"-t{self.prompt_tokens}"
+        return version
+
+    def _store_response(self, cache_key, model, response_text):
+        # Only answers with a verdict are kept: an empty (cut off while
+        # thinking) or garbled one would otherwise be replayed on every run
+        # instead of asking again
+        if self.cache is not None and response_text and has_verdict(response_text):
+            self.cache.put(cache_key, model, response_text)
+
+    def _analysis_from_response(self, response_text):
+        with self.metrics.timer("response_parse"):
+            verdict = has_verdict(response_text)
+            contains_multiple_stories, number_of_stories, split_points, reasoning = (
+                parse_analysis_response(response_text)
+            )
+        if not verdict:
+            self.log("The answer has no YES/NO verdict; keeping the segment as is", "warning")
+        # Note: The "is_different" value is always false, as we're not comparing segments anymore
+        return False, reasoning, response_text, contains_multiple_stories, number_of_stories, [], split_points
+
+    def _chat(self, model, prompt, segments=1):
+        """Send ``prompt`` about ``segments`` segments to the backend of ``model``.
+
+        Returns the reply text.
+        """
+        if model == OPENAI_MODEL:
+            return self._chat_openai(model, prompt, segments)
+        return self._chat_ollama(model, prompt, segments)
+
+    def thinking_policy(self, model):
+        """Return the ``off``, ``budget`` or ``on`` thinking policy of ``model``."""
+        policy = self.thinking.get(model, self.thinking.get("*", THINKING_AUTO))
+        return resolve_policy(model, policy)
+
+    def _answer_options(self, segments, model=None, policy=None):
+        """Return the chat arguments of a request about ``segments`` segments to ``model``."""
+        model = model or self.model
+        policy = policy or self.thinking_policy(model)
+        schema = None
+        if self.structured:
+            schema = ANALYSIS_SCHEMA if segments == 1 else BATCH_SCHEMA
+        if segments == 1:
+            system = analysis_system_prompt(self.structured, self.keep_same_topic)
+        else:
+            system = batch_system_prompt(self.structured, self.keep_same_topic)
+        switch = soft_switch(model, policy)
+        if switch:
+            system += "\n" + switch
+        max_tokens = self.answer_tokens * segments or None
+        # Only a single-segment answer can be judged complete while streaming
+        stop_when = answer_complete if segments == 1 else None
+        if policy == THINKING_BUDGET:
+            if max_tokens:
+                max_tokens += self.think_budget
+            if stop_when is not None:
+                stop_when = self._complete_or_over_budget
+        return {
+            "system": system,
+            "max_tokens": max_tokens,
+            "stop_when": stop_when,
+            "schema": schema,
+            "think": think_flag(model, policy),
+        }
+
+    def _complete_or_over_budget(self, text):
+        return (answer_complete(text)
+                or estimate_tokens(unfinished_thinking(text)) > self.think_budget)
+
+    def _client(self, backend):
+        """Return the pooled client of ``backend`` ("ollama" or "openai")."""
+        with self._clients_lock:
+            client = self._clients.get(backend)
+            if client is None:
+                callbacks = {
+                    "on_retry": lambda message: self.log(message, "warning"),
+                    # Looked up on every call: load() starts a new RunMetrics
+                    "on_usage": lambda *usage: self.metrics.record_tokens(*usage),
+                }
+                if backend == "openai":
+                    client = OpenAIClient(self.api_key.strip(), openai_chat_url(self.openai_base_url),
+                                          **callbacks, **self.client_options)
+                elif len(self.ollama_hosts) > 1:
+                    client = OllamaHostPool(self.ollama_hosts, keep_alive=self.keep_alive,
+                                            **callbacks, **self.client_options)
+                else:
+                    host = self.ollama_hosts[0] if self.ollama_hosts else None
+                    client = OllamaClient(host, keep_alive=self.keep_alive,
+                                          **callbacks, **self.client_options)
+                self._clients[backend] = client
+            return client
+
+    def preload_models(self):
+        """Load the Ollama models of the run so the first segment does not wait for them.
+
+        Returns True if every model was loaded; failures are only logged,
+        the first request then loads the model as usual.
+        """
+        loaded = True
+        # Without confirmation, embedding splits never ask a chat model
+        chat_models = () if self.embed_model and not self.confirm_splits else (self.model, self.escalation_model)
+        for model in chat_models:
+            if not model or model == OPENAI_MODEL:
+                continue
+            self.log(f"Loading {model}...", "info")
+            started = time.monotonic()
+            try:
+                self._client("ollama").preload(model)
+            except Exception as e:
+                self.log(f"Could not preload {model}: {e}", "warning")
+                loaded = False
+                continue
+            self.log(f"{model} loaded in {time.monotonic() - started:.1f} s", "info")
+        return loaded
+
+    def host_status_text(self):
+        """Return the per-host load of a multi-host Ollama pool, or ``""``."""
+        client = self._clients.get("ollama")
+        return client.status_text() if isinstance(client, OllamaHostPool) else ""
+
+    def _chat_ollama(self, model, prompt, segments=1):
+        client = self._client("ollama")
+        response_text = client.chat(model, prompt, **self._answer_options(segments, model))
+        answer = strip_thinking(response_text)
+        if answer or not unfinished_thinking(response_text):
+            return answer
+        # Cut off while still thinking: nothing to parse
+        with self._stats_lock:
+            self.thinking_cutoffs += 1
+        if resolve_policy(model, THINKING_OFF) != THINKING_OFF:
+            self.log(f"{model} thought past the budget of {self.think_budget} tokens without answering", "warning")
+            return answer
+        self.log(f"{model} thought past the budget of {self.think_budget} tokens; asking again without thinking", "warning")
+        return strip_thinking(client.chat(
+            model, prompt, **self._answer_options(segments, model, THINKING_OFF)
+        ))
+
+    def _chat_openai(self, model, prompt, segments=1):
+        if not self.api_key.strip():
+            raise ValueError("OpenAI API key is missing")
+        return strip_thinking(
+            self._client("openai").chat(model, prompt, **self._answer_options(segments, model))
+        )
+
+    def analyze_segment_with_ollama(self, title, content, model, keep_same_topic, lines=None):
+        try:
+            cache_key, response_text = self._cached_response(model, title, content)
+            if response_text is None:
+                with self.metrics.timer("prompt"):
+                    prompt = build_analysis_prompt(title, content, lines, self.prompt_tokens)
+
+                # Update status to show which model is being used
+                self.set_status(f"Status: Analyzing segment for multiple stories with {model}...")
+
+                with self.metrics.timer("generation"):
+                    response_text = self._chat_ollama(model, prompt)
+                self._store_response(cache_key, model, response_text)
+
+            # Return values needed for segment splitting
+            return self._analysis_from_response(response_text)
+
+        except TransientBackendError:
+            # Retries ran out; this is not an answer about the segment
+            raise
+        except Exception as e:
+            self.log(f"Ollama analysis error: {str(e)}", "error")
+            return False, f"Error occurred during analysis: {str(e)}", str(e), False, 1, [], []
+
+    def analyze_segment_with_openai(self, title, content, model, lines=None):
+        """Analyze a segment using the OpenAI API."""
+        cache_key, response_text = self._cached_response(model, title, content)
+        if response_text is not None:
+            return self._analysis_from_response(response_text)
+
+        if not self.api_key.strip():
+            self.log("OpenAI API key is missing", "error")
+            return False, "Missing API key", "", False, 1, [], []
+
+        with self.metrics.timer("prompt"):
+            prompt = build_analysis_prompt(title, content, lines, self.prompt_tokens)
+
+        self.set_status(f"Status: Analyzing segment for multiple stories with {model}...")
+        try:
+            with self.metrics.timer("generation"):
+                response_text = self._chat_openai(model, prompt)
+            self._store_response(cache_key, model, response_text)
+            return self._analysis_from_response(response_text)
+        except TransientBackendError:
+            raise
+        except Exception as e:
+            self.log(f"OpenAI analysis error: {e}", "error")
+            return False, f"Error occurred during analysis: {str(e)}", str(e), False, 1, [], []
+
+    def process_next_segment(self):
+        """Analyze the current segment and commit it whole or split."""
+        title, content, original_text = self.segment(self.current_segment_index)
+
+        self.log(f"Processing: Segment #{self.current_segment_index + 1}/{self.segment_count} - {title.strip()}", "info")
+        self.set_status(f"Processing segment {self.current_segment_index + 1} of {self.segment_count}")
+
+        # Always use AI to analyze for multiple stories in a segment
+        self._analysis = self._analysis_for_current_segment()
+        _, reasoning, raw_response, contains_multiple_stories, number_of_stories, _, split_points = (
+            self._analysis
+        )
+
+        # Add debug log entry with raw response
+        self.log(f"Raw AI response: {raw_response}", "info")
+
+        # Check if segment contains multiple stories
+        if contains_multiple_stories and number_of_stories > 1 and split_points:
+            self.log(f"AI found {number_of_stories} distinct stories within segment #{self.current_segment_index + 1}!", "highlight")
+            splits_str = ", ".join([str(p) for p in split_points])
+            self.log(f"Splitting after sentence: {splits_str}", "info")
+
+            # Split the segment using the original title for all sub-segments
+            if self.split_current_segment(split_points):
+                return
+            # If splitting failed, fall through to normal processing
+        else:
+            # No multiple stories found, just add the segment as is
+            self.log(f"No multiple stories found in segment. Keeping as is.", "info")
+
+        # Process segment as a whole (no splitting needed)
+        self.keep_current_segment()
+
+    def keep_current_segment(self, manual=False):
+        """Commit the current segment unchanged, with all of its metadata."""
+        segment = self.segment(self.current_segment_index)
+        title = segment.title
+        current_metadata = segment.metadata_lines()
+
+        # Split into lines and filter out empty lines
+        segment_lines = [line for line in segment.text.splitlines() if line.strip()]
+
+        # Make sure all metadata is included
+        present = set(segment_lines)
+        for meta_line in current_metadata:
+            if meta_line not in present:
+                segment_lines.append(meta_line)
+                present.add(meta_line)
+
+        # Add as a separate segment with all metadata
+        self._write_processed("\n".join(segment_lines), current_metadata)
+        self._record_decision([], manual)
+
+        # Increment counters
+        if self.current_segment_index == 0:
+            # First segment
+            self.current_topic_count = 1
+            self.log(f"Added first segment #{self.current_segment_index + 1}: {title.strip()}", "success")
+        else:
+            # New segment, treated as a different topic (no merging)
+            self.different_topics_count += 1
+            self.current_topic_count += 1
+            label = " as separate segment" if manual else ""
+            self.log(f"Added segment #{self.current_segment_index + 1}{label}: {title.strip()}", "success")
+
+        # Move to next segment
+        self._release_current_segment()
+
+    def split_current_segment(self, split_points):
+        """Split the current segment into multiple segments based on AI analysis"""
+        if not split_points:
+            self.log(f"Can't split segment - missing split points", "warning")
+            return False
+
+        segment = self.segment(self.current_segment_index)
+        title, content, original_text = segment
+
+        # Use helper from split_utils to create sub-segments with metadata
+        with self.metrics.timer("split"):
+            segments = split_segment(title, content, original_text, split_points, segment.lines())
+
+        # If we actually split into multiple segments, assign an ID to track them
+        if len(segments) > 1:
+            self.split_id_counter += 1
+            split_id = f"ID{self.split_id_counter:04d}"
+
+            def insert_id(text: str) -> str:
+                lines = text.splitlines()
+                if not lines:
+                    return text
+                lines.insert(1, split_id)
+                return "\n".join(lines)
+
+            segments = [insert_id(seg) for seg in segments]
+
+        self.log(f"Splitting segment #{self.current_segment_index + 1} into {len(segments)} sub-segments", "highlight")
+
+        # Add the segments to processed segments
+        metadata = segment.metadata_lines()
+        for i, segment_text in enumerate(segments):
+            if i == 0 and not self.processed_count:
+                # First segment of the whole file
+                self._write_processed(segment_text, metadata)
+                self.current_topic_count = 1
+                self.log(f"Added first sub-segment", "success")
+            else:
+                self._write_processed(segment_text, metadata)
+                self.current_topic_count += 1
+                self.different_topics_count += 1
+                self.log(f"Added sub-segment", "success")
+
+        self._record_decision(split_points)
+
+        # Adjust baseline count since we've added segments
+        self.baseline_topic_count += len(segments) - 1
+
+        # Move to next segment
+        self._release_current_segment()
+        return True
+
+    def _record_decision(self, split_points, manual=False):
+        """Journal the decision for the current segment and keep it for the manifest."""
+        analysis, self._analysis = self._analysis, None
+        index = self.current_segment_index
+        if self._journal is None and self._decisions is None:
+            return
+        title, content, _ = self.segment(index)
+        digest = segment_hash(title, content)
+        if self._decisions is not None:
+            self._decisions[digest] = list(split_points)
+        if self._journal is None or index in self._resumed:
+            return  # No journal, or the decision is already in it
+        verdict = response_text = None
+        if analysis is not None and not manual:
+            verdict, response_text = analysis[3], analysis[2]
+        self._journal.record(index, digest, split_points, verdict, response_text, manual)
+
+    def _write_processed(self, segment_text, metadata):
+        """Stream a processed segment to the output file."""
+        with self.metrics.timer("write"):
+            self._writer.write_segment(segment_text, metadata)
+        self.processed_count += 1
+
+    def save(self):
+        """Finish the output file and return its path.
+
+        The output is fsynced and atomically renamed from its ``.partial``
+        name, so the final path never holds a half-written file.
+        """
+        writer, self._writer = self._writer, None
+        journal, self._journal = self._journal, None
+        self.close()
+
+        try:
+            self.output_file_path = writer.commit()
+        except BaseException:
+            if journal is not None:
+                journal.close()
+            raise
+        if journal is not None:
+            # The output is complete, so the decisions are no longer needed
+            journal.remove()
+        if self._decisions is not None:
+            self._save_manifest()
+
+        self._reconcile_counters()
+        self._log_summary(writer.title_count)
+        if self.report:
+            self._write_report(writer.title_count)
+        return self.output_file_path
+
+    def _save_manifest(self):
+        path = manifest_path(self.input_file_path)
+        try:
+            write_manifest(path, self.decision_model, self._prompt_version(),
+                           self.output_file_path, self._decisions)
+        except OSError as e:
+            self.log(f"Could not write the manifest {path}: {e}", "warning")
+
+    def _write_report(self, title_count):
+        path = report_path(self.output_file_path)
+        try:
+            write_report(path, self.run_report(title_count))
+        except OSError as e:
+            self.log(f"Could not write the run report {path}: {e}", "warning")
+            return
+        self.log(f"Run report: {path}", "info")
+
+    def run_report(self, title_count=None):
+        """Return the settings, counters, stage timings and token counts of the run."""
+        report = {
+            "input": self.input_file_path,
+            "output": self.output_file_path,
+            "model": self.decision_model,
+            "started": self._started_at.isoformat(timespec="seconds") if self._started_at else None,
+            "run_seconds": time.monotonic() - self._started if self._started_at else 0.0,
+            "settings": {
+                "workers": self.workers,
+                "batch_tokens": self.batch_tokens,
+                "prompt_tokens": self.prompt_tokens,
+                "answer_tokens": self.answer_tokens,
+                "prefilter": self.prefilter,
+                "structured": self.structured,
+                "incremental": self.incremental,
+                "resume": self.resume,
+                "cache": self.cache is not None,
+                "ollama_hosts": self.ollama_hosts,
+                "thinking": {model: self.thinking_policy(model)
+                             for model in (self.model, self.escalation_model) if model},
+                "think_budget": self.think_budget,
+                "embed_model": self.embed_model,
+                "split_threshold": self.split_threshold,
+                "confirm_splits": self.confirm_splits,
+            },
+            "counts": {
+                "segments": self.segment_count,
+                "output_segments": self.processed_count,
+                "titles": title_count,
+                "model_calls_skipped": self.model_calls_skipped,
+                "reused": self.reused_count,
+                "resumed": self.resumed_count,
+                "batch_requests": self.batch_requests,
+                "batched_segments": self.batched_segments,
+                "batch_fallbacks": self.batch_fallbacks,
+                "screened": self.screened_count,
+                "escalated": self.escalated_count,
+                "thinking_cutoffs": self.thinking_cutoffs,
+                "embedded": self.embedded_count,
+                "embedding_proposals": self.embedding_proposals,
+                "embedding_confirmations": self.embedding_confirmations,
+            },
+            **self.metrics.as_dict(),
+            "backends": [stats for client in list(self._clients.values()) for stats in client.stats_dicts()],
+        }
+        if self.cache is not None:
+            report["cache"] = {"hits": self.cache.hits, "misses": self.cache.misses}
+        return report
+
+    def _log_cascade_summary(self):
+        rate = self.escalated_count / self.screened_count * 100
+        self.log(
+            f"Cascade: {self.escalated_count} of {self.screened_count} screened segments ({rate:.1f}%) "
+            f"escalated from {self.model} to {self.escalation_model}; model time "
+            f"{self.screen_seconds:.1f} s screening + {self.escalation_seconds:.1f} s escalated",
+            "info"
+        )
+        if self.escalated_count:
+            # What running every screened segment on the big model would have cost
+            alone = self.escalation_seconds / self.escalated_count * self.screened_count
+            saved = alone - self.screen_seconds - self.escalation_seconds
+            self.log(f"Estimated time saved against {self.escalation_model} alone: {saved:.1f} s "
+                     f"(about {alone:.1f} s for all screened segments)", "info")
+
+    def _reconcile_counters(self):
+        # Make sure our counts are accurate
+        self.current_topic_count = self.processed_count
+
+        # Verify the kept separate count
+        expected_different_count = self.processed_count - 1
+
+        # If there's a mismatch, fix the different count
+        if self.different_topics_count != expected_different_count:
+            self.log(f"Adjusting different topics count from {self.different_topics_count} to {expected_different_count} to match processed segments", "warning")
+            self.different_topics_count = expected_different_count
+
+    def _log_summary(self, title_count):
+        # Calculate topics reduction
+        topics_reduction = self.baseline_topic_count - self.current_topic_count
+        reduction_percentage = (topics_reduction / self.baseline_topic_count * 100) if self.baseline_topic_count > 0 else 0
+
+        self.log(
+            f"Processing complete! Condensed {self.segment_count} segments into {self.processed_count} groups with {title_count} titles",
+            "success"
+        )
+        self.log(f"Saved to: {self.output_file_path}", "info")
+
+        # Add detailed summary
+        if self.same_topics_count > 0:
+            self.log(
+                f"Final topic count: {self.current_topic_count} (reduced from {self.baseline_topic_count} by {topics_reduction} segments, {reduction_percentage:.1f}%)",
+                "highlight"
+            )
+        else:
+            self.log(
+                f"Final topic count: {self.current_topic_count} (no reduction from original {self.baseline_topic_count} segments)",
+                "highlight"
+            )
+
+        self.log(
+            f"Segments kept separate: {self.different_topics_count}, Segments merged: {self.same_topics_count}",
+            "highlight"
+        )
+
+        # Add a clear explanation of what happened
+        first_segment_text = "1 first segment + "
+        if self.same_topics_count == 0 and self.different_topics_count == self.baseline_topic_count - 1:
+            self.log(
+                f"Summary: All segments were kept separate. No merging occurred.",
+                "highlight"
+            )
+        else:
+            self.log(
+                f"Summary: {first_segment_text}{self.different_topics_count} separate segments + {self.same_topics_count} merged segments = {self.baseline_topic_count} total original segments",
+                "highlight"
+            )
+
+        if self.prefilter:
+            self.log(f"Model calls skipped by the single-story rule: {self.model_calls_skipped} of {self.segment_count} segments", "info")
+        if self.incremental:
+            self.log(
+                f"Decisions reused from the last run: {self.reused_count} of {self.segment_count} segments",
+                "info"
+            )
+        if self.escalation_model and self.screened_count:
+            self._log_cascade_summary()
+        if self.embed_model:
+            self.log(
+                f"Embedding splits: {self.embedding_proposals} of {self.embedded_count} embedded segments "
+                f"proposed for splitting, {self.embedding_confirmations} sent to {self.model} to confirm",
+                "info"
+            )
+        if self.thinking_cutoffs:
+            self.log(f"Answers cut off while thinking past the budget: {self.thinking_cutoffs}", "info")
+        if self.resumed_count:
+            self.log(f"Decisions replayed from the journal: {self.resumed_count} of {self.segment_count} segments", "info")
+        if self.batch_tokens:
+            self.log(
+                f"Packed requests: {self.batch_requests} answering {self.batched_segments} segments, "
+                f"{self.batch_fallbacks} segments retried on their own",
+                "info"
+            )
+        for client in self._clients.values():
+            for line in client.summary_lines():
+                self.log(line, "info")
+        for line in self.metrics.summary_lines():
+            self.log(line, "info")
+        if self.cache is not None:
+            self.log(self.cache.stats_text(), "info")
@@ -1,27 +1,91 @@
 import re
 
-# Patterns to detect metadata lines
-_METADATA_PREFIXES = ["--", "http", "Timestamp:", "Map view:", "Source:", "@"]
+from line_kinds import METADATA_KINDS, TIMESTAMP, classify_lines, is_metadata
+
+# Sentence boundaries used when splitting story text
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+")
+
+# Thresholds for is_single_story.  Story text up to the length of a tweet,
+# posted once (one timestamp) and mostly surrounded by metadata, is one post.
+SINGLE_STORY_MAX_CHARS = 280
+SINGLE_STORY_MIN_METADATA_RATIO = 0.5
 
 
 def _is_metadata(line: str) -> bool:
-    line = line.strip()
-    if not line:
-        return False
-    if any(line.startswith(prefix) for prefix in _METADATA_PREFIXES):
-        return True
-    # match two letter comment tags like cc- jj- mm-
-    if re.match(r"^[A-Za-z]{2}-", line):
-        return True
-    return False
+    return is_metadata(line)
 
 
 def extract_metadata_lines(text: str):
     """Return a list of metadata lines found in ``text``."""
-    return [ln for ln in text.splitlines() if _is_metadata(ln)]
+    return [ln for ln in text.splitlines() if is_metadata(ln)]
+
+
+def separate_metadata(content: str, lines=None):
+    """Return ``(content_lines, metadata_lines)`` for the lines of ``content``.
+
+    ``lines`` is the ``line_kinds.classify_content`` result for ``content``
+    when the caller already has it.
+    """
+    if lines is None:
+        lines = classify_lines(content)
+    metadata_lines = []
+    content_lines = []
+    for ln, kind in lines:
+        if kind in METADATA_KINDS:
+            metadata_lines.append(ln)
+        else:
+            content_lines.append(ln)
+    return content_lines, metadata_lines
+
+
+def split_sentences(content_str: str):
+    """Split story text into sentences the way ``split_segment`` does."""
+    return _SENTENCE_BOUNDARY.split(content_str)
+
 
+def story_sentences(content: str, lines=None):
+    """Return ``(number, sentence)`` for the story sentences of ``content``.
 
-def split_segment(title: str, content: str, original_text: str, split_points):
+    Tag lines are left out.  Numbers start at 1 and count sentences the way
+    ``split_segment`` does; empty sentences keep their number but are not
+    returned.  Whitespace inside a sentence is collapsed.
+    """
+    content_lines, _ = separate_metadata(content, lines)
+    numbered = []
+    for number, sentence in enumerate(split_sentences("\n".join(content_lines)), 1):
+        sentence = " ".join(sentence.split())
+        if sentence:
+            numbered.append((number, sentence))
+    return numbered
+
+
+def is_single_story(content: str, lines=None) -> bool:
+    """Return True if ``content`` obviously holds a single story.
+
+    Used to skip the model for segments it could not split anyway.  A segment
+    is single-story when its non-metadata text has at most one sentence, or
+    when that text is no longer than ``SINGLE_STORY_MAX_CHARS``, carries at
+    most one ``Timestamp:`` line and at least ``SINGLE_STORY_MIN_METADATA_RATIO``
+    of its non-blank lines are metadata.
+    """
+    if lines is None:
+        lines = classify_lines(content)
+    content_lines, metadata_lines = separate_metadata(content, lines)
+    sentences = [s for s in split_sentences("\n".join(content_lines)) if s.strip()]
+    if len(sentences) <= 1:
+        return True
+
+    story_chars = sum(len(s.strip()) for s in sentences)
+    if story_chars > SINGLE_STORY_MAX_CHARS:
+        return False
+    timestamps = sum(1 for _, kind in lines if kind == TIMESTAMP)
+    if timestamps > 1:
+        return False
+    non_blank = sum(1 for ln in content_lines if ln.strip()) + len(metadata_lines)
+    return len(metadata_lines) / non_blank >= SINGLE_STORY_MIN_METADATA_RATIO
+
+
+def split_segment(title: str, content: str, original_text: str, split_points, lines=None):
     """Split ``content`` using ``split_points`` and duplicate metadata lines.
 
     Parameters
@@ -35,28 +99,22 @@ def split_segment(title: str, content: str, original_text: str, split_points):
     split_points : Iterable[int]
         1-indexed positions indicating after which sentence the content should
         be split. The function converts them to zero-based indexes internally.
+    lines : list, optional
+        ``line_kinds.classify_content`` result for ``content``.
 
     Returns
     -------
     list[str]
         A list of new segments including metadata lines.
     """
-    lines = content.splitlines()
-
     # Separate metadata lines from content lines
-    metadata_lines = []
-    content_lines = []
-    for ln in lines:
-        if _is_metadata(ln):
-            metadata_lines.append(ln)
-        else:
-            content_lines.append(ln)
+    content_lines, metadata_lines = separate_metadata(content, lines)
 
     # Combine non-metadata lines back into a single string
     content_str = "\n".join(content_lines)
 
     # Split into sentences for more precise splits
-    sentences = re.split(r"(?<=[.!?])\s+", content_str)
+    sentences = split_sentences(content_str)
 
     # Treat provided split points as 1-indexed positions.  Convert them to
     # zero-based indexes while ensuring they stay within valid bounds.
@@ -0,0 +1,66 @@
+import unittest
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import corpus
+import run_benchmarks
+import segment_parser
+
+
+class BenchmarkSuiteTests(unittest.TestCase):
+    def test_corpus_is_deterministic(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            texts = []
+            for name in ('a.vhd', 'b.vhd'):
+                path = os.path.join(tmp, name)
+                corpus.generate_corpus(path, 40, seed=3)
+                with open(path, encoding='utf-8') as f:
+                    texts.append(f.read())
+            self.assertEqual(segment_parser.count_segments(path), 40)
+        self.assertEqual(texts[0], texts[1])
+
+    def test_report_and_baseline_comparison(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            report_path = os.path.join(tmp, 'report.json')
+            argv = ['--sizes', '30', '--batch-tokens', '500', '-j', '2', '--json', report_path, '--no-baseline']
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.assertEqual(run_benchmarks.main(argv), 0)
+            with open(report_path, encoding='utf-8') as f:
+                report = json.load(f)
+            result = report['results']['30']
+            self.assertEqual(result['segments'], 30)
+            self.assertGreater(result['segments_per_sec'], 0)
+            self.assertEqual(set(result['stages']), {'analysis', 'commit', 'save'})
+
+            # A baseline ten times faster flags a regression
+            baseline = json.loads(json.dumps(report))
+            baseline['results']['30']['segments_per_sec'] *= 10
+            self.assertEqual(len(run_benchmarks.compare(report, baseline, 0.2)), 1)
+            self.assertEqual(run_benchmarks.compare(report, report, 0.2), [])
+
+            # A written baseline is what the next run compares against
+            baseline_path = os.path.join(tmp, 'baseline.json')
+            argv = ['--sizes', '30', '--no-memory', '--baseline', baseline_path]
+            with contextlib.redirect_stdout(io.StringIO()) as out:
+                self.assertEqual(run_benchmarks.main(argv + ['--write-baseline']), 0)
+                self.assertEqual(run_benchmarks.main(argv + ['--tolerance', '100']), 0)
+            with open(baseline_path, encoding='utf-8') as f:
+                self.assertIn('30', json.load(f)['results'])
+            self.assertIn(f'against {baseline_path}', out.getvalue())
+
+    def test_committed_baseline_has_the_default_sizes(self):
+        with open(run_benchmarks.DEFAULT_BASELINE, encoding='utf-8') as f:
+            baseline = json.load(f)
+        self.assertEqual(sorted(baseline['results'], key=int),
+                         [str(size) for size in run_benchmarks.DEFAULT_SIZES])
+
+
+if __name__ == '__main__':
+    unittest.main()
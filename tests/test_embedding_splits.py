@@ -0,0 +1,26 @@
+import unittest
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import embedding_splits
+
+
+class EmbeddingSplitTests(unittest.TestCase):
+    def test_adjacent_similarities(self):
+        similarities = embedding_splits.adjacent_similarities([[1, 0], [2, 0], [0, 3], [0, 0]])
+        self.assertEqual([round(s, 6) for s in similarities], [1.0, 0.0, 0.0])
+        self.assertEqual(embedding_splits.adjacent_similarities([[1, 0]]), [])
+
+    def test_split_points_below_threshold(self):
+        numbers = [1, 2, 4, 5]
+        similarities = [0.9, 0.3, 0.6]
+        self.assertEqual(embedding_splits.propose_split_points(numbers, similarities, 0.5), [2])
+        self.assertEqual(embedding_splits.propose_split_points(numbers, similarities, 0.7), [2, 4])
+        self.assertEqual(embedding_splits.similarity_text(numbers, similarities),
+                         '(embedding similarity 1-2: 0.90, 2-4: 0.30, 4-5: 0.60)')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import unittest
+import json
+import os
+import sys
+import tempfile
+import threading
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(__file__))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import llm_clients
+import sort_engine
+from fake_backend import FakeBackend, segment_key
+from fake_server import FakeModelServer
+
+SAMPLE = os.path.join(ROOT, 'sample.txt')
+SCRIPT = {'"Title:Moscow"': [2], '"Title:TechNews"': 'no idea'}
+
+
+class FakeServerTests(unittest.TestCase):
+    def stats(self, server):
+        with urllib.request.urlopen(server.url + '/stats') as response:
+            return json.load(response)
+
+    def run_engine(self, **kwargs):
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = sort_engine.SortEngine(prefilter=False, **kwargs)
+            output = engine.run(SAMPLE, os.path.join(tmp, 'out.txt'))
+            with open(output, encoding='utf-8') as f:
+                return engine, f.read()
+
+    def test_engine_runs_against_ollama_and_openai_protocols(self):
+        with FakeModelServer(backend=FakeBackend(yes_rate=0, script=SCRIPT)) as server:
+            for structured in (True, False):
+                _, text = self.run_engine(ollama_hosts=[server.url], workers=2, structured=structured)
+                self.assertEqual(text.count('ID0001'), 2)
+            _, text = self.run_engine(model=sort_engine.OPENAI_MODEL, api_key='test',
+                                      openai_base_url=server.openai_base_url)
+            self.assertEqual(text.count('ID0001'), 2)
+            stats = self.stats(server)
+        self.assertGreater(stats['ollama'], 0)
+        self.assertGreater(stats['openai'], 0)
+        self.assertEqual(stats['requests'], stats['streamed'])
+
+    def test_script_picks_segments_sharing_a_title(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            source = os.path.join(tmp, 'same_titles.txt')
+            with open(source, 'w', encoding='utf-8') as f:
+                f.write('"Title:same"\nOne thing. Another thing.\n\n'
+                        '"Title:same"\nA third thing. A fourth thing.\n\n'
+                        '"Title:same"\nA fifth thing. A sixth thing.\n')
+            script = {'"Title:same"': [], '#2': [1],
+                      segment_key('"Title:same"', 'A fifth thing. A sixth thing.'): 'garbled'}
+            backend = FakeBackend(yes_rate=0, script=script, input_path=source)
+            with FakeModelServer(backend=backend) as server:
+                for batch_tokens in (0, 4000):
+                    engine = sort_engine.SortEngine(prefilter=False, ollama_hosts=[server.url],
+                                                    batch_tokens=batch_tokens, workers=2)
+                    output = engine.run(source, os.path.join(tmp, 'out.txt'))
+                    with open(output, encoding='utf-8') as f:
+                        text = f.read()
+                    self.assertEqual(text.count('ID0001'), 2)
+                    self.assertIn('ID0001\nA third thing.', text)
+        self.assertEqual(backend.scripted('"Title:same"\n[1] A fifth thing.\n[2] A sixth thing.'), 'garbled')
+
+    def test_run_report_counts_stages_and_tokens(self):
+        with FakeModelServer(backend=FakeBackend(yes_rate=0, script=SCRIPT)) as server:
+            with tempfile.TemporaryDirectory() as tmp:
+                # Packed answers are not streamed, so they end with token counts
+                output = sort_engine.SortEngine(prefilter=False, ollama_hosts=[server.url], workers=2,
+                                                batch_tokens=4000).run(SAMPLE, os.path.join(tmp, 'out.txt'))
+                with open(output + '.report.json', encoding='utf-8') as f:
+                    report = json.load(f)
+            usage = []
+            client = llm_clients.OpenAIClient('test', server.openai_base_url + '/chat/completions',
+                                              on_usage=lambda *counts: usage.append(counts))
+            client.chat('m', 'CONTAINS?')
+            client.chat('m', 'CONTAINS?', stop_when=lambda text: False)
+            client.close()
+        self.assertEqual(report['counts']['segments'], 4)
+        for stage in ('parse', 'prompt', 'queue', 'generation', 'response_parse', 'wait', 'split', 'write'):
+            self.assertGreater(report['stages'][stage]['count'], 0, stage)
+        self.assertGreater(report['tokens']['prompt'], 0)
+        self.assertEqual(report['backends'][0]['prompt_tokens'], report['tokens']['prompt'])
+        self.assertEqual(len(usage), 2)
+        self.assertEqual(client.stats.prompt_tokens, 2 * usage[0][0])
+
+    def test_models_are_preloaded_on_every_host(self):
+        with FakeModelServer() as first, FakeModelServer() as second:
+            engine = sort_engine.SortEngine(ollama_hosts=[first.url, second.url],
+                                            escalation_model='qwen3:14b')
+            self.assertTrue(engine.preload_models())
+            engine.close_clients()
+            self.assertEqual(self.stats(first)['preloads'], 2)
+            self.assertEqual(self.stats(second)['preloads'], 2)
+
+    def test_embeddings_come_in_one_request_per_segment(self):
+        with FakeModelServer() as server:
+            engine, text = self.run_engine(ollama_hosts=[server.url], embed_model='embedder',
+                                           split_threshold=0.2)
+            stats = self.stats(server)
+        self.assertEqual(stats['embeds'], engine.segment_count)
+        self.assertEqual(stats['requests'], 0)
+        self.assertTrue(text.startswith('embedder < 0.2\n'))
+
+    def test_rate_limits_are_retried_after_the_requested_delay(self):
+        with FakeModelServer(rate_limit_rate=1.0, retry_after=3) as server:
+            sleeps = []
+            client = llm_clients.OpenAIClient('test', server.openai_base_url + '/chat/completions',
+                                              max_retries=2, sleep=sleeps.append)
+            with self.assertRaises(llm_clients.TransientBackendError):
+                client.chat('m', 'p')
+            client.close()
+            self.assertEqual(sleeps, [3.0, 3.0])
+            self.assertEqual(self.stats(server)['rate_limited'], 3)
+
+    def test_concurrency_limit_queues_requests(self):
+        with FakeModelServer(latency=0.05, max_concurrent=2) as server:
+            client = llm_clients.OllamaClient(server.url, pool_size=4)
+            threads = [threading.Thread(target=client.chat, args=('m', 'CONTAINS?'))
+                       for _ in range(6)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertTrue(client.healthy())
+            client.close()
+            stats = self.stats(server)
+        self.assertEqual(stats['requests'], 6)
+        self.assertEqual(stats['peak_concurrent'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import line_kinds
+
+
+class LineKindTests(unittest.TestCase):
+    def test_classify_line(self):
+        cases = {
+            '"Title:News"': line_kinds.TITLE,
+            'The mayor spoke.': line_kinds.CONTENT,
+            '   ': line_kinds.BLANK,
+            '--photo.jpg': line_kinds.MEDIA,
+            'https://example.com/a': line_kinds.URL,
+            'Timestamp: 4:57 AM': line_kinds.TIMESTAMP,
+            'Map view: 48.1, 37.7': line_kinds.MAP,
+            'Source: wire': line_kinds.SOURCE,
+            '@reporter': line_kinds.MENTION,
+            'cc-Nice': line_kinds.COMMENT,
+            '  JJ-indented': line_kinds.COMMENT,
+            'Re-elected today.': line_kinds.COMMENT,
+            'A-list guests.': line_kinds.CONTENT,
+        }
+        for line, kind in cases.items():
+            self.assertEqual(line_kinds.classify_line(line), kind, line)
+
+    def test_text_after_title_is_not_metadata(self):
+        original = '"Title:News" @desk\ncc-Nice\nStory.'
+        content = ' @desk\ncc-Nice\nStory.'
+        lines = line_kinds.classify_content(content, original)
+        self.assertEqual([kind for _, kind in lines],
+                         [line_kinds.TITLE, line_kinds.COMMENT, line_kinds.CONTENT])
+        self.assertEqual(line_kinds.metadata_lines(lines), ['cc-Nice'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import llm_cache
+
+
+class ResponseCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'cache.sqlite3')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_hit_and_miss_counters(self):
+        cache = llm_cache.ResponseCache(self.path)
+        key = cache.make_key('qwen3:0.6b', 1, '"Title:a"', 'Some text.')
+        self.assertIsNone(cache.get(key))
+        cache.put(key, 'qwen3:0.6b', 'CONTAINS_MULTIPLE_STORIES: NO')
+        cache.close()
+
+        # Entries survive reopening
+        cache = llm_cache.ResponseCache(self.path)
+        self.assertEqual(cache.get(key), 'CONTAINS_MULTIPLE_STORIES: NO')
+        self.assertEqual((cache.hits, cache.misses), (1, 0))
+        # Model and prompt version are part of the key
+        self.assertNotEqual(key, cache.make_key('qwen3:8b', 1, '"Title:a"', 'Some text.'))
+        self.assertNotEqual(key, cache.make_key('qwen3:0.6b', 2, '"Title:a"', 'Some text.'))
+        # A new run counts from zero
+        cache.reset_counts()
+        self.assertEqual((cache.hits, cache.misses), (0, 0))
+        cache.close()
+
+    def test_eviction(self):
+        cache = llm_cache.ResponseCache(self.path, max_entries=2)
+        for i in range(3):
+            cache.put(f'k{i}', 'm', 'r')
+            time.sleep(0.01)
+        cache.get('k0')  # k0 becomes the most recently used
+        self.assertEqual(cache.evict(), 1)
+        self.assertIsNone(cache.get('k1'))
+        self.assertEqual(len(cache), 2)
+        cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,210 @@
+import unittest
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import llm_clients
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class FakeHTTPError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.response = FakeResponse(status_code, headers)
+
+
+class RetryTests(unittest.TestCase):
+    def make_client(self, **kwargs):
+        self.sleeps = []
+        return llm_clients.RetryingClient(sleep=self.sleeps.append, **kwargs)
+
+    def test_retries_transient_errors_then_succeeds(self):
+        client = self.make_client()
+        errors = [FakeHTTPError(503), ConnectionError("reset"),
+                  FakeHTTPError(429, {"Retry-After": "7"})]
+
+        def send():
+            if errors:
+                raise errors.pop(0)
+            return "ok"
+
+        self.assertEqual(client._call(send), "ok")
+        self.assertEqual(len(self.sleeps), 3)
+        # Exponential backoff with jitter, then the server's Retry-After
+        self.assertTrue(0.5 <= self.sleeps[0] <= 1.0)
+        self.assertTrue(1.0 <= self.sleeps[1] <= 2.0)
+        self.assertEqual(self.sleeps[2], 7.0)
+        self.assertEqual((client.stats.requests, client.stats.retries, client.stats.failures), (1, 3, 0))
+
+    def test_non_retryable_error_is_raised_at_once(self):
+        client = self.make_client()
+
+        def send():
+            raise FakeHTTPError(400)
+
+        with self.assertRaises(FakeHTTPError):
+            client._call(send)
+        self.assertEqual(self.sleeps, [])
+
+    def test_exhausted_retries_raise_transient_error(self):
+        client = self.make_client(max_retries=2)
+
+        def send():
+            raise TimeoutError("slow")
+
+        with self.assertRaises(llm_clients.TransientBackendError):
+            client._call(send)
+        self.assertEqual((client.stats.retries, client.stats.failures), (2, 1))
+
+    def test_parse_retry_after(self):
+        self.assertEqual(llm_clients.parse_retry_after("3"), 3.0)
+        self.assertEqual(llm_clients.parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT"), 0.0)
+        self.assertIsNone(llm_clients.parse_retry_after("soon"))
+        self.assertIsNone(llm_clients.parse_retry_after(None))
+
+
+class StreamTests(unittest.TestCase):
+    def test_ollama_stream_stops_early(self):
+        chunks = ['CONTAINS_MULTIPLE', '_STORIES: NO', '\nREASONING:', ' one story', ' and more']
+        received = []
+
+        class FakeOllama:
+            def chat(self, **kwargs):
+                self.kwargs = kwargs
+                for chunk in chunks:
+                    received.append(chunk)
+                    yield {'message': {'content': chunk}}
+
+        client = llm_clients.OllamaClient.__new__(llm_clients.OllamaClient)
+        llm_clients.RetryingClient.__init__(client)
+        client._client = fake = FakeOllama()
+        text = client.chat('m', 'p', max_tokens=64, stop_when=lambda t: t.endswith('NO'))
+        self.assertEqual(text, 'CONTAINS_MULTIPLE_STORIES: NO')
+        self.assertEqual(len(received), 2)
+        self.assertEqual(fake.kwargs['options'], {'num_predict': 64})
+        self.assertEqual(client.stats.early_stops, 1)
+
+    def test_ollama_stream_wraps_thinking_in_tags(self):
+        chunks = [{'thinking': 'Two', 'content': ''}, {'thinking': ' topics.', 'content': ''},
+                  {'content': 'CONTAINS_MULTIPLE_STORIES: NO'}]
+
+        class FakeOllama:
+            def chat(self, **kwargs):
+                self.kwargs = kwargs
+                return iter({'message': chunk} for chunk in chunks)
+
+        client = llm_clients.OllamaClient.__new__(llm_clients.OllamaClient)
+        llm_clients.RetryingClient.__init__(client)
+        client._client = fake = FakeOllama()
+        text = client.chat('m', 'p', stop_when=lambda t: False, think=True)
+        self.assertEqual(text, '<think>Two topics.</think>CONTAINS_MULTIPLE_STORIES: NO')
+        self.assertIs(fake.kwargs['think'], True)
+
+    def test_openai_stream_reads_server_sent_events(self):
+        events = ['data: {"choices": [{"delta": {"content": "CONTAINS_MULTIPLE_STORIES:"}}]}', '',
+                  'data: {"choices": [{"delta": {"content": " YES"}}]}',
+                  'data: [DONE]']
+
+        class FakeResponse:
+            closed = False
+
+            def raise_for_status(self):
+                pass
+
+            def iter_lines(self, decode_unicode=False):
+                return iter(events)
+
+            def close(self):
+                self.closed = True
+
+        class FakeSession:
+            def post(self, url, json=None, timeout=None, stream=False):
+                self.payload = json
+                self.response = FakeResponse()
+                return self.response
+
+        client = llm_clients.OpenAIClient.__new__(llm_clients.OpenAIClient)
+        llm_clients.RetryingClient.__init__(client)
+        client.url = 'http://localhost/v1'
+        client._session = session = FakeSession()
+        text = client.chat('m', 'p', max_tokens=32, stop_when=lambda t: False)
+        self.assertEqual(text, 'CONTAINS_MULTIPLE_STORIES: YES')
+        self.assertTrue(session.payload['stream'])
+        self.assertEqual(session.payload['max_tokens'], 32)
+        self.assertTrue(session.response.closed)
+
+
+class FakeHostClient:
+    """Stand-in for the ``OllamaClient`` of one host."""
+    def __init__(self, url):
+        self.url = url
+        self.stats = llm_clients.ClientStats(url)
+        self.down = False
+        self.is_healthy = True
+
+    def chat(self, model, prompt, max_tokens=None, stop_when=None, schema=None, system=None,
+             think=None):
+        if self.down:
+            raise ConnectionError("refused")
+        self.stats.record_success(0.0)
+        return self.url
+
+    def healthy(self):
+        return self.is_healthy
+
+    def close(self):
+        pass
+
+
+class HostPoolTests(unittest.TestCase):
+    def make_pool(self, count=3):
+        self.now = 0.0
+        self.messages = []
+        return llm_clients.OllamaHostPool(
+            [f'http://localhost:{11434 + i}' for i in range(count)],
+            make_client=FakeHostClient, clock=lambda: self.now,
+            on_retry=self.messages.append, sleep=lambda delay: None,
+        )
+
+    def test_least_outstanding_host_is_chosen(self):
+        pool = self.make_pool()
+        first, second, third = pool._acquire(), pool._acquire(), pool._acquire()
+        self.assertEqual(len({first.url, second.url, third.url}), 3)
+        pool._release(second)
+        self.assertIs(pool._acquire(), second)
+        # Idle hosts take turns
+        for host in (first, second, third):
+            pool._release(host)
+        urls = [pool.chat('m', 'p') for _ in range(6)]
+        self.assertEqual(sorted(urls.count(url) for url in set(urls)), [2, 2, 2])
+
+    def test_failing_host_is_ejected_until_healthy(self):
+        pool = self.make_pool(2)
+        down = pool._hosts[0].client
+        down.down = True
+        down.is_healthy = False
+        # The request moves on to the other host
+        self.assertEqual({pool.chat('m', 'p') for _ in range(4)}, {'http://localhost:11435'})
+        self.assertEqual(pool.stats.retries, 1)
+        self.assertIn('down', pool.status_text())
+
+        # A failed health check doubles the time out
+        self.now = llm_clients.EJECT_SECONDS
+        pool.chat('m', 'p')
+        self.assertEqual(pool._hosts[0].ejected_until, self.now + 2 * llm_clients.EJECT_SECONDS)
+
+        down.down = False
+        down.is_healthy = True
+        self.now += 2 * llm_clients.EJECT_SECONDS
+        self.assertIn('http://localhost:11434', {pool.chat('m', 'p') for _ in range(2)})
+        self.assertEqual(len(pool.summary_lines()), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import output_writer
+
+
+class SegmentWriterTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'out', 'joined_sorted.vhd')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_commit_renames_complete_file(self):
+        writer = output_writer.SegmentWriter(self.path, 'model\n')
+        writer.write_segment('\n"Title:a"\nText.', ['cc-comment'])
+        writer.write_segment('   ')  # empty segments are skipped
+        self.assertFalse(os.path.exists(self.path))
+        self.assertEqual(writer.commit(), self.path)
+        self.assertFalse(os.path.exists(writer.temp_path))
+        with open(self.path, encoding='utf-8') as f:
+            self.assertEqual(f.read(), 'model\n"Title:a"\nText.\ncc-comment' + '\n' * 6)
+        self.assertEqual((writer.segments_written, writer.title_count), (1, 1))
+
+    def test_abort_keeps_partial_output(self):
+        writer = output_writer.SegmentWriter(self.path, 'model\n')
+        writer.write_segment('"Title:a"\nText.')
+        writer.abort()
+        self.assertFalse(os.path.exists(self.path))
+        with open(writer.temp_path, encoding='utf-8') as f:
+            self.assertIn('"Title:a"', f.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import run_journal
+
+
+class RunJournalTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = run_journal.journal_path(os.path.join(self.tmp.name, 'joined.vhd'))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_records_read_back_for_the_same_model(self):
+        journal = run_journal.JournalWriter(self.path, 'qwen3:0.6b', 3)
+        journal.record(0, 'h0', [], False, 'CONTAINS_MULTIPLE_STORIES: NO')
+        journal.record(1, 'h1', [2, 4], True, 'YES')
+        journal.close()
+        # A line torn by a crash is ignored
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write('{"index": 2, "ha')
+
+        records = run_journal.read_journal(self.path, 'qwen3:0.6b', 3)
+        self.assertEqual(sorted(records), [0, 1])
+        self.assertEqual(records[1]['split_after'], [2, 4])
+        self.assertEqual(records[0]['response_hash'],
+                         run_journal.response_hash('CONTAINS_MULTIPLE_STORIES: NO'))
+        self.assertEqual(run_journal.decided_segments(self.path, 'qwen3:0.6b'), 2)
+        # Another model or a different file is not resumed
+        self.assertEqual(run_journal.read_journal(self.path, 'gpt-4o', 3), {})
+        self.assertEqual(run_journal.read_journal(self.path, 'qwen3:0.6b', 4), {})
+
+    def test_append_continues_and_remove_deletes(self):
+        run_journal.JournalWriter(self.path, 'm', 2).close()
+        journal = run_journal.JournalWriter(self.path, 'm', 2, append=True)
+        journal.record(0, 'h0', [], manual=True)
+        self.assertTrue(run_journal.read_journal(self.path, 'm')[0]['manual'])
+        journal.remove()
+        self.assertFalse(os.path.exists(self.path))
+        self.assertEqual(run_journal.decided_segments(self.path, 'm'), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,24 @@
+import unittest
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import run_manifest
+
+
+class RunManifestTests(unittest.TestCase):
+    def test_decisions_only_carry_over_for_the_same_model_and_prompt(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = run_manifest.manifest_path(os.path.join(tmp, 'joined.vhd'))
+            self.assertEqual(run_manifest.read_manifest(path, 'm', 3), {})
+            run_manifest.write_manifest(path, 'm', '3-json', 'out.vhd', {'h0': [], 'h1': [2]})
+            self.assertEqual(run_manifest.read_manifest(path, 'm', '3-json'), {'h0': [], 'h1': [2]})
+            self.assertEqual(run_manifest.read_manifest(path, 'other', '3-json'), {})
+            self.assertEqual(run_manifest.read_manifest(path, 'm', '3'), {})
+            self.assertFalse(os.path.exists(path + '.tmp'))
+
+
+if __name__ == '__main__':
+    unittest.main()
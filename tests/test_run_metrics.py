@@ -0,0 +1,50 @@
+import unittest
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import run_metrics
+
+
+class RunMetricsTests(unittest.TestCase):
+    def test_histogram_percentiles_come_from_the_buckets(self):
+        histogram = run_metrics.Histogram(bounds=(1, 2, 5, 10))
+        for value in (0.5, 1.5, 1.8, 4, 20):
+            histogram.add(value)
+        self.assertEqual(histogram.count, 5)
+        self.assertEqual(histogram.percentile(0.5), 2)
+        self.assertEqual(histogram.percentile(0.1), 1)
+        # Overflow values report the largest value seen
+        self.assertEqual(histogram.percentile(1.0), 20)
+        self.assertEqual(histogram.as_dict()['buckets'], [[1, 1], [2, 2], [5, 1], [None, 1]])
+
+    def test_stages_and_tokens_are_reported(self):
+        metrics = run_metrics.RunMetrics()
+        with metrics.timer('generation'):
+            pass
+        metrics.record('parse', 0.002)
+        metrics.record_tokens(100, 20, 0.5)
+        metrics.record_tokens(50, None, None)  # A stream cut off early
+        report = metrics.as_dict()
+        self.assertEqual(list(report['stages']), ['parse', 'generation'])
+        self.assertEqual(report['stages']['parse']['count'], 1)
+        self.assertEqual((report['tokens']['prompt'], report['tokens']['answer']), (150, 20))
+        self.assertEqual(report['tokens']['tokens_per_second'], 40)
+        lines = metrics.summary_lines()
+        self.assertTrue(lines[0].startswith('Stage times: parse 2.0 ms avg'))
+        self.assertEqual(lines[1], 'Tokens: 150 prompt, 20 answer, 40.0 tokens/s')
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = run_metrics.report_path(os.path.join(tmp, 'out_sorted_.vhd'))
+            run_metrics.write_report(path, report)
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        self.assertEqual(data['version'], run_metrics.REPORT_VERSION)
+        self.assertEqual(data['tokens']['answer'], 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+import io
+import os
+import random
+import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import segment_parser
+
+ROOT = os.path.dirname(os.path.dirname(__file__))
+
+# The whole-file regex the streaming parser replaced
+REFERENCE_PATTERN = re.compile(
+    r'((?:^|\n)\s*"Title:[^"]+")(.+?)(?=(?:^|\n)\s*"Title:|$)', re.DOTALL
+)
+
+
+def reference_segments(text):
+    return [
+        (m.group(1).strip(), m.group(2).lstrip("\n"), m.group(0).lstrip("\n"))
+        for m in REFERENCE_PATTERN.finditer(text)
+    ]
+
+
+class SegmentParserTests(unittest.TestCase):
+    def test_sample_files_match_reference(self):
+        for name in ('sample.txt', 'joined.vhd', 'joined_shouldbe.vhd'):
+            with open(os.path.join(ROOT, name), encoding='utf-8', errors='ignore') as f:
+                text = f.read()
+            self.assertEqual(segment_parser.parse_segments(text), reference_segments(text), name)
+
+    def test_sample_titles(self):
+        with open(os.path.join(ROOT, 'sample.txt'), encoding='utf-8') as f:
+            segments = list(segment_parser.iter_segments(f))
+        titles = [title for title, _, _ in segments]
+        self.assertEqual(titles[:2], ['"Title:Moscow"', '"Title:RHW"'])
+        # Metadata after blank lines stays with its segment
+        self.assertIn('mm-Report suggests high attendance', segments[0][1])
+
+    def test_segment_slices_one_text(self):
+        text = '\n"Title:a" rest\nStory.\ncc-x\n\n"Title:b"\nMore.'
+        segment = next(segment_parser.read_segments(io.StringIO(text)))
+        self.assertEqual(tuple(segment), segment_parser.parse_segments(text)[0])
+        self.assertEqual(segment.text[segment.content_start:], segment.content)
+        self.assertEqual([kind for _, kind in segment.lines()], ['title', 'content', 'comment'])
+        # Labels are kept compactly and give the same result the second time
+        self.assertEqual(segment.lines(), segment.lines())
+        self.assertEqual(segment.metadata_lines(), ['cc-x'])
+
+    def test_edge_cases_match_reference(self):
+        # Blank runs, empty and unclosed titles, titles without content,
+        # multi-line titles and missing trailing newlines
+        pool = ['"Title:a"', '  "Title:b" extra', '"Title:"', '"Title:multi',
+                'line" tail', 'text.', '', '   ', '\t', 'cc-x', 'x"y', '"Title:c"  ']
+        rnd = random.Random(1234)
+        for _ in range(5000):
+            text = "\n".join(rnd.choice(pool) for _ in range(rnd.randint(0, 10)))
+            text += "\n" * rnd.randint(0, 2)
+            self.assertEqual(segment_parser.parse_segments(text), reference_segments(text), repr(text))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,441 @@
+import unittest
+import os
+import subprocess
+import sys
+import tempfile
+import random
+import re
+import time
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import llm_cache
+import llm_clients
+import response_schema
+import run_journal
+import run_manifest
+import segment_parser
+import sort_engine
+import split_utils
+import thinking
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'sample.txt')
+JOINED = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'joined.vhd')
+
+
+class FakeEngine(sort_engine.SortEngine):
+    """Engine that answers from a dict of title -> split points."""
+    def __init__(self, splits=None, **kwargs):
+        super().__init__(**kwargs)
+        self.splits = splits or {}
+
+    def analyze_segment(self, title, content, lines=None):
+        if self.workers > 1:
+            # Finish out of order to exercise ordered reassembly
+            time.sleep(random.uniform(0, 0.02))
+        self.calls = getattr(self, 'calls', 0) + 1
+        points = self.splits.get(title, [])
+        multiple = bool(points)
+        return False, "fake", "fake", multiple, len(points) + 1, [], points
+
+
+class PackingEngine(FakeEngine):
+    """Engine whose backend answers packed prompts, minus ``drop`` ids."""
+    def __init__(self, drop=(), **kwargs):
+        super().__init__(**kwargs)
+        self.drop = set(drop)
+        self.prompts = []
+
+    def _chat(self, model, prompt, segments=1):
+        self.prompts.append(prompt)
+        answers = []
+        for segment_id, title in re.findall(r'=== SEGMENT (\d+) ===\n(.*)', prompt):
+            if int(segment_id) in self.drop:
+                continue
+            points = self.splits.get(title, [])
+            verdict = 'YES' if points else 'NO'
+            answers.append(f'SEGMENT: {segment_id}\nCONTAINS_MULTIPLE_STORIES: {verdict}\n'
+                           f'NUMBER_OF_STORIES: {len(points) + 1}\n'
+                           f'SPLIT_AFTER: {",".join(map(str, points))}\nREASONING: packed')
+        return '\n\n'.join(answers)
+
+
+class SortEngineTests(unittest.TestCase):
+    def test_run_writes_sorted_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, 'out.txt')
+            engine = FakeEngine(splits={'"Title:Moscow"': [2]})
+            self.assertEqual(engine.run(SAMPLE, output), output)
+            with open(output, encoding='utf-8') as f:
+                text = f.read()
+        self.assertTrue(text.startswith(sort_engine.DEFAULT_MODEL + '\n'))
+        self.assertEqual(text.count('ID0001'), 2)
+        self.assertEqual(engine.current_topic_count, engine.segment_count + 1)
+
+    def test_parallel_run_matches_sequential(self):
+        splits = {'"Title:Moscow"': [2], '"Title:TechNews"': [1]}
+        outputs = []
+        with tempfile.TemporaryDirectory() as tmp:
+            for workers in (1, 4):
+                output = os.path.join(tmp, f'out{workers}.txt')
+                FakeEngine(splits=splits, workers=workers).run(SAMPLE, output)
+                with open(output, encoding='utf-8') as f:
+                    # Drop the model and timestamp header lines
+                    outputs.append(f.read().split('\n', 2)[2])
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertIn('ID0002', outputs[1])
+
+    def test_cached_responses_skip_the_model(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = llm_cache.ResponseCache(os.path.join(tmp, 'cache.sqlite3'))
+            with open(SAMPLE, encoding='utf-8') as f:
+                segments = segment_parser.parse_segments(f.read())
+            engine = sort_engine.SortEngine(cache=cache)
+            for title, content, _ in segments:
+                key = cache.make_key(sort_engine.DEFAULT_MODEL, engine._prompt_version(), title, content)
+                cache.put(key, sort_engine.DEFAULT_MODEL, 'CONTAINS_MULTIPLE_STORIES: NO')
+            engine.run(SAMPLE, os.path.join(tmp, 'out.txt'))
+            self.assertEqual((cache.hits, cache.misses), (len(segments), 0))
+            cache.close()
+
+    def test_answers_without_a_verdict_are_not_cached(self):
+        class GarblingEngine(sort_engine.SortEngine):
+            def _chat_ollama(self, model, prompt, segments=1):
+                return 'I am not sure' if 'Moscow' in prompt else 'CONTAINS_MULTIPLE_STORIES: NO'
+
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = llm_cache.ResponseCache(os.path.join(tmp, 'cache.sqlite3'))
+            engine = GarblingEngine(cache=cache, prefilter=False, structured=False)
+            engine.run(SAMPLE, os.path.join(tmp, 'out.txt'))
+            with open(SAMPLE, encoding='utf-8') as f:
+                segments = segment_parser.parse_segments(f.read())
+            cached = [cache.get(cache.make_key(engine.model, engine._prompt_version(), title, content))
+                      for title, content, _ in segments]
+            cache.close()
+        self.assertEqual([title for (title, _, _), answer in zip(segments, cached) if answer is None],
+                         ['"Title:Moscow"'])
+
+    def test_interrupted_run_keeps_partial_output(self):
+        class FailingEngine(FakeEngine):
+            def analyze_segment(self, title, content, lines=None):
+                if title == '"Title:TechNews"':
+                    raise KeyboardInterrupt
+                return super().analyze_segment(title, content, lines)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, 'out.txt')
+            with self.assertRaises(KeyboardInterrupt):
+                FailingEngine().run(SAMPLE, output)
+            self.assertFalse(os.path.exists(output))
+            with open(output + '.partial', encoding='utf-8') as f:
+                text = f.read()
+        self.assertIn('"Title:RHW"', text)
+        self.assertNotIn('"Title:TechNews"', text)
+
+    def test_resume_replays_journaled_decisions(self):
+        class StoppingEngine(FakeEngine):
+            def analyze_segment(self, title, content, lines=None):
+                if title == '"Title:TechNews"' and getattr(self, 'stop', True):
+                    raise KeyboardInterrupt
+                return super().analyze_segment(title, content, lines)
+
+        splits = {'"Title:Moscow"': [2], '"Title:TechNews"': [1]}
+        with tempfile.TemporaryDirectory() as tmp:
+            source = os.path.join(tmp, 'sample.txt')
+            with open(SAMPLE, encoding='utf-8') as f, open(source, 'w', encoding='utf-8') as out:
+                out.write(f.read())
+            with self.assertRaises(KeyboardInterrupt):
+                StoppingEngine(splits=splits, journal=True, prefilter=False).run(source)
+            decided = run_journal.decided_segments(run_journal.journal_path(source), sort_engine.DEFAULT_MODEL)
+            self.assertGreater(decided, 0)
+
+            engine = StoppingEngine(splits=splits, journal=True, resume=True, prefilter=False)
+            engine.stop = False
+            output = engine.run(source, os.path.join(tmp, 'resumed.txt'))
+            self.assertEqual(engine.resumed_count, decided)
+            self.assertEqual(engine.calls, engine.segment_count - decided)
+            # The journal is gone once the output is saved
+            self.assertFalse(os.path.exists(run_journal.journal_path(source)))
+
+            FakeEngine(splits=splits, prefilter=False).run(source, os.path.join(tmp, 'fresh.txt'))
+            texts = []
+            for path in (output, os.path.join(tmp, 'fresh.txt')):
+                with open(path, encoding='utf-8') as f:
+                    texts.append(f.read().split('\n', 2)[2])
+        self.assertEqual(texts[0], texts[1])
+
+    def test_incremental_run_only_analyzes_new_segments(self):
+        splits = {'"Title:Moscow"': [2], '"Title:Added"': [1]}
+        added = '"Title:Added"\nFirst new story. Second new story.\n'
+        with tempfile.TemporaryDirectory() as tmp:
+            source = os.path.join(tmp, 'sample.txt')
+            with open(SAMPLE, encoding='utf-8') as f, open(source, 'w', encoding='utf-8') as out:
+                out.write(f.read())
+            first = FakeEngine(splits=splits, prefilter=False, incremental=True)
+            first.run(source, os.path.join(tmp, 'first.txt'))
+            self.assertEqual(first.reused_count, 0)
+            self.assertTrue(os.path.exists(run_manifest.manifest_path(source)))
+
+            with open(source, 'a', encoding='utf-8') as out:
+                out.write('\n' + added)
+            second = FakeEngine(splits=splits, prefilter=False, incremental=True)
+            output = second.run(source, os.path.join(tmp, 'second.txt'))
+            self.assertEqual((second.reused_count, second.calls), (first.segment_count, 1))
+
+            FakeEngine(splits=splits, prefilter=False).run(source, os.path.join(tmp, 'fresh.txt'))
+            texts = []
+            for path in (output, os.path.join(tmp, 'fresh.txt')):
+                with open(path, encoding='utf-8') as f:
+                    texts.append(f.read().split('\n', 2)[2])
+        self.assertEqual(texts[0], texts[1])
+        self.assertEqual(texts[0].count('ID0002'), 2)
+
+    def test_cascade_escalates_yes_and_unclear_answers(self):
+        class CascadeEngine(sort_engine.SortEngine):
+            answers = {
+                'small': {'"Title:Moscow"': 'CONTAINS_MULTIPLE_STORIES: YES\nNUMBER_OF_STORIES: 3\nSPLIT_AFTER: 1,2',
+                          '"Title:TechNews"': 'I am not sure'},
+                'big': {'"Title:Moscow"': 'CONTAINS_MULTIPLE_STORIES: YES\nNUMBER_OF_STORIES: 2\nSPLIT_AFTER: 2'},
+            }
+
+            def _analyze_with(self, model, title, content, lines=None):
+                self.asked = getattr(self, 'asked', []) + [(model, title)]
+                answer = self.answers[model].get(title, 'CONTAINS_MULTIPLE_STORIES: NO')
+                return self._analysis_from_response(answer)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = CascadeEngine(model='small', escalation_model='big', prefilter=False, workers=2)
+            output = engine.run(SAMPLE, os.path.join(tmp, 'out.txt'))
+            with open(output, encoding='utf-8') as f:
+                text = f.read()
+        self.assertTrue(text.startswith('small > big\n'))
+        self.assertEqual(sorted(title for model, title in engine.asked if model == 'big'),
+                         ['"Title:Moscow"', '"Title:TechNews"'])
+        self.assertEqual((engine.screened_count, engine.escalated_count), (engine.segment_count, 2))
+        # The big model's answer wins: one split into two parts
+        self.assertEqual(text.count('ID0001'), 2)
+        self.assertNotIn('ID0002', text)
+
+    def test_embedding_splits_and_confirmation(self):
+        class EmbeddingEngine(sort_engine.SortEngine):
+            def _client(self, backend):
+                return self
+
+            def embed(self, model, texts):
+                # The festival sentence is about something else
+                return [[0.0, 1.0] if 'festival' in text else [1.0, 0.0] for text in texts]
+
+            def _analyze_with(self, model, title, content, lines=None):
+                self.asked = getattr(self, 'asked', []) + [title]
+                return self._analysis_from_response('CONTAINS_MULTIPLE_STORIES: NO')
+
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = EmbeddingEngine(embed_model='embedder', prefilter=False, workers=2)
+            output = engine.run(SAMPLE, os.path.join(tmp, 'out.txt'))
+            with open(output, encoding='utf-8') as f:
+                text = f.read()
+            self.assertTrue(text.startswith('embedder < 0.5\n'))
+            self.assertFalse(hasattr(engine, 'asked'))
+            self.assertEqual((engine.embedded_count, engine.embedding_proposals), (engine.segment_count, 1))
+            self.assertEqual(text.count('ID0001'), 2)
+            self.assertIn('In unrelated news', text.split('ID0001')[2])
+
+            # Only the proposed split is put to the chat model, which overrules it
+            engine = EmbeddingEngine(embed_model='embedder', confirm_splits=True, prefilter=False)
+            output = engine.run(SAMPLE, os.path.join(tmp, 'confirmed.txt'))
+            with open(output, encoding='utf-8') as f:
+                text = f.read()
+        self.assertEqual(engine.asked, ['"Title:Moscow"'])
+        self.assertEqual(engine.embedding_confirmations, 1)
+        self.assertNotIn('ID0001', text)
+
+    def test_transient_errors_stop_the_run(self):
+        class DownEngine(sort_engine.SortEngine):
+            def _chat_ollama(self, model, prompt, segments=1):
+                raise llm_clients.TransientBackendError("Ollama request failed after 5 attempts")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, 'out.txt')
+            with self.assertRaises(llm_clients.TransientBackendError):
+                DownEngine(prefilter=False).run(SAMPLE, output)
+            self.assertFalse(os.path.exists(output))
+
+    def test_backend_errors_go_to_the_log(self):
+        class BrokenEngine(sort_engine.SortEngine):
+            def _chat_ollama(self, model, prompt, segments=1):
+                raise ValueError("bad answer")
+
+        messages = []
+        engine = BrokenEngine(log=lambda message, kind='normal': messages.append((kind, message)))
+        analysis = engine.analyze_segment('"Title:a"', 'One thing. Another thing.')
+        self.assertFalse(analysis[3])
+        self.assertIn(('error', 'Ollama analysis error: bad answer'), messages)
+
+    def test_prefilter_skips_single_story_segments(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = FakeEngine(workers=2)
+            engine.run(JOINED, os.path.join(tmp, 'out.vhd'))
+        self.assertGreater(engine.model_calls_skipped, 0)
+        self.assertEqual(engine.calls + engine.model_calls_skipped, engine.segment_count)
+
+    def test_packed_requests_match_single_requests(self):
+        splits = {'"Title:Moscow"': [2], '"Title:TechNews"': [1]}
+        outputs = []
+        with tempfile.TemporaryDirectory() as tmp:
+            for engine in (FakeEngine(splits=splits, prefilter=False),
+                           PackingEngine(splits=splits, prefilter=False, batch_tokens=100000),
+                           PackingEngine(splits=splits, prefilter=False, batch_tokens=100000,
+                                         workers=2, drop={2})):
+                output = os.path.join(tmp, 'out.txt')
+                engine.run(SAMPLE, output)
+                with open(output, encoding='utf-8') as f:
+                    outputs.append(f.read().split('\n', 2)[2])
+                if isinstance(engine, PackingEngine):
+                    self.assertEqual(len(engine.prompts), 1)
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertEqual(outputs[0], outputs[2])
+        # The dropped segment was asked again on its own
+        self.assertEqual((engine.batch_fallbacks, engine.calls), (1, 1))
+
+    def test_prompts_reuse_the_cached_line_labels(self):
+        class AnsweringEngine(sort_engine.SortEngine):
+            def _chat_ollama(self, model, prompt, segments=1):
+                return 'CONTAINS_MULTIPLE_STORIES: NO'
+
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch.object(split_utils, 'classify_lines', side_effect=AssertionError):
+            for batch_tokens in (0, 100000):
+                engine = AnsweringEngine(prefilter=False, batch_tokens=batch_tokens, structured=False)
+                engine.run(SAMPLE, os.path.join(tmp, 'out.txt'))
+
+    def test_batch_token_budget_limits_request_size(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = PackingEngine(prefilter=False, batch_tokens=1)
+            engine.run(JOINED, os.path.join(tmp, 'out.vhd'))
+        # Every segment is over budget, so none are packed together
+        self.assertEqual(engine.prompts, [])
+        self.assertEqual(engine.calls, engine.segment_count)
+
+    def test_prompt_numbers_story_sentences_only(self):
+        content = 'First story. Second story.\ncc-Nice\n--img.jpg\nThird story.\n'
+        text = sort_engine.numbered_sentences(content)
+        self.assertEqual(text, '[1] First story.\n[2] Second story.\n[3] Third story.')
+        self.assertNotIn('cc-Nice', sort_engine.build_analysis_prompt('"Title:a"', content))
+        # Numbers match the sentences split_segment splits after
+        parts = split_utils.split_segment('"Title:a"', content, content, [1])
+        self.assertTrue(parts[0].startswith('"Title:a"\nFirst story.\ncc-Nice'))
+        # A token budget cuts the list short
+        self.assertEqual(sort_engine.numbered_sentences(content, token_budget=1),
+                         '[1] First story.\n... (2 more sentences not shown)')
+
+    def test_instructions_are_a_fixed_system_message(self):
+        engine = sort_engine.SortEngine(model='gemma3:1b', structured=False)
+        system = engine._answer_options(1)['system']
+        self.assertIn('CONTAINS_MULTIPLE_STORIES: YES/NO', system)
+        self.assertEqual(system, sort_engine.analysis_system_prompt())
+        self.assertEqual(engine._answer_options(3)['system'], sort_engine.batch_system_prompt())
+        # Splitting same-topic updates apart changes the instructions and the cache key
+        separate = sort_engine.SortEngine(model='gemma3:1b', structured=False, keep_same_topic=False)
+        self.assertIn(sort_engine.SEPARATE_UPDATES_RULE, separate._answer_options(1)['system'])
+        self.assertIn(sort_engine.SEPARATE_UPDATES_RULE, separate._answer_options(3)['system'])
+        self.assertNotEqual(separate._prompt_version(), engine._prompt_version())
+        # The user message holds only the segment
+        prompt = sort_engine.build_analysis_prompt('"Title:a"', 'One thing. Another thing.')
+        self.assertEqual(prompt, '"Title:a"\n[1] One thing.\n[2] Another thing.')
+
+    def test_thinking_is_turned_off_or_budgeted(self):
+        class ThinkingEngine(sort_engine.SortEngine):
+            def _client(self, backend):
+                return self
+
+            def chat(self, model, prompt, think=None, stop_when=None, **kwargs):
+                self.calls.append((model, think, kwargs['system'].endswith('/no_think')))
+                if think is False or model.startswith('qwen3'):
+                    return '<think></think>CONTAINS_MULTIPLE_STORIES: NO'
+                text = '<think>' + 'hmm ' * 200
+                self.cut = stop_when(text)
+                return text
+
+        engine = ThinkingEngine(model='qwen3:8b', prefilter=False, think_budget=50,
+                                thinking={'deepseek-r1:8b': 'budget'})
+        engine.calls = []
+        self.assertEqual(engine._chat_ollama('qwen3:8b', 'p'), 'CONTAINS_MULTIPLE_STORIES: NO')
+        self.assertEqual(engine.calls, [('qwen3:8b', False, True)])
+
+        # Cut off past the budget, then asked again with thinking off
+        engine.calls = []
+        self.assertEqual(engine._chat_ollama('deepseek-r1:8b', 'p'), 'CONTAINS_MULTIPLE_STORIES: NO')
+        self.assertTrue(engine.cut)
+        self.assertEqual(engine.calls, [('deepseek-r1:8b', True, False), ('deepseek-r1:8b', False, False)])
+        self.assertEqual(engine.thinking_cutoffs, 1)
+
+        # No way to turn it off: the answer stays empty
+        self.assertEqual(engine.thinking_policy('phi4-mini-reasoning:latest'), 'budget')
+        self.assertEqual(engine._chat_ollama('phi4-mini-reasoning:latest', 'p'), '')
+        self.assertEqual(engine.thinking_policy('gemma3:1b'), 'on')
+
+    def test_strip_thinking(self):
+        self.assertEqual(thinking.strip_thinking('<think>a\nb</think>\nNO'), 'NO')
+        self.assertEqual(thinking.strip_thinking('a</think>NO'), 'NO')
+        self.assertEqual(thinking.strip_thinking('<think>still going'), '')
+        self.assertEqual(thinking.strip_thinking('NO'), 'NO')
+
+    def test_answer_complete(self):
+        complete = sort_engine.answer_complete
+        self.assertFalse(complete('CONTAINS_MULTIPLE_STORIES: N'))
+        self.assertFalse(complete('CONTAINS_MULTIPLE_STORIES: NO'))
+        self.assertTrue(complete('CONTAINS_MULTIPLE_STORIES: NO\n'))
+        self.assertFalse(complete('CONTAINS_MULTIPLE_STORIES: YES\nNUMBER_OF_STORIES: 2\nSPLIT_AFTER: 3'))
+        self.assertTrue(complete('CONTAINS_MULTIPLE_STORIES: YES\nNUMBER_OF_STORIES: 2\nSPLIT_AFTER: 3\n'))
+        # A verdict inside an unfinished think block does not count
+        self.assertFalse(complete('<think>CONTAINS_MULTIPLE_STORIES: NO\n'))
+        self.assertTrue(complete('<think>x</think>CONTAINS_MULTIPLE_STORIES: NO\n'))
+
+    def test_parse_batch_response(self):
+        text = ('SEGMENT: 1\nCONTAINS_MULTIPLE_STORIES: YES\nNUMBER_OF_STORIES: 2\n'
+                'SPLIT_AFTER: 3\nREASONING: two\n\n'
+                '**Segment 2**\nno verdict here\n\n'
+                'SEGMENT: 9\nCONTAINS_MULTIPLE_STORIES: NO\n\n'
+                'SEGMENT: 3\nCONTAINS_MULTIPLE_STORIES: NO\nREASONING: one')
+        decisions = sort_engine.parse_batch_response(text, [1, 2, 3])
+        self.assertEqual(sorted(decisions), [1, 3])
+        self.assertEqual(decisions[1][:4], (True, 2, [3], 'two'))
+        self.assertEqual(decisions[3][:4], (False, 1, [], 'one'))
+
+    def test_parse_structured_answers(self):
+        parse = sort_engine.parse_analysis_response
+        answer = ('{"contains_multiple_stories": true, "number_of_stories": 2, '
+                  '"split_after": [3], "reasoning": "two"}')
+        self.assertEqual(parse(answer), (True, 2, [3], 'two'))
+        # A stream cut off after the decision is still read
+        cut = answer[:answer.index('"reasoning"')]
+        self.assertEqual(parse(cut)[:3], (True, 2, [3]))
+        self.assertTrue(sort_engine.answer_complete(cut))
+        # Wrong types fall back to the text parser
+        self.assertIsNone(response_schema.parse_structured('{"contains_multiple_stories": "yes"}'))
+        self.assertEqual(parse('CONTAINS_MULTIPLE_STORIES: NO\nREASONING: one')[0], False)
+
+    def test_parse_structured_batch_response(self):
+        text = ('{"segments": ['
+                '{"segment": 1, "contains_multiple_stories": true, "number_of_stories": 2, '
+                '"split_after": [3], "reasoning": "two"},'
+                '{"segment": 2, "contains_multiple_stories": 1},'
+                '{"segment": 3, "contains_multiple_stories": false, "number_of_stories": 1, '
+                '"split_after": [], "reasoning": "one"}]}')
+        decisions = sort_engine.parse_batch_response(text, [1, 2, 3])
+        self.assertEqual(sorted(decisions), [1, 3])
+        self.assertEqual(decisions[1][:4], (True, 2, [3], 'two'))
+        # The stored entry is a single-segment answer
+        self.assertEqual(sort_engine.parse_analysis_response(decisions[3][4]), (False, 1, [], 'one'))
+
+    def test_cli_does_not_import_tk(self):
+        root = os.path.dirname(os.path.dirname(__file__))
+        code = 'import sys, textsorter; print("tkinter" in sys.modules)'
+        out = subprocess.run([sys.executable, '-c', code], cwd=root,
+                             capture_output=True, text=True, check=True)
+        self.assertEqual(out.stdout.strip(), 'False')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -25,5 +25,24 @@ class SplitSegmentTests(unittest.TestCase):
             self.assertIn('jj-jtag', seg)
             self.assertIn('Timestamp: 11:44pm EST', seg)
 
+    def test_is_single_story(self):
+        # One sentence plus metadata can never be split
+        self.assertTrue(split_utils.is_single_story(
+            'Typhoon trucks spotted.\nTimestamp: 5:37 AM\ncc-Nice\ncc-Based\n'
+        ))
+        # A short post whose lines are mostly metadata
+        self.assertTrue(split_utils.is_single_story(
+            'Power is out. Crews are on site.\nTimestamp: 4:57 AM\n--img.jpg\nhttps://x.com/a\n'
+        ))
+        # Several timestamps mean several posts
+        self.assertFalse(split_utils.is_single_story(
+            'Power is out.\nTimestamp: 4:57 AM\n--img.jpg\nA festival began.\nTimestamp: 9:00 AM\n'
+        ))
+
+    def test_story_sentences_skip_metadata(self):
+        content = 'First thing. Second thing.\n--image.jpg\nTimestamp: 11:44pm EST\nThird thing.'
+        self.assertEqual(split_utils.story_sentences(content),
+                         [(1, 'First thing.'), (2, 'Second thing.'), (3, 'Third thing.')])
+
 if __name__ == '__main__':
     unittest.main()
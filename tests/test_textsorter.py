@@ -0,0 +1,63 @@
+import unittest
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import run_journal
+import sort_engine
+import textsorter
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'sample.txt')
+
+
+class CommandLineTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.input = os.path.join(self.tmp.name, 'sample.txt')
+        shutil.copy(SAMPLE, self.input)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_journaled_decisions_are_not_overwritten(self):
+        path = run_journal.journal_path(self.input)
+        journal = run_journal.JournalWriter(path, sort_engine.DEFAULT_MODEL, 4)
+        journal.record(0, 'hash', [])
+        journal.close()
+        with open(path, encoding='utf-8') as f:
+            before = f.read()
+
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            self.assertEqual(textsorter.main([self.input, '--no-cache', '--no-preload']), 1)
+        self.assertIn('--resume', stderr.getvalue())
+        with open(path, encoding='utf-8') as f:
+            self.assertEqual(f.read(), before)
+
+    def test_interrupt_points_to_partial_output_and_resume(self):
+        def analyze(engine, title, content, lines=None):
+            if title == '"Title:RHW"':
+                raise KeyboardInterrupt
+            return False, "fake", "fake", False, 1, [], []
+
+        output = os.path.join(self.tmp.name, 'out.txt')
+        stderr = io.StringIO()
+        with mock.patch.object(sort_engine.SortEngine, 'analyze_segment', analyze), \
+                contextlib.redirect_stderr(stderr):
+            code = textsorter.main([self.input, '-o', output, '--no-cache', '--no-preload',
+                                    '--no-prefilter', '-q'])
+        self.assertEqual(code, 130)
+        self.assertIn(output + '.partial', stderr.getvalue())
+        self.assertIn('--resume', stderr.getvalue())
+        self.assertEqual(run_journal.decided_segments(run_journal.journal_path(self.input),
+                                                      sort_engine.DEFAULT_MODEL), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,14 +1,22 @@
 #!/usr/bin/env python3
+import collections
+import itertools
+import logging
+import logging.handlers
 import os
-import re
+import queue
 import threading
 import tkinter as tk
 from tkinter import filedialog, messagebox, scrolledtext
 import customtkinter as ctk
-import ollama
 import subprocess
 import json
-import requests
+
+from embedding_splits import DEFAULT_EMBED_MODEL, DEFAULT_SPLIT_THRESHOLD
+from llm_cache import ResponseCache
+from run_journal import decided_segments, journal_path
+from sort_engine import AVAILABLE_MODELS, DEFAULT_MODEL, OPENAI_MODEL, SortEngine, decision_model
+from thinking import DEFAULT_THINK_BUDGET, THINKING_AUTO, THINKING_POLICIES
 
 # Set appearance mode and default color theme
 ctk.set_appearance_mode("dark")
@@ -23,55 +31,58 @@ OPENAI_KEY_FILE = "/home/j/Desktop/API_KEYS/openai_key_usable.txt"
 # Simple JSON file used to remember the last selected model between sessions
 CONFIG_FILE = os.path.join(os.path.dirname(__file__), "app_config.json")
 
-# List of available models.  We'll sort them alphabetically when building the
-# dropdown menu so new entries don't need to be manually ordered.
-AVAILABLE_MODELS = [
-    "deepcoder:1.5b",
-    "deepseek-r1:1.5b",
-    "deepseek-r1:8b",
-    "deepseek-r1:latest",
-    "gemma3:1b",
-    "gemma3:latest",
-    "llama3.1:8b",
-    "llama3.1:latest",
-    "llama3.2:3b",
-    "llama3.2:latest",
-    "mistral-small3.1:latest",
-    "openchat:7b-v3.5-0106",
-    "phi3.5:latest",
-    "phi4-mini-reasoning:latest",
-    "phi4-mini:latest",
-    "phi4:latest",
-    "qwen2.5-coder:0.5b",
-    "qwen2.5-coder:1.5b",
-    "qwen2.5vl:3b",
-    "qwen3:0.6b",
-    "qwen3:1.7b",
-    "qwen3:14b",
-    "qwen3:30b",
-    "qwen3:32b",
-    "qwen3:4b",
-    "qwen3:8b",
-    "qwen3:latest",
-    "smollm2:latest",
-    "gpt-4.1-nano",
-]
-
-# Tag prefixes that should be ignored when making segment decisions
-TAG_PREFIXES = [
-    '--', 
-    'http', 
-    'Timestamp:', 
-    'Map view:', 
-    'Source:', 
-    'jj-', 'JJ-', 
-    'cc-', 'CC-', 
-    'mm-', 'MM-', 
-    '@'
-]
-
-# Regular expression for tag detection
-TAG_PATTERN = re.compile(r'^(--|https?://|Timestamp:|Map view:|Source:|\w\w-|@)')
+# How often the UI thread picks up messages posted by the worker thread
+UI_POLL_MS = 50
+
+# The log panel is refreshed at most this often and keeps at most
+# MAX_LOG_LINES lines; the complete log goes to LOG_FILE
+LOG_FLUSH_MS = 100
+MAX_LOG_LINES = 5000
+LOG_FILE = os.path.join(os.path.dirname(__file__), "text_sorter.log")
+LOG_FILE_MAX_BYTES = 5 * 1024 * 1024
+LOG_FILE_BACKUPS = 3
+
+# Log panel message types (also the text tag names) and their file log level
+LOG_LEVELS = {
+    "highlight": logging.INFO,
+    "error": logging.ERROR,
+    "success": logging.INFO,
+    "info": logging.INFO,
+    "warning": logging.WARNING,
+}
+
+# Choices for the number of concurrent segment analyses.  Ollama only runs
+# requests in parallel when OLLAMA_NUM_PARALLEL allows it.
+WORKER_CHOICES = ["1", "2", "4", "8"]
+
+# Token budgets for packing several segments into one request
+BATCH_CHOICES = ["Off", "1000", "2000", "4000"]
+
+# Seconds to wait for a model response; "Off" waits as long as it takes
+TIMEOUT_CHOICES = ["Off", "120", "300", "600", "1800"]
+
+# Seconds to wait on close for the worker to finish its current segment
+WORKER_STOP_TIMEOUT = 5.0
+
+def create_file_logger():
+    """Return a logger writing to the rotating LOG_FILE, or ``None``."""
+    logger = logging.getLogger("text_sorter")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    if not logger.handlers:
+        try:
+            handler = logging.handlers.RotatingFileHandler(
+                LOG_FILE,
+                maxBytes=LOG_FILE_MAX_BYTES,
+                backupCount=LOG_FILE_BACKUPS,
+                encoding="utf-8",
+            )
+        except OSError as e:
+            print(f"Could not open log file: {e}")
+            return None
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+        logger.addHandler(handler)
+    return logger
 
 class ContextMenuText(scrolledtext.ScrolledText):
     """Text widget with a context menu"""
@@ -143,29 +154,51 @@ class TextSorterApp(ctk.CTk):
         self.input_file_path = ""
         self.output_file_path = ""
         self.processed = False
-        self.selected_model = ctk.StringVar(value="qwen3:0.6b")  # Default model
+        self.selected_model = ctk.StringVar(value=DEFAULT_MODEL)  # Default model
         self.auto_process = ctk.BooleanVar(value=True)  # Auto process by default
         self.api_key_var = ctk.StringVar()
+        self.workers_var = ctk.StringVar(value="1")  # Concurrent analyses
+        self.batch_var = ctk.StringVar(value="Off")  # Token budget for packed requests
+        self.timeout_var = ctk.StringVar(value="Off")  # Read timeout of model requests
+        self.escalation_var = ctk.StringVar(value="Off")  # Larger model for unsure segments
+        self.thinking_var = ctk.StringVar(value=THINKING_AUTO)  # Thinking policy of the selected model
+        self.thinking_policies = {}  # Model name -> thinking policy
+        self.think_budget = DEFAULT_THINK_BUDGET
+        self.use_cache_var = ctk.BooleanVar(value=True)  # Reuse cached responses
+        self.prefilter_var = ctk.BooleanVar(value=True)  # Skip the model for obvious single stories
+        self.structured_var = ctk.BooleanVar(value=True)  # Ask for JSON answers
+        self.ollama_hosts_var = ctk.StringVar()  # Comma-separated Ollama URLs
+        self.openai_url_var = ctk.StringVar()  # OpenAI-compatible base URL, empty for the real API
+        self.incremental_var = ctk.BooleanVar(value=False)  # Reuse decisions for unchanged segments
+        self.embed_splits_var = ctk.BooleanVar(value=False)  # Split by sentence embeddings
+        self.confirm_splits_var = ctk.BooleanVar(value=False)  # Chat model confirms embedding splits
+        self.embed_model = DEFAULT_EMBED_MODEL
+        self.split_threshold = DEFAULT_SPLIT_THRESHOLD
+        self.response_cache = None  # Opened on first use
 
         # Load previously saved configuration if available
         self.load_config()
         
-        # Segment processing variables
-        self.segments = []
-        self.current_segment_index = 0
-        self.processed_segments = []
+        # Segment processing state lives in the engine; a fresh one is
+        # created for every run in start_processing
+        self.engine = SortEngine()
         self.processing_active = False
-        
-        # Topic counter variables
-        self.baseline_topic_count = 0
-        self.current_topic_count = 0
-        self.different_topics_count = 0
-        self.same_topics_count = 0
-        # Counter for assigning IDs to split segments
-        self.split_id_counter = 0
+
+        # Work is done on a background thread.  It posts UI updates to
+        # ui_queue and reads decision button presses from manual_decisions.
+        self.ui_queue = queue.Queue()
+        self.manual_decisions = queue.Queue()
+        self.stop_event = threading.Event()
+        self.worker_thread = None
+
+        # Log messages wait here until the next batched flush to the panel
+        self.pending_log = collections.deque(maxlen=MAX_LOG_LINES)
+        self.file_logger = create_file_logger()
         
         # Create UI elements
         self.create_widgets()
+        self.after(UI_POLL_MS, self._drain_ui_queue)
+        self.after(LOG_FLUSH_MS, self._flush_log)
 
         # Save settings when the window is closed
         self.protocol("WM_DELETE_WINDOW", self.on_closing)
@@ -206,6 +239,91 @@ class TextSorterApp(ctk.CTk):
             width=200,
         )
         self.model_dropdown.pack(side=tk.RIGHT, padx=10, pady=5)
+
+        # Number of segment analyses sent to the model at the same time
+        self.workers_dropdown = ctk.CTkOptionMenu(
+            self.model_frame,
+            values=WORKER_CHOICES,
+            variable=self.workers_var,
+            command=lambda value: self.save_config(),
+            width=60,
+        )
+        self.workers_dropdown.pack(side=tk.RIGHT, padx=(10, 0), pady=5)
+
+        self.workers_label = ctk.CTkLabel(
+            self.model_frame,
+            text="Parallel:",
+            anchor="e"
+        )
+        self.workers_label.pack(side=tk.RIGHT, pady=5)
+
+        # Token budget for packing several segments into one request
+        self.batch_dropdown = ctk.CTkOptionMenu(
+            self.model_frame,
+            values=BATCH_CHOICES,
+            variable=self.batch_var,
+            command=lambda value: self.save_config(),
+            width=80,
+        )
+        self.batch_dropdown.pack(side=tk.RIGHT, padx=(10, 0), pady=5)
+
+        self.batch_label = ctk.CTkLabel(
+            self.model_frame,
+            text="Batch tokens:",
+            anchor="e"
+        )
+        self.batch_label.pack(side=tk.RIGHT, pady=5)
+
+        # How long to wait for a model response before retrying
+        self.timeout_dropdown = ctk.CTkOptionMenu(
+            self.model_frame,
+            values=TIMEOUT_CHOICES,
+            variable=self.timeout_var,
+            command=lambda value: self.save_config(),
+            width=80,
+        )
+        self.timeout_dropdown.pack(side=tk.RIGHT, padx=(10, 0), pady=5)
+
+        self.timeout_label = ctk.CTkLabel(
+            self.model_frame,
+            text="Timeout (s):",
+            anchor="e"
+        )
+        self.timeout_label.pack(side=tk.RIGHT, pady=5)
+
+        # Cascade: segments the selected model flags are re-checked by this one
+        self.escalation_dropdown = ctk.CTkOptionMenu(
+            self.model_frame,
+            values=["Off"] + sorted(AVAILABLE_MODELS),
+            variable=self.escalation_var,
+            command=lambda value: self.save_config(),
+            width=160,
+        )
+        self.escalation_dropdown.pack(side=tk.RIGHT, padx=(10, 0), pady=5)
+
+        self.escalation_label = ctk.CTkLabel(
+            self.model_frame,
+            text="Escalate to:",
+            anchor="e"
+        )
+        self.escalation_label.pack(side=tk.RIGHT, pady=5)
+
+        # Thinking policy of the selected model (only matters for reasoning models)
+        self.thinking_dropdown = ctk.CTkOptionMenu(
+            self.model_frame,
+            values=list(THINKING_POLICIES),
+            variable=self.thinking_var,
+            command=self.on_thinking_select,
+            width=90,
+        )
+        self.thinking_dropdown.pack(side=tk.RIGHT, padx=(10, 0), pady=5)
+
+        self.thinking_label = ctk.CTkLabel(
+            self.model_frame,
+            text="Thinking:",
+            anchor="e"
+        )
+        self.thinking_label.pack(side=tk.RIGHT, pady=5)
         
         # Advanced options frame
         self.options_frame = ctk.CTkFrame(self.top_section)
@@ -226,6 +344,54 @@ class TextSorterApp(ctk.CTk):
             variable=self.preserve_tags_var
         )
         self.preserve_tags_checkbox.pack(side=tk.LEFT, padx=10, pady=5)
+
+        self.use_cache_checkbox = ctk.CTkCheckBox(
+            self.options_frame,
+            text="Cache responses",
+            variable=self.use_cache_var,
+            command=self.save_config
+        )
+        self.use_cache_checkbox.pack(side=tk.LEFT, padx=10, pady=5)
+
+        self.prefilter_checkbox = ctk.CTkCheckBox(
+            self.options_frame,
+            text="Skip obvious single stories",
+            variable=self.prefilter_var,
+            command=self.save_config
+        )
+        self.prefilter_checkbox.pack(side=tk.LEFT, padx=10, pady=5)
+
+        self.structured_checkbox = ctk.CTkCheckBox(
+            self.options_frame,
+            text="JSON answers",
+            variable=self.structured_var,
+            command=self.save_config
+        )
+        self.structured_checkbox.pack(side=tk.LEFT, padx=10, pady=5)
+
+        self.incremental_checkbox = ctk.CTkCheckBox(
+            self.options_frame,
+            text="Incremental",
+            variable=self.incremental_var,
+            command=self.save_config
+        )
+        self.incremental_checkbox.pack(side=tk.LEFT, padx=10, pady=5)
+
+        self.embed_splits_checkbox = ctk.CTkCheckBox(
+            self.options_frame,
+            text="Embedding splits",
+            variable=self.embed_splits_var,
+            command=self.save_config
+        )
+        self.embed_splits_checkbox.pack(side=tk.LEFT, padx=10, pady=5)
+
+        self.confirm_splits_checkbox = ctk.CTkCheckBox(
+            self.options_frame,
+            text="Confirm splits",
+            variable=self.confirm_splits_var,
+            command=self.save_config
+        )
+        self.confirm_splits_checkbox.pack(side=tk.LEFT, padx=10, pady=5)
         
         self.auto_process_checkbox = ctk.CTkCheckBox(
             self.options_frame,
@@ -259,6 +425,40 @@ class TextSorterApp(ctk.CTk):
             command=self.paste_api_key
         )
         self.paste_key_button.pack(side=tk.RIGHT, padx=5, pady=5)
+
+        # Ollama hosts to spread segments over, comma-separated; empty for
+        # $OLLAMA_HOST or localhost
+        self.hosts_frame = ctk.CTkFrame(self.main_frame)
+        self.hosts_frame.pack(fill=tk.X, padx=20, pady=(0, 10))
+
+        self.hosts_label = ctk.CTkLabel(
+            self.hosts_frame,
+            text="Ollama hosts:",
+            anchor="w"
+        )
+        self.hosts_label.pack(side=tk.LEFT, padx=10, pady=5)
+
+        self.hosts_entry = ctk.CTkEntry(
+            self.hosts_frame,
+            textvariable=self.ollama_hosts_var
+        )
+        self.hosts_entry.pack(side=tk.LEFT, padx=5, pady=5, fill=tk.X, expand=True)
+        self.hosts_entry.bind("<FocusOut>", lambda event: self.save_config())
+
+        self.openai_url_label = ctk.CTkLabel(
+            self.hosts_frame,
+            text="OpenAI base URL:",
+            anchor="w"
+        )
+        self.openai_url_label.pack(side=tk.LEFT, padx=10, pady=5)
+
+        self.openai_url_entry = ctk.CTkEntry(
+            self.hosts_frame,
+            textvariable=self.openai_url_var,
+            width=220
+        )
+        self.openai_url_entry.pack(side=tk.LEFT, padx=5, pady=5)
+        self.openai_url_entry.bind("<FocusOut>", lambda event: self.save_config())
         
         # File selection buttons frame
         self.file_buttons_frame = ctk.CTkFrame(self.main_frame)
@@ -312,6 +512,14 @@ class TextSorterApp(ctk.CTk):
             font=ctk.CTkFont(size=14)
         )
         self.progress_label.pack(side=tk.LEFT, padx=10, pady=5)
+
+        # Load and latency of each Ollama host when several are used
+        self.host_status_label = ctk.CTkLabel(
+            self.progress_frame,
+            text="",
+            anchor="w"
+        )
+        self.host_status_label.pack(side=tk.LEFT, padx=10, pady=5)
         
         # File info
         self.file_info = ctk.CTkLabel(
@@ -359,6 +567,19 @@ class TextSorterApp(ctk.CTk):
             text_color="#4d8a3d"  # Green color
         )
         self.merged_topics_label.pack(side=tk.RIGHT, padx=10, pady=5)
+
+        # Live stage timings and token counts of the run
+        self.metrics_frame = ctk.CTkFrame(self.main_frame)
+        self.metrics_frame.pack(fill=tk.X, padx=20, pady=(0, 10))
+
+        self.metrics_label = ctk.CTkLabel(
+            self.metrics_frame,
+            text="Run metrics: not started",
+            anchor="w",
+            justify="left",
+            font=ctk.CTkFont(size=12)
+        )
+        self.metrics_label.pack(side=tk.LEFT, fill=tk.X, padx=10, pady=5)
         
         # Log display
         self.log_frame = ctk.CTkFrame(self.main_frame)
@@ -518,6 +739,25 @@ class TextSorterApp(ctk.CTk):
         
         # Get the selected model
         model = self.selected_model.get()
+        escalation_model = None if self.escalation_var.get() == "Off" else self.escalation_var.get()
+        embed_model = self.embed_model if self.embed_splits_var.get() else None
+
+        # Offer to pick up an interrupted run on this file with this model
+        resume = False
+        decided = decided_segments(
+            journal_path(self.input_file_path), decision_model(
+                model, escalation_model, embed_model, self.split_threshold, self.confirm_splits_var.get()
+            )
+        )
+        if decided:
+            resume = messagebox.askyesnocancel(
+                "Resume",
+                f"An interrupted run with {model} already decided {decided} segments "
+                f"of this file.\n\nResume from segment {decided + 1}?  "
+                f"No starts over and discards those decisions."
+            )
+            if resume is None:
+                return
         
         # Log start of processing
         self.add_to_log(f"Started processing with model: {model}", "highlight")
@@ -530,227 +770,116 @@ class TextSorterApp(ctk.CTk):
         if not self.auto_process.get():
             self.same_topic_button.configure(state="normal")
             self.different_topic_button.configure(state="normal")
+
+        # Hit and miss counts in the end-of-run log cover this run only
+        cache = self.get_response_cache()
+        if cache is not None:
+            cache.reset_counts()
+
+        # The engine owns all segment state and runs on the worker thread;
+        # its log and status messages are posted back to the UI thread
+        self.engine = SortEngine(
+            model=model,
+            api_key=self.api_key_var.get(),
+            keep_same_topic=self.same_topic_var.get(),
+            log=self.add_to_log,
+            status=lambda text: self.post_to_ui(self.set_status, text),
+            workers=int(self.workers_var.get()),
+            cache=cache,
+            prefilter=self.prefilter_var.get(),
+            batch_tokens=0 if self.batch_var.get() == "Off" else int(self.batch_var.get()),
+            read_timeout=None if self.timeout_var.get() == "Off" else float(self.timeout_var.get()),
+            structured=self.structured_var.get(),
+            journal=True,
+            resume=resume,
+            incremental=self.incremental_var.get(),
+            ollama_hosts=[host.strip() for host in self.ollama_hosts_var.get().split(",")],
+            escalation_model=escalation_model,
+            openai_base_url=self.openai_url_var.get().strip() or None,
+            thinking=dict(self.thinking_policies),
+            think_budget=self.think_budget,
+            embed_model=embed_model,
+            split_threshold=self.split_threshold,
+            confirm_splits=self.confirm_splits_var.get(),
+        )
+        self.processing_active = True
         
-        # Run initial processing in a separate thread to prevent UI freezing
-        threading.Thread(
-            target=self._prepare_segments,
-            args=(model,),
+        # Run the whole pipeline on a worker thread so model calls never
+        # block the Tk event loop
+        self.worker_thread = threading.Thread(
+            target=self._process_segments,
             daemon=True
-        ).start()
+        )
+        self.worker_thread.start()
+
+    def post_to_ui(self, func, *args):
+        """Run ``func(*args)`` on the Tk thread; safe to call from any thread."""
+        self.ui_queue.put((func, args))
+
+    def _drain_ui_queue(self):
+        """Run the callbacks posted by the worker thread, then reschedule."""
+        try:
+            while True:
+                func, args = self.ui_queue.get_nowait()
+                func(*args)
+        except queue.Empty:
+            pass
+        self.after(UI_POLL_MS, self._drain_ui_queue)
     
-    def _prepare_segments(self, model):
+    def _process_segments(self):
+        """Worker thread: load, analyze and save without touching any widget."""
+        engine = self.engine
+        stage = "preparation"
         try:
-            # Set processing flag
-            self.processing_active = True
-            
-            # Get file base name and create output path
-            input_basename = os.path.basename(self.input_file_path)
-            file_name, file_ext = os.path.splitext(input_basename)
-            
-            # Add timestamp to the output filename
-            import datetime
-            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            self.output_file_path = os.path.join(
-                os.path.dirname(self.input_file_path),
-                f"{file_name}_sorted_{timestamp}{file_ext}"
-            )
-            
-            # Read input file content
-            with open(self.input_file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
-            
-            self.add_to_log(f"Reading file content...", "info")
-            
-            # Store the original content for exact formatting preservation
-            self.original_content = content
-            
-            # Improved segment pattern to better identify proper title segments
-            # Look for "Title:" pattern at the beginning of a line or after a newline
-            segment_pattern = r'((?:^|\n)\s*"Title:[^"]+")(.+?)(?=(?:^|\n)\s*"Title:|$)'
-            
-            # Find positions of each segment to preserve exact text
-            # Use DOTALL so the pattern spans newlines but avoid MULTILINE
-            # to ensure $ only matches end-of-string. MULTILINE caused
-            # segments to stop after the first line when a blank line was
-            # present, dropping metadata such as timestamps and tags.
-            matches = list(re.finditer(segment_pattern, content, re.DOTALL))
-            
-            # Extract segments with their exact original text
-            self.segments = []
-            for match in matches:
-                title = match.group(1).strip()
-                segment_content = match.group(2).lstrip("\n")
-                # Get the exact original text for this segment (without leading blank lines)
-                original_text = match.group(0).lstrip("\n")
-                # Store the tuple (title, content, original_text)
-                self.segments.append((title, segment_content, original_text))
-            
-            self.current_segment_index = 0
-            self.processed_segments = []
-            
-            # Set initial counters
-            self.baseline_topic_count = len(self.segments)
-            self.current_topic_count = 0  # Start with 0, will increment as we process
-            self.different_topics_count = 0
-            self.same_topics_count = 0
-            
-            # Extract all metadata (timestamps, URLs, images, comments) by segments
-            self.segment_metadata = []
-            for title, content, original_text in self.segments:
-                metadata = []
-                for line in original_text.splitlines():
-                    # Check if line is metadata
-                    if (line.startswith('--') or 
-                        line.startswith('http') or 
-                        line.startswith('Timestamp:') or 
-                        line.startswith('Map view:') or 
-                        line.startswith('Source:') or 
-                        line.startswith('cc-') or 
-                        line.startswith('@') or
-                        re.match(r'^[A-Za-z]{2}-', line)):
-                        metadata.append(line)
-                self.segment_metadata.append(metadata)
+            # Quick if the model was already loaded when it was picked
+            engine.preload_models()
+            segment_count = engine.load(self.input_file_path)
+            self.output_file_path = engine.output_file_path
             
             # Update counter displays
-            self.update_topic_counters()
-            
-            # Update UI with segment count
-            self.progress_label.configure(
-                text=f"Status: Found {len(self.segments)} segments. Starting analysis..."
-            )
-            self.add_to_log(f"Found {len(self.segments)} segments in the file", "highlight")
+            self.post_to_ui(self.update_topic_counters)
             
-            # Start processing the first segment
-            if self.segments:
-                # Use after with delay to prevent recursion
-                self.after(100, lambda: self._process_next_segment(model))
-            else:
-                # No segments found
-                messagebox.showinfo("No Segments", "No segments found in the file")
-                self.progress_label.configure(text="Status: No segments found")
-                self.process_button.configure(state="normal")
-                self.add_to_log("Error: No segments found in the file", "error")
-                self.processing_active = False
-                
-        except Exception as e:
-            messagebox.showerror("Error", f"Preparation failed: {str(e)}")
-            self.progress_label.configure(text="Status: Error in preparation")
-            self.process_button.configure(state="normal")
-            self.add_to_log(f"Error during preparation: {str(e)}", "error")
-            self.processing_active = False
-    
-    def _process_next_segment(self, model):
-        try:
-            if self.current_segment_index >= len(self.segments):
-                # All segments processed, save the file
-                self._save_processed_file()
+            if not segment_count:
+                self.post_to_ui(self._on_no_segments)
                 return
             
-            # Get current segment
-            title, content, original_text = self.segments[self.current_segment_index]
-            
-            # Update the log first (direct call)
-            self.add_to_log(f"Processing: Segment #{self.current_segment_index + 1}/{len(self.segments)} - {title.strip()}", "info")
-            
-            # Update the progress display
-            progress_text = f"Processing segment {self.current_segment_index + 1} of {len(self.segments)}"
-            self.progress_label.configure(text=progress_text)
-            
-            # Always use AI to analyze for multiple stories in a segment
-            self.add_to_log(f"Analyzing with {model} for multiple stories...", "info")
-            
-            # Use OpenAI when the gpt-4.1-nano model is selected
-            if model == "gpt-4.1-nano":
-                _, reasoning, raw_response, contains_multiple_stories, number_of_stories, _, split_points = self.analyze_segment_with_openai(
-                    title,
-                    content,
-                    model,
-                )
-            else:
-                # Call analyze_segment_with_ollama to check for multiple stories
-                _, reasoning, raw_response, contains_multiple_stories, number_of_stories, _, split_points = self.analyze_segment_with_ollama(
-                    title,
-                    content,
-                    model,
-                    self.same_topic_var.get()
-                )
-            
-            # Add debug log entry with raw response
-            self.add_to_log(f"Raw AI response: {raw_response}", "info")
+            # Update UI with segment count
+            self.post_to_ui(self.set_status, f"Status: Found {segment_count} segments. Starting analysis...")
             
-            # Check if segment contains multiple stories
-            if contains_multiple_stories and number_of_stories > 1 and split_points:
-                self.add_to_log(f"AI found {number_of_stories} distinct stories within segment #{self.current_segment_index + 1}!", "highlight")
-                
-                # Log split points if available
-                if split_points:
-                    splits_str = ", ".join([str(p) for p in split_points])
-                    self.add_to_log(f"Splitting after line/paragraph: {splits_str}", "info")
-                
-                # Split the segment using the original title for all sub-segments
-                if self._split_segment(title, content, original_text, split_points, []):
+            stage = "processing"
+            while not engine.finished:
+                if self.stop_event.is_set():
                     return
-                # If splitting failed, fall through to normal processing
-            else:
-                # No multiple stories found, just add the segment as is
-                self.add_to_log(f"No multiple stories found in segment. Keeping as is.", "info")
-            
-            # Process segment as a whole (no splitting needed)
-            self._process_segment_as_whole(title, content, original_text)
-            
+                # Segments the user kept by hand are committed between analyses
+                self._apply_manual_decisions()
+                if engine.finished:
+                    break
+                # Analyze the current segment and keep or split it
+                engine.process_next_segment()
+                self.post_to_ui(self.update_topic_counters)
+            
+            stage = "saving"
+            if not engine.processed_count:
+                self.post_to_ui(self._on_no_content)
+                return
+            self.output_file_path = engine.save()
+            self.post_to_ui(self._on_processing_complete)
         except Exception as e:
-            messagebox.showerror("Error", f"Processing failed: {str(e)}")
-            self.progress_label.configure(text="Status: Error in processing")
-            self.process_button.configure(state="normal")
-            self.add_to_log(f"Error during processing: {str(e)}", "error")
+            self.post_to_ui(self._on_processing_error, stage, e)
+        finally:
+            engine.close()
+            engine.close_clients()
             self.processing_active = False
-    
-    def _process_segment_as_whole(self, title, content, original_text):
-        """Process a segment as a whole (no splitting)"""
-        # Get metadata for current segment
-        current_metadata = self.segment_metadata[self.current_segment_index]
-        
-        # Process the segment to ensure it has all its metadata
-        # Split into lines and filter out empty lines
-        segment_lines = [line for line in original_text.splitlines() if line.strip()]
-        
-        # Make sure all metadata is included
-        for meta_line in current_metadata:
-            if meta_line not in segment_lines:
-                segment_lines.append(meta_line)
-        
-        # Reconstruct the segment with all metadata
-        processed_segment = "\n".join(segment_lines)
-        
-        # Add as a separate segment with all metadata
-        self.processed_segments.append(processed_segment)
-        
-        # Increment counters
-        if self.current_segment_index == 0:
-            # First segment
-            self.current_topic_count = 1
-            self.add_to_log(f"Added first segment #{self.current_segment_index + 1}: {title.strip()}", "success")
-        else:
-            # New segment
-            self.different_topics_count += 1
-            self.current_topic_count += 1
-            self.add_to_log(f"Added segment #{self.current_segment_index + 1}: {title.strip()}", "success")
-        
-        self.update_topic_counters()
-        
-        # Move to next segment
-        self.current_segment_index += 1
-        
-        # Get the selected model
-        model = self.selected_model.get()
-        
-        # Process the next segment
-        if self.current_segment_index < len(self.segments):
-            # Use after with a delay to prevent recursion
-            self.after(100, lambda: self._process_next_segment(model))
-        else:
-            # All segments processed
-            self._save_processed_file()
+
+    def _apply_manual_decisions(self):
+        """Worker thread: commit segments marked with the decision buttons."""
+        while not self.engine.finished:
+            try:
+                self.manual_decisions.get_nowait()
+            except queue.Empty:
+                return
+            self.engine.keep_current_segment(manual=True)
+            self.post_to_ui(self.update_topic_counters)
     
     def _update_current_segment(self, title, content):
         """This method is no longer needed as we removed the current segment display"""
@@ -763,445 +892,72 @@ class TextSorterApp(ctk.CTk):
     def mark_same_topic(self):
         # Modified to ALWAYS keep segments separate - removing merging functionality
         # This now functions the same as mark_different_topic
-        if self.current_segment_index < len(self.segments):
-            title, content, original_text = self.segments[self.current_segment_index]
-            
-            # Get metadata for current segment
-            current_metadata = self.segment_metadata[self.current_segment_index]
-            
-            # Process the segment to ensure it has all its metadata
-            # Split into lines and filter out empty lines
-            segment_lines = [line for line in original_text.splitlines() if line.strip()]
-            
-            # Make sure all metadata is included
-            for meta_line in current_metadata:
-                if meta_line not in segment_lines:
-                    segment_lines.append(meta_line)
-            
-            # Reconstruct the segment with all metadata
-            processed_segment = "\n".join(segment_lines)
-            
-            # Add as a separate segment with all metadata
-            self.processed_segments.append(processed_segment)
-            
-            # Increment counters
-            if self.current_segment_index == 0:
-                # First segment is always a topic
-                self.current_topic_count = 1
-                self.add_to_log(f"Added first segment #{self.current_segment_index + 1}: {title.strip()}", "success")
-            else:
-                # Treated as different topic (no merging)
-                self.different_topics_count += 1
-                self.current_topic_count += 1
-                self.add_to_log(f"Added segment #{self.current_segment_index + 1} as separate segment: {title.strip()}", "success")
-            
-            self.update_topic_counters()
-            
-            # Move to next segment
-            self.current_segment_index += 1
-            
-            # Get the selected model
-            model = self.selected_model.get()
-            
-            # Process the next segment
-            if self.current_segment_index < len(self.segments):
-                # Use after with a delay to prevent recursion
-                self.after(100, lambda: self._process_next_segment(model))
-            else:
-                # All segments processed
-                self._save_processed_file()
+        if self.processing_active:
+            self.manual_decisions.put("keep")
     
     def mark_different_topic(self):
         # Modified to ALWAYS keep segments separate - removing merging functionality
         # This now functions the same as mark_same_topic
-        if self.current_segment_index < len(self.segments):
-            title, content, original_text = self.segments[self.current_segment_index]
-            
-            # Get metadata for current segment
-            current_metadata = self.segment_metadata[self.current_segment_index]
-            
-            # Process the segment to ensure it has all its metadata
-            # Split into lines and filter out empty lines
-            segment_lines = [line for line in original_text.splitlines() if line.strip()]
-            
-            # Make sure all metadata is included
-            for meta_line in current_metadata:
-                if meta_line not in segment_lines:
-                    segment_lines.append(meta_line)
-            
-            # Reconstruct the segment with all metadata
-            processed_segment = "\n".join(segment_lines)
-            
-            # Add as a separate segment with all metadata
-            self.processed_segments.append(processed_segment)
-            
-            # Increment counters
-            if self.current_segment_index == 0:
-                # First segment is always a topic
-                self.current_topic_count = 1
-                self.add_to_log(f"Added first segment #{self.current_segment_index + 1}: {title.strip()}", "success")
-            else:
-                # Treated as different topic (no merging)
-                self.different_topics_count += 1
-                self.current_topic_count += 1
-                self.add_to_log(f"Added segment #{self.current_segment_index + 1} as separate segment: {title.strip()}", "success")
-            
-            self.update_topic_counters()
-            
-            # Move to next segment
-            self.current_segment_index += 1
-            
-            # Get the selected model
-            model = self.selected_model.get()
-            
-            # Process the next segment
-            if self.current_segment_index < len(self.segments):
-                # Use after with a delay to prevent recursion
-                self.after(100, lambda: self._process_next_segment(model))
-            else:
-                # All segments processed
-                self._save_processed_file()
-    
-    def _save_processed_file(self):
-        try:
-            # Check if we have any processed segments
-            if not self.processed_segments:
-                messagebox.showinfo("No Content", "No content to save.")
-                self.progress_label.configure(text="Status: No content to save")
-                self.process_button.configure(state="normal")
-                self.processing_active = False
-                return
-            
-            # Create the output directory if it doesn't exist
-            output_dir = os.path.dirname(self.output_file_path)
-            if not os.path.exists(output_dir):
-                os.makedirs(output_dir)
-            
-            # Use the original timestamp format for the output filename
-            input_basename = os.path.basename(self.input_file_path)
-            file_name, file_ext = os.path.splitext(input_basename)
-            
-            # Add timestamp to the output filename as in the original code
-            import datetime
-            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            self.output_file_path = os.path.join(
-                os.path.dirname(self.input_file_path),
-                f"{file_name}_sorted_{timestamp}{file_ext}"
-            )
-            
-            # Combine all processed segments 
-            final_content = ""
-
-            for i, segment in enumerate(self.processed_segments):
-                # Clean up leading whitespace
-                cleaned_segment = segment.lstrip()
-                if not cleaned_segment:
-                    continue  # Skip completely empty segments
-
-                # Ensure each segment contains its metadata
-                if i < len(self.segment_metadata):
-                    segment_lines = cleaned_segment.splitlines()
-                    for meta_line in self.segment_metadata[i]:
-                        if meta_line not in segment_lines:
-                            cleaned_segment += "\n" + meta_line
-
-                # Append the segment followed by six blank lines
-                final_content += cleaned_segment.rstrip() + "\n" * 6
-            
-            # Prepend header with model and timestamp
-            header_model = self.selected_model.get()
-            timestamp_str = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            header = f"{header_model}\n{timestamp_str}\n" + "\n" * 4
-            final_content = header + final_content
+        if self.processing_active:
+            self.manual_decisions.put("keep")
 
-            # Write to output file
-            with open(self.output_file_path, 'w', encoding='utf-8') as f:
-                f.write(final_content)
+    def _on_no_segments(self):
+        messagebox.showinfo("No Segments", "No segments found in the file")
+        self.progress_label.configure(text="Status: No segments found")
+        self.process_button.configure(state="normal")
+        self.add_to_log("Error: No segments found in the file", "error")
 
-            # Automatically open the result with gnome-text-editor
-            try:
-                subprocess.Popen(['gnome-text-editor', self.output_file_path])
-            except Exception as open_err:
-                self.add_to_log(f"Could not open editor: {open_err}", "error")
-            
-            self.processed = True
-            
-            # Update UI
-            save_message = f"Status: Processing complete! File saved to: {os.path.basename(self.output_file_path)}"
-            try:
-                self.progress_label.configure(text=save_message)
-                self.open_button.configure(state="normal")
-                self.process_button.configure(state="normal")
-                self.same_topic_button.configure(state="disabled")
-                self.different_topic_button.configure(state="disabled")
-            except Exception as ui_error:
-                # UI may have been destroyed, continue with the function
-                print(f"UI update error (non-critical): {ui_error}")
-            
-            # Count the actual number of title markers in the final content
-            title_count = len(re.findall(r'"Title:', final_content))
-            
-            # Make sure our counts are accurate
-            self.current_topic_count = len(self.processed_segments)
-            
-            # Verify the kept separate count
-            processed_segments_count = len(self.processed_segments)
-            expected_different_count = processed_segments_count - 1
-            
-            # If there's a mismatch, fix the different count
-            if self.different_topics_count != expected_different_count:
-                self.add_to_log(f"Adjusting different topics count from {self.different_topics_count} to {expected_different_count} to match processed segments", "warning")
-                self.different_topics_count = expected_different_count
-            
-            # Update counters
-            try:
-                self.update_topic_counters()
-            except Exception as ui_error:
-                # UI may have been destroyed, continue with the function
-                print(f"Counter update error (non-critical): {ui_error}")
-            
-            # Calculate topics reduction
-            topics_reduction = self.baseline_topic_count - self.current_topic_count
-            reduction_percentage = (topics_reduction / self.baseline_topic_count * 100) if self.baseline_topic_count > 0 else 0
-            
-            # Log completion
-            self.add_to_log(
-                f"Processing complete! Condensed {len(self.segments)} segments into {len(self.processed_segments)} groups with {title_count} titles", 
-                "success"
-            )
-            self.add_to_log(f"Saved to: {self.output_file_path}", "info")
-            
-            # Add detailed summary
-            if self.same_topics_count > 0:
-                self.add_to_log(
-                    f"Final topic count: {self.current_topic_count} (reduced from {self.baseline_topic_count} by {topics_reduction} segments, {reduction_percentage:.1f}%)",
-                    "highlight"
-                )
-            else:
-                self.add_to_log(
-                    f"Final topic count: {self.current_topic_count} (no reduction from original {self.baseline_topic_count} segments)",
-                    "highlight"
-                )
-                
-            self.add_to_log(
-                f"Segments kept separate: {self.different_topics_count}, Segments merged: {self.same_topics_count}",
-                "highlight"
-            )
-            
-            # Add a clear explanation of what happened
-            first_segment_text = "1 first segment + "
-            if self.same_topics_count == 0 and self.different_topics_count == self.baseline_topic_count - 1:
-                self.add_to_log(
-                    f"Summary: All segments were kept separate. No merging occurred.",
-                    "highlight"
-                )
-            else:
-                self.add_to_log(
-                    f"Summary: {first_segment_text}{self.different_topics_count} separate segments + {self.same_topics_count} merged segments = {self.baseline_topic_count} total original segments",
-                    "highlight"
-                )
-            
-            # Reset processing flag
-            self.processing_active = False
-            
-            # Show completion message in a try-except block to handle potential UI destruction
-            try:
-                messagebox.showinfo(
-                    "Processing Complete",
-                    f"All {len(self.segments)} segments have been processed and saved to:\n{self.output_file_path}"
-                )
-            except Exception as dialog_error:
-                print(f"Dialog error (non-critical): {dialog_error}")
-                # Print to console instead
-                print(f"Processing Complete: All {len(self.segments)} segments have been processed and saved to: {self.output_file_path}")
-
-            # Add blank lines before showing file contents in the log
-            self.log_text.insert(tk.END, "\n\n")
-            self.log_text.see_end_if_autoscroll()
+    def _on_no_content(self):
+        messagebox.showinfo("No Content", "No content to save.")
+        self.progress_label.configure(text="Status: No content to save")
+        self.process_button.configure(state="normal")
 
-            try:
-                # Read input file content
-                with open(self.input_file_path, "r", encoding="utf-8") as f:
-                    input_content = f.read()
-
-                # Read output file content
-                with open(self.output_file_path, "r", encoding="utf-8") as f:
-                    output_content = f.read()
-
-                # Log input and output details
-                self.add_to_log("input file was this:", "highlight")
-                self.log_text.insert(tk.END, input_content + "\n\n")
-                self.add_to_log("output file is this:", "highlight")
-                self.log_text.insert(tk.END, output_content + "\n\n")
-                self.log_text.see_end_if_autoscroll()
-            except Exception as log_error:
-                # If anything fails, just record the error in the log
-                self.add_to_log(f"Could not display file contents: {log_error}", "error")
-        except Exception as e:
+    def _on_processing_error(self, stage, e):
+        if stage == "preparation":
+            messagebox.showerror("Error", f"Preparation failed: {str(e)}")
+            self.progress_label.configure(text="Status: Error in preparation")
+            self.add_to_log(f"Error during preparation: {str(e)}", "error")
+        elif stage == "processing":
+            messagebox.showerror("Error", f"Processing failed: {str(e)}")
+            self.progress_label.configure(text="Status: Error in processing")
+            self.add_to_log(f"Error during processing: {str(e)}", "error")
+        else:
             print(f"Error saving file: {str(e)}")
-            try:
-                messagebox.showerror("Error", f"Saving failed: {str(e)}")
-                self.progress_label.configure(text="Status: Error saving file")
-                self.process_button.configure(state="normal")
-                self.add_to_log(f"Error saving file: {str(e)}", "error")
-            except Exception:
-                # UI may have been destroyed, just print the error
-                print(f"Critical error saving file: {str(e)}")
-            self.processing_active = False
+            messagebox.showerror("Error", f"Saving failed: {str(e)}")
+            self.progress_label.configure(text="Status: Error saving file")
+            self.add_to_log(f"Error saving file: {str(e)}", "error")
+        self.process_button.configure(state="normal")
     
-    def analyze_segment_with_ollama(self, title, content, model, keep_same_topic):
-        try:
-            # Define the prompt for Ollama to specifically look for multiple stories in a SINGLE segment
-            prompt = f"""
-            Analyze this text segment to determine if it contains multiple distinct news stories or topics:
-            
-            SEGMENT:
-            {title}
-            {content}
-            
-            Your task is to determine if this SINGLE segment contains multiple distinct news stories or topics.
-            
-            If it does contain multiple distinct stories:
-            1. How many distinct stories or topics are in the segment? (give a number)
-            2. For each sub-story, provide a brief description
-            3. Identify specific sentence or paragraph boundaries where the content should be split
-            
-            IMPORTANT: Ignore all of these tag line types when making decisions - they should NOT cause a segment split:
-            - Lines starting with '--' (media references)
-            - URLs starting with 'http' or 'https'
-            - Lines starting with 'Timestamp:'
-            - Lines starting with 'Map view:'
-            - Lines starting with 'Source:'
-            - Lines starting with '@' (mentions)
-            - Comment tags starting with two letters and a dash (e.g., "cc-", "jj-", "mm-", "CC-", "JJ-", "MM-")
-            
-            Format your response exactly like this:
-            CONTAINS_MULTIPLE_STORIES: YES/NO
-            NUMBER_OF_STORIES: [if YES, provide a number]
-            SPLIT_AFTER: [if YES, provide line/paragraph numbers where to split, e.g., "2,5,8"]
-            REASONING: Your explanation here
-            """
-            
-            # Update status to show which model is being used
-            self.progress_label.configure(text=f"Status: Analyzing segment for multiple stories with {model}...")
-            
-            # Call Ollama API with the selected model
-            response = ollama.chat(
-                model=model,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            
-            response_text = response['message']['content'].strip()
-
-            contains_multiple_stories, number_of_stories, split_points, reasoning = (
-                self._parse_analysis_response(response_text)
-            )
-            
-            # Return values needed for segment splitting
-            # Note: The "is_different" parameter is now always false, as we're not comparing segments anymore
-            return False, reasoning, response_text, contains_multiple_stories, number_of_stories, [], split_points
-                
-        except Exception as e:
-            print(f"Ollama analysis error: {str(e)}")
-            return False, f"Error occurred during analysis: {str(e)}", str(e), False, 1, [], []
-
-    def analyze_segment_with_openai(self, title, content, model):
-        """Analyze a segment using the OpenAI API."""
-        api_key = self.api_key_var.get().strip()
-        if not api_key:
-            self.add_to_log("OpenAI API key is missing", "error")
-            return False, "Missing API key", "", False, 1, [], []
-
-        prompt = f"""
-        Analyze this text segment to determine if it contains multiple distinct news stories or topics:
-
-        SEGMENT:
-        {title}
-        {content}
-
-        Your task is to determine if this SINGLE segment contains multiple distinct news stories or topics.
-
-        If it does contain multiple distinct stories:
-        1. How many distinct stories or topics are in the segment? (give a number)
-        2. For each sub-story, provide a brief description
-        3. Identify specific sentence or paragraph boundaries where the content should be split
-
-        IMPORTANT: Ignore all of these tag line types when making decisions - they should NOT cause a segment split:
-        - Lines starting with '--' (media references)
-        - URLs starting with 'http' or 'https'
-        - Lines starting with 'Timestamp:'
-        - Lines starting with 'Map view:'
-        - Lines starting with 'Source:'
-        - Lines starting with '@' (mentions)
-        - Comment tags starting with two letters and a dash (e.g., "cc-", "jj-", "mm-", "CC-", "JJ-", "MM-")
-
-        Format your response exactly like this:
-        CONTAINS_MULTIPLE_STORIES: YES/NO
-        NUMBER_OF_STORIES: [if YES, provide a number]
-        SPLIT_AFTER: [if YES, provide line/paragraph numbers where to split, e.g., "2,5,8"]
-        REASONING: Your explanation here
-        """
-
-        self.progress_label.configure(text=f"Status: Analyzing segment for multiple stories with {model}...")
-        url = "https://api.openai.com/v1/chat/completions"
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-        }
-        payload = {
-            "model": model,
-            "messages": [{"role": "user", "content": prompt}],
-            "temperature": 0,
-        }
+    def _on_processing_complete(self):
+        """Update the UI once the worker has saved the output file."""
+        # Automatically open the result with gnome-text-editor
         try:
-            resp = requests.post(url, headers=headers, json=payload, timeout=60)
-            resp.raise_for_status()
-            data = resp.json()
-            response_text = data["choices"][0]["message"]["content"].strip()
+            subprocess.Popen(['gnome-text-editor', self.output_file_path])
+        except Exception as open_err:
+            self.add_to_log(f"Could not open editor: {open_err}", "error")
+        
+        self.processed = True
+        
+        # Update UI
+        save_message = f"Status: Processing complete! File saved to: {os.path.basename(self.output_file_path)}"
+        self.progress_label.configure(text=save_message)
+        self.open_button.configure(state="normal")
+        self.process_button.configure(state="normal")
+        self.same_topic_button.configure(state="disabled")
+        self.different_topic_button.configure(state="disabled")
+        
+        # Update counters
+        self.update_topic_counters()
+        
+        segment_count = self.engine.segment_count
+        messagebox.showinfo(
+            "Processing Complete",
+            f"All {segment_count} segments have been processed and saved to:\n{self.output_file_path}"
+        )
 
-            contains_multiple_stories, number_of_stories, split_points, reasoning = (
-                self._parse_analysis_response(response_text)
-            )
-            return False, reasoning, response_text, contains_multiple_stories, number_of_stories, [], split_points
-        except Exception as e:
-            print(f"OpenAI analysis error: {e}")
-            return False, f"Error occurred during analysis: {str(e)}", str(e), False, 1, [], []
-
-    def _parse_analysis_response(self, response_text):
-        """Parse analysis output from either Ollama or OpenAI."""
-        contains_multiple_stories = False
-        number_of_stories = 1
-        split_points = []
-        reasoning = "No clear reasoning provided"
-
-        multiple_stories_match = re.search(r"CONTAINS_MULTIPLE_STORIES:\s*(YES|NO)", response_text, re.IGNORECASE)
-        if multiple_stories_match:
-            contains_multiple_stories = multiple_stories_match.group(1).upper() == "YES"
-
-        if contains_multiple_stories:
-            number_match = re.search(r"NUMBER_OF_STORIES:\s*(\d+)", response_text, re.IGNORECASE)
-            if number_match:
-                try:
-                    number_of_stories = int(number_match.group(1))
-                except ValueError:
-                    number_of_stories = 2
-
-            split_match = re.search(r"SPLIT_AFTER:\s*(.*?)(?=$|\n)", response_text, re.IGNORECASE | re.DOTALL)
-            if split_match:
-                split_text = split_match.group(1).strip()
-                if "[" in split_text and "]" in split_text:
-                    split_text = split_text.replace("[", "").replace("]", "")
-                for point in re.findall(r"\d+", split_text):
-                    try:
-                        split_points.append(int(point))
-                    except ValueError:
-                        continue
-
-        reasoning_match = re.search(r"REASONING:\s*(.*?)(?=$|\n\n)", response_text, re.IGNORECASE | re.DOTALL)
-        if reasoning_match:
-            reasoning = reasoning_match.group(1).strip()
-
-        return contains_multiple_stories, number_of_stories, split_points, reasoning
+        # Point at the files instead of copying them into the log panel
+        self.add_to_log(f"input file was this: {self.input_file_path}", "highlight")
+        self.add_to_log(f"output file is this: {self.output_file_path} (use Open Result to view)", "highlight")
     
     def open_result_file(self):
         if not self.output_file_path or not os.path.exists(self.output_file_path):
@@ -1225,32 +981,38 @@ class TextSorterApp(ctk.CTk):
             self.decision_frame.pack(fill=tk.X, padx=20, pady=(0, 10))
 
     def add_to_log(self, message, message_type="normal"):
-        """Add a message to the log with timestamp and color coding"""
+        """Add a message to the log with timestamp and color coding.
+
+        Safe to call from any thread.  The message is written to the log file
+        right away and shown in the log panel on the next flush.
+        """
         import datetime
         timestamp = datetime.datetime.now().strftime("[%H:%M:%S]")
-        log_message = f"{timestamp} {message}\n"
-        
-        # Insert the message at the end of the log
-        self.log_text.insert(tk.END, log_message)
-        
-        # Apply color based on message type
-        line_count = int(self.log_text.index('end-1c').split('.')[0])
-        if message_type == "highlight":
-            self.log_text.tag_add("highlight", f"{line_count-1}.0", f"{line_count}.0")
-        elif message_type == "error":
-            self.log_text.tag_add("error", f"{line_count-1}.0", f"{line_count}.0")
-        elif message_type == "success":
-            self.log_text.tag_add("success", f"{line_count-1}.0", f"{line_count}.0")
-        elif message_type == "info":
-            self.log_text.tag_add("info", f"{line_count-1}.0", f"{line_count}.0")
-        elif message_type == "warning":
-            self.log_text.tag_add("warning", f"{line_count-1}.0", f"{line_count}.0")
-        
-        # Scroll to the end if autoscroll is enabled
-        self.log_text.see_end_if_autoscroll()
-        
-        # Update the UI
-        self.update()
+        self.pending_log.append((f"{timestamp} {message}\n", message_type))
+        if self.file_logger is not None:
+            self.file_logger.log(LOG_LEVELS.get(message_type, logging.INFO), message)
+
+    def _flush_log(self):
+        """Insert pending log messages into the log panel in one batch."""
+        if self.pending_log:
+            messages = []
+            while self.pending_log:
+                messages.append(self.pending_log.popleft())
+
+            # One insert per run of equally colored messages
+            for message_type, group in itertools.groupby(messages, key=lambda m: m[1]):
+                tags = (message_type,) if message_type in LOG_LEVELS else ()
+                self.log_text.insert(tk.END, "".join(text for text, _ in group), tags)
+
+            # Drop the oldest lines beyond the cap; the log file keeps them
+            line_count = int(self.log_text.index('end-1c').split('.')[0])
+            if line_count > MAX_LOG_LINES:
+                self.log_text.delete("1.0", f"{line_count - MAX_LOG_LINES}.0")
+
+            # Scroll to the end if autoscroll is enabled
+            self.log_text.see_end_if_autoscroll()
+
+        self.after(LOG_FLUSH_MS, self._flush_log)
 
     def toggle_autoscroll(self):
         """Toggle the autoscroll feature for the log text"""
@@ -1261,10 +1023,18 @@ class TextSorterApp(ctk.CTk):
 
     def update_topic_counters(self):
         """Update the topic counter displays"""
-        self.baseline_label.configure(text=f"Original Segments: {self.baseline_topic_count}")
-        self.current_topics_label.configure(text=f"Final Segments: {self.current_topic_count}")
-        self.different_topics_label.configure(text=f"Kept Separate: {self.different_topics_count}")
-        self.merged_topics_label.configure(text=f"Merged: {self.same_topics_count}")
+        engine = self.engine
+        self.baseline_label.configure(text=f"Original Segments: {engine.baseline_topic_count}")
+        self.current_topics_label.configure(text=f"Final Segments: {engine.current_topic_count}")
+        self.different_topics_label.configure(text=f"Kept Separate: {engine.different_topics_count}")
+        self.merged_topics_label.configure(text=f"Merged: {engine.same_topics_count}")
+        self.host_status_label.configure(text=engine.host_status_text())
+        metrics = engine.metrics.summary_lines()
+        self.metrics_label.configure(text="\n".join(metrics) if metrics else "Run metrics: not started")
+
+    def set_status(self, text):
+        """Show ``text`` in the progress label."""
+        self.progress_label.configure(text=text)
 
     def load_config(self):
         """Load the saved configuration if available."""
@@ -1275,6 +1045,35 @@ class TextSorterApp(ctk.CTk):
                 last_model = cfg.get("last_model")
                 if last_model in AVAILABLE_MODELS:
                     self.selected_model.set(last_model)
+                self.use_cache_var.set(bool(cfg.get("use_cache", True)))
+                self.prefilter_var.set(bool(cfg.get("prefilter", True)))
+                self.structured_var.set(bool(cfg.get("structured", True)))
+                self.incremental_var.set(bool(cfg.get("incremental", False)))
+                self.ollama_hosts_var.set(str(cfg.get("ollama_hosts", "")))
+                self.openai_url_var.set(str(cfg.get("openai_base_url", "")))
+                workers = str(cfg.get("workers", "1"))
+                if workers in WORKER_CHOICES:
+                    self.workers_var.set(workers)
+                batch = str(cfg.get("batch_tokens", "Off"))
+                if batch in BATCH_CHOICES:
+                    self.batch_var.set(batch)
+                timeout = str(cfg.get("timeout", "Off"))
+                if timeout in TIMEOUT_CHOICES:
+                    self.timeout_var.set(timeout)
+                escalation = cfg.get("escalation_model", "Off")
+                if escalation in AVAILABLE_MODELS:
+                    self.escalation_var.set(escalation)
+                thinking = cfg.get("thinking", {})
+                if isinstance(thinking, dict):
+                    self.thinking_policies = {
+                        model: policy for model, policy in thinking.items() if policy in THINKING_POLICIES
+                    }
+                self.thinking_var.set(self.thinking_policies.get(self.selected_model.get(), THINKING_AUTO))
+                self.think_budget = int(cfg.get("think_budget", DEFAULT_THINK_BUDGET))
+                self.embed_splits_var.set(bool(cfg.get("embed_splits", False)))
+                self.confirm_splits_var.set(bool(cfg.get("confirm_splits", False)))
+                self.embed_model = str(cfg.get("embed_model", DEFAULT_EMBED_MODEL))
+                self.split_threshold = float(cfg.get("split_threshold", DEFAULT_SPLIT_THRESHOLD))
             except Exception as e:
                 print(f"Error loading config: {e}")
 
@@ -1282,86 +1081,87 @@ class TextSorterApp(ctk.CTk):
         """Save the current configuration to disk."""
         try:
             with open(CONFIG_FILE, "w") as f:
-                json.dump({"last_model": self.selected_model.get()}, f)
+                json.dump({
+                    "last_model": self.selected_model.get(),
+                    "workers": self.workers_var.get(),
+                    "batch_tokens": self.batch_var.get(),
+                    "timeout": self.timeout_var.get(),
+                    "escalation_model": self.escalation_var.get(),
+                    "use_cache": self.use_cache_var.get(),
+                    "prefilter": self.prefilter_var.get(),
+                    "structured": self.structured_var.get(),
+                    "incremental": self.incremental_var.get(),
+                    "ollama_hosts": self.ollama_hosts_var.get(),
+                    "openai_base_url": self.openai_url_var.get(),
+                    "thinking": self.thinking_policies,
+                    "think_budget": self.think_budget,
+                    "embed_splits": self.embed_splits_var.get(),
+                    "confirm_splits": self.confirm_splits_var.get(),
+                    "embed_model": self.embed_model,
+                    "split_threshold": self.split_threshold,
+                }, f)
         except Exception as e:
             print(f"Error saving config: {e}")
 
     def on_model_select(self, value):
         """Callback when a model is chosen from the dropdown."""
         self.selected_model.set(value)
+        self.thinking_var.set(self.thinking_policies.get(value, THINKING_AUTO))
         self.save_config()
+        self.preload_model(value)
 
-    def on_closing(self):
-        """Handle application closing."""
+    def on_thinking_select(self, value):
+        """Remember the thinking policy chosen for the selected model."""
+        self.thinking_policies[self.selected_model.get()] = value
         self.save_config()
-        self.destroy()
 
-    def _split_segment(self, original_title, content, original_text, split_points, sub_topics):
-        """Split a segment into multiple segments based on AI analysis"""
-        if not split_points:
-            self.add_to_log(f"Can't split segment - missing split points", "warning")
-            return False
+    def preload_model(self, model):
+        """Load ``model`` into Ollama on a background thread.
 
-        # Use helper from split_utils to create sub-segments with metadata
-        from split_utils import split_segment
+        The model stays loaded for the engine's ``keep_alive``, so the first
+        segment of the next run does not wait for it.
+        """
+        if model == OPENAI_MODEL:
+            return
+        engine = SortEngine(
+            model=model,
+            log=self.add_to_log,
+            ollama_hosts=[host.strip() for host in self.ollama_hosts_var.get().split(",")],
+        )
 
-        segments = split_segment(original_title, content, original_text, split_points)
+        def load():
+            try:
+                engine.preload_models()
+            finally:
+                engine.close_clients()
 
-        # If we actually split into multiple segments, assign an ID to track them
-        if len(segments) > 1:
-            self.split_id_counter += 1
-            split_id = f"ID{self.split_id_counter:04d}"
+        threading.Thread(target=load, daemon=True).start()
 
-            def insert_id(text: str) -> str:
-                lines = text.splitlines()
-                if not lines:
-                    return text
-                lines.insert(1, split_id)
-                return "\n".join(lines)
+    def get_response_cache(self):
+        """Return the shared response cache, or ``None`` if caching is off."""
+        if not self.use_cache_var.get():
+            return None
+        if self.response_cache is None:
+            try:
+                self.response_cache = ResponseCache()
+            except Exception as e:
+                self.add_to_log(f"Could not open response cache: {e}", "warning")
+                return None
+        return self.response_cache
 
-            segments = [insert_id(seg) for seg in segments]
-        
-        # Log what we're doing
-        self.add_to_log(f"Splitting segment #{self.current_segment_index + 1} into {len(segments)} sub-segments", "highlight")
-        
-        # Add the segments to processed segments
-        for i, segment_text in enumerate(segments):
-            if i == 0 and not self.processed_segments:
-                # First segment of the whole file
-                self.processed_segments.append(segment_text)
-                self.current_topic_count = 1
-                self.add_to_log(f"Added first sub-segment", "success")
-            else:
-                # Additional segment - ensure proper spacing
-                if self.processed_segments and not self.processed_segments[-1].endswith('\n'):
-                    self.processed_segments[-1] += '\n'
-                
-                self.processed_segments.append(segment_text)
-                self.current_topic_count += 1
-                self.different_topics_count += 1
-                self.add_to_log(f"Added sub-segment", "success")
-        
-        # Update counters
-        self.update_topic_counters()
-        
-        # Adjust baseline count since we've added segments
-        self.baseline_topic_count += len(segments) - 1
-        
-        # Move to next segment
-        self.current_segment_index += 1
-        
-        # Get the selected model
-        model = self.selected_model.get()
-        
-        # Process the next segment
-        if self.current_segment_index < len(self.segments):
-            # Use after with a delay to prevent recursion
-            self.after(100, lambda: self._process_next_segment(model))
-        else:
-            # All segments processed
-            self._save_processed_file()
-        
-        return True
+    def on_closing(self):
+        """Handle application closing."""
+        # Let the worker stop between segments; its output stays in .partial
+        self.stop_event.set()
+        self.save_config()
+        worker = self.worker_thread
+        if worker is not None:
+            worker.join(WORKER_STOP_TIMEOUT)
+        # A worker still waiting on the model may yet use the cache; the
+        # process exit closes it then
+        if self.response_cache is not None and not (worker and worker.is_alive()):
+            self.response_cache.close()
+        self.destroy()
 
 if __name__ == "__main__":
     app = TextSorterApp()
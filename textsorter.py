@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""Headless ``textsorter`` command: sort a .vhd/.txt file without the GUI.
+
+Example::
+
+    textsorter joined.vhd --model qwen3:0.6b
+
+This module never imports tkinter or customtkinter, so it starts quickly and
+runs on machines without a display (e.g. from cron).
+"""
+import argparse
+import datetime
+import os
+import sys
+
+from embedding_splits import DEFAULT_EMBED_MODEL, DEFAULT_SPLIT_THRESHOLD
+from llm_cache import DEFAULT_CACHE_PATH, DEFAULT_MAX_AGE_DAYS, DEFAULT_MAX_ENTRIES, ResponseCache
+from llm_clients import (
+    DEFAULT_CONNECT_TIMEOUT, DEFAULT_KEEP_ALIVE, DEFAULT_MAX_RETRIES, DEFAULT_POOL_SIZE,
+    DEFAULT_READ_TIMEOUT, OPENAI_BASE_URL, TransientBackendError, parse_keep_alive,
+)
+from run_journal import decided_segments, journal_path
+from sort_engine import (
+    AVAILABLE_MODELS, DEFAULT_ANSWER_TOKENS, DEFAULT_MODEL, SortEngine, decision_model,
+)
+from thinking import DEFAULT_THINK_BUDGET, THINKING_POLICIES
+
+
+def timeout_setting(value):
+    """Parse a ``--timeout`` value in seconds; 0 means no limit."""
+    seconds = float(value)
+    if seconds < 0:
+        raise argparse.ArgumentTypeError(f"timeout must not be negative: {value}")
+    return seconds or None
+
+
+def thinking_setting(value):
+    """Parse a ``--thinking`` value, ``POLICY`` or ``MODEL=POLICY``."""
+    model, _, policy = value.rpartition("=")
+    if policy not in THINKING_POLICIES:
+        raise argparse.ArgumentTypeError(
+            f"unknown thinking policy {policy!r} (choose from {', '.join(THINKING_POLICIES)})"
+        )
+    return model or "*", policy
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="textsorter",
+        description="Split multi-story segments of a .vhd/.txt file using an LLM.",
+    )
+    parser.add_argument("input", help="Input .vhd or .txt file")
+    parser.add_argument(
+        "-m", "--model",
+        default=DEFAULT_MODEL,
+        help=f"Model to use (default: {DEFAULT_MODEL})",
+    )
+    parser.add_argument(
+        "--escalate-to",
+        metavar="MODEL",
+        help="Cascade: re-analyze segments the model finds multi-story, or answers "
+             "without a verdict, with this larger model",
+    )
+    parser.add_argument(
+        "--embed-splits",
+        metavar="MODEL",
+        nargs="?",
+        const=DEFAULT_EMBED_MODEL,
+        help=f"Find split points by sentence embeddings with this Ollama model instead of "
+             f"asking the chat model (needs NumPy; default model: {DEFAULT_EMBED_MODEL})",
+    )
+    parser.add_argument(
+        "--split-threshold",
+        type=float,
+        default=DEFAULT_SPLIT_THRESHOLD,
+        help=f"Embedding splits: split where neighbouring sentences are less similar than this "
+             f"(default: {DEFAULT_SPLIT_THRESHOLD})",
+    )
+    parser.add_argument(
+        "--confirm-splits",
+        action="store_true",
+        help="Embedding splits: have the chat model confirm segments the embeddings propose to split",
+    )
+    parser.add_argument(
+        "-o", "--output",
+        help="Output file (default: <input>_sorted_<timestamp><ext> next to the input)",
+    )
+    parser.add_argument(
+        "-j", "--workers",
+        type=int,
+        default=1,
+        help="Number of segment analyses to run concurrently (default: 1)",
+    )
+    parser.add_argument(
+        "--batch-tokens",
+        type=int,
+        default=0,
+        help="Pack several segments into one request, up to about this many "
+             "tokens of segment text (default: 0, one segment per request)",
+    )
+    parser.add_argument(
+        "--prompt-tokens",
+        type=int,
+        default=0,
+        help="Send at most about this many tokens of story sentences per segment "
+             "(default: 0, no limit)",
+    )
+    parser.add_argument(
+        "--answer-tokens",
+        type=int,
+        default=DEFAULT_ANSWER_TOKENS,
+        help=f"Cap on tokens generated per segment, 0 for none (default: {DEFAULT_ANSWER_TOKENS})",
+    )
+    parser.add_argument(
+        "--text-answers",
+        action="store_true",
+        help="Ask for plain-text answers instead of JSON (for models without structured output)",
+    )
+    parser.add_argument(
+        "--ollama-host",
+        action="append",
+        default=[],
+        metavar="URL",
+        help="Ollama server to use; repeat to spread segments over several hosts "
+             "(default: $OLLAMA_HOST or localhost)",
+    )
+    parser.add_argument(
+        "--openai-base-url",
+        metavar="URL",
+        default=os.environ.get("OPENAI_BASE_URL", OPENAI_BASE_URL),
+        help=f"OpenAI-compatible API base URL (default: $OPENAI_BASE_URL or {OPENAI_BASE_URL})",
+    )
+    parser.add_argument(
+        "--thinking",
+        metavar="[MODEL=]POLICY",
+        type=thinking_setting,
+        action="append",
+        default=[],
+        help="Thinking of reasoning models: auto (default), off, budget or on; "
+             "repeat with MODEL= to set it per model",
+    )
+    parser.add_argument(
+        "--think-budget",
+        type=int,
+        default=DEFAULT_THINK_BUDGET,
+        help=f"Tokens a reasoning model may think under the budget policy (default: {DEFAULT_THINK_BUDGET})",
+    )
+    parser.add_argument(
+        "--keep-alive",
+        type=parse_keep_alive,
+        default=DEFAULT_KEEP_ALIVE,
+        help=f"How long Ollama keeps the model loaded after a request, e.g. 10m, 1h, "
+             f"or -1 for until it stops (default: {DEFAULT_KEEP_ALIVE})",
+    )
+    parser.add_argument(
+        "--no-preload",
+        action="store_true",
+        help="Do not load the Ollama model before the first segment",
+    )
+    parser.add_argument(
+        "--pool-size",
+        type=int,
+        default=DEFAULT_POOL_SIZE,
+        help=f"Keep-alive connections per backend (default: {DEFAULT_POOL_SIZE}, at least --workers)",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=timeout_setting,
+        default=DEFAULT_READ_TIMEOUT,
+        help="Seconds to wait for a model response, 0 for no limit (default: no limit)",
+    )
+    parser.add_argument(
+        "--connect-timeout",
+        type=float,
+        default=DEFAULT_CONNECT_TIMEOUT,
+        help=f"Seconds to wait for a connection (default: {DEFAULT_CONNECT_TIMEOUT})",
+    )
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=DEFAULT_MAX_RETRIES,
+        help=f"Retries for timeouts, 429 and 5xx responses (default: {DEFAULT_MAX_RETRIES})",
+    )
+    parser.add_argument(
+        "--api-key-file",
+        help="File holding the OpenAI API key (default: $OPENAI_API_KEY)",
+    )
+    parser.add_argument(
+        "--cache",
+        default=DEFAULT_CACHE_PATH,
+        help=f"Response cache database (default: {DEFAULT_CACHE_PATH})",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always call the model, never read or write the response cache",
+    )
+    parser.add_argument(
+        "--cache-max-entries",
+        type=int,
+        default=DEFAULT_MAX_ENTRIES,
+        help=f"Evict least recently used responses above this count (default: {DEFAULT_MAX_ENTRIES})",
+    )
+    parser.add_argument(
+        "--cache-max-age-days",
+        type=float,
+        default=DEFAULT_MAX_AGE_DAYS,
+        help=f"Evict responses older than this (default: {DEFAULT_MAX_AGE_DAYS})",
+    )
+    parser.add_argument(
+        "--no-prefilter",
+        action="store_true",
+        help="Send every segment to the model, even obvious single stories",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Reuse the last run's decisions for unchanged segments and only analyze new or changed ones",
+    )
+    journal_mode = parser.add_mutually_exclusive_group()
+    journal_mode.add_argument(
+        "--resume",
+        action="store_true",
+        help="Replay the decisions journaled by an interrupted run with the same model",
+    )
+    journal_mode.add_argument(
+        "--restart",
+        action="store_true",
+        help="Discard the decisions journaled by an interrupted run and start over",
+    )
+    parser.add_argument(
+        "--no-journal",
+        action="store_true",
+        help="Do not journal decisions next to the input (an interrupted run cannot be resumed)",
+    )
+    parser.add_argument(
+        "--no-report",
+        action="store_true",
+        help="Do not write the JSON run report (stage timings, tokens) next to the output",
+    )
+    parser.add_argument(
+        "--no-same-topic",
+        action="store_true",
+        help="Also split separate posts or updates on the same story apart "
+             "(by default the model keeps same-topic content together)",
+    )
+    parser.add_argument(
+        "-q", "--quiet",
+        action="store_true",
+        help="Only log warnings and errors",
+    )
+    return parser
+
+
+def make_logger(quiet):
+    """Return a ``log(message, message_type)`` callback writing to stderr."""
+    def log(message, message_type="normal"):
+        if quiet and message_type not in ("error", "warning"):
+            return
+        timestamp = datetime.datetime.now().strftime("[%H:%M:%S]")
+        print(f"{timestamp} {message}", file=sys.stderr, flush=True)
+    return log
+
+
+def report_interrupted(engine, journal):
+    """Tell where an interrupted run left its output and how to continue it."""
+    print("Interrupted.", file=sys.stderr)
+    if engine.output_file_path and os.path.exists(engine.output_file_path + ".partial"):
+        print(f"Partial output kept in {engine.output_file_path}.partial", file=sys.stderr)
+    path = journal_path(engine.input_file_path or "")
+    if journal and engine.input_file_path and os.path.exists(path):
+        print(f"Decisions so far are journaled in {path}; run the same command with --resume "
+              f"to continue", file=sys.stderr)
+
+
+def read_api_key(path):
+    if path:
+        with open(path, "r") as f:
+            return f.read().strip()
+    return os.environ.get("OPENAI_API_KEY", "")
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    for model in (args.model, args.escalate_to):
+        if model and model not in AVAILABLE_MODELS:
+            print(f"Warning: {model} is not in the known model list", file=sys.stderr)
+
+    if not os.path.isfile(args.input):
+        print(f"Error: input file not found: {args.input}", file=sys.stderr)
+        return 1
+
+    try:
+        api_key = read_api_key(args.api_key_file)
+    except OSError as e:
+        print(f"Error: could not read API key: {e}", file=sys.stderr)
+        return 1
+
+    journal = not args.no_journal
+    if journal and not args.resume:
+        decided = decided_segments(journal_path(args.input), decision_model(
+            args.model, args.escalate_to, args.embed_splits, args.split_threshold, args.confirm_splits,
+        ))
+        if decided and not args.restart:
+            # Starting over would overwrite the journal and lose those decisions
+            print(f"Error: an interrupted run already decided {decided} segments of this file; "
+                  f"pass --resume to continue it, or --restart to discard its decisions "
+                  f"and start over", file=sys.stderr)
+            return 1
+
+    cache = None
+    if not args.no_cache:
+        cache = ResponseCache(
+            args.cache,
+            max_entries=args.cache_max_entries,
+            max_age_days=args.cache_max_age_days,
+        )
+
+    engine = SortEngine(
+        model=args.model,
+        api_key=api_key,
+        keep_same_topic=not args.no_same_topic,
+        log=make_logger(args.quiet),
+        workers=args.workers,
+        cache=cache,
+        prefilter=not args.no_prefilter,
+        batch_tokens=args.batch_tokens,
+        pool_size=args.pool_size,
+        connect_timeout=args.connect_timeout,
+        read_timeout=args.timeout,
+        max_retries=args.max_retries,
+        prompt_tokens=args.prompt_tokens,
+        answer_tokens=args.answer_tokens,
+        structured=not args.text_answers,
+        journal=journal,
+        resume=args.resume,
+        incremental=args.incremental,
+        ollama_hosts=args.ollama_host,
+        escalation_model=args.escalate_to,
+        openai_base_url=args.openai_base_url,
+        report=not args.no_report,
+        keep_alive=args.keep_alive,
+        thinking=dict(args.thinking),
+        think_budget=args.think_budget,
+        embed_model=args.embed_splits,
+        split_threshold=args.split_threshold,
+        confirm_splits=args.confirm_splits,
+    )
+    if not args.no_preload:
+        engine.preload_models()
+    try:
+        output_path = engine.run(args.input, args.output)
+    except (TransientBackendError, RuntimeError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        report_interrupted(engine, journal)
+        return 130
+    finally:
+        if cache is not None:
+            cache.close()
+    if output_path is None:
+        return 1
+
+    print(output_path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""Thinking policies for reasoning models.
+
+Models like ``qwen3``, ``deepseek-r1`` and ``phi4-mini-reasoning`` write a
+``<think>`` block before they answer.  The engine only needs the verdict,
+so the thinking is either turned off, cut off after a token budget, or left
+on, per model:
+
+* ``off``: Ollama's ``think`` flag is set to false, and models with a soft
+  switch (``/no_think`` for ``qwen3``) also get it in the system message.
+* ``budget``: the model may think for about ``budget`` tokens; a streamed
+  answer is cut off once its thinking runs past that.
+* ``on``: the model thinks as long as it likes.
+
+``auto`` picks ``off`` for models that have a switch and ``budget`` for the
+others.  Think blocks are removed from every answer with ``strip_thinking``
+before it is parsed, cached or logged.
+"""
+THINKING_AUTO = "auto"
+THINKING_OFF = "off"
+THINKING_BUDGET = "budget"
+THINKING_ON = "on"
+THINKING_POLICIES = (THINKING_AUTO, THINKING_OFF, THINKING_BUDGET, THINKING_ON)
+
+# Default thinking budget in tokens
+DEFAULT_THINK_BUDGET = 512
+
+# Reasoning models by name prefix: (Ollama "think" flag works, soft switch
+# that turns thinking off from the prompt)
+REASONING_MODELS = {
+    "qwen3:": (True, "/no_think"),
+    "deepseek-r1:": (True, None),
+    "deepcoder:": (False, None),
+    "phi4-mini-reasoning:": (False, None),
+}
+
+THINK_START = "<think>"
+THINK_END = "</think>"
+
+
+def reasoning_model(model):
+    """Return ``(think flag works, soft switch)`` of ``model``, or ``None``."""
+    for prefix, switches in REASONING_MODELS.items():
+        if model.startswith(prefix):
+            return switches
+    return None
+
+
+def resolve_policy(model, policy=THINKING_AUTO):
+    """Return the ``off``, ``budget`` or ``on`` policy that applies to ``model``.
+
+    Models that do not think always get ``on``, which changes nothing.
+    ``off`` falls back to ``budget`` for models without an off switch.
+    """
+    switches = reasoning_model(model)
+    if switches is None:
+        return THINKING_ON
+    can_switch_off = switches[0] or switches[1] is not None
+    if policy in (THINKING_AUTO, THINKING_OFF):
+        return THINKING_OFF if can_switch_off else THINKING_BUDGET
+    return policy if policy in THINKING_POLICIES else THINKING_BUDGET
+
+
+def think_flag(model, policy):
+    """Return the Ollama ``think`` argument for ``model`` under ``policy``.
+
+    ``None`` leaves the server default, which is all that works for models
+    without the flag.  With a budget thinking is asked for explicitly so it
+    arrives apart from the answer.
+    """
+    switches = reasoning_model(model)
+    if switches is None or not switches[0]:
+        return None
+    return policy != THINKING_OFF
+
+
+def soft_switch(model, policy):
+    """Return the prompt text that turns thinking off, or ``""``."""
+    switches = reasoning_model(model)
+    if policy != THINKING_OFF or switches is None:
+        return ""
+    return switches[1] or ""
+
+
+def strip_thinking(text):
+    """Return ``text`` without its think block.
+
+    Everything up to the last ``</think>`` is dropped (some templates open
+    the block in the prompt, so the answer only has the closing tag).  An
+    unfinished block runs to the end of the text, so a cut-off answer
+    leaves nothing.
+    """
+    end = text.rfind(THINK_END)
+    if end >= 0:
+        return text[end + len(THINK_END):].strip()
+    start = text.find(THINK_START)
+    if start >= 0:
+        return text[:start].strip()
+    return text
+
+
+def unfinished_thinking(text):
+    """Return the text of a think block that is still open, or ``""``."""
+    if THINK_END in text:
+        return ""
+    start = text.find(THINK_START)
+    return text[start + len(THINK_START):] if start >= 0 else ""